@@ -0,0 +1,144 @@
+'''
+Hourly electricity balance of the scenarios.
+
+The timeseries columns are summed into supply and demand categories (renewable electricity, CHP plants, electrolysis,
+...) for all scenarios at once, giving one array with shape (scenario, category, hour). Plots and other metrics slice
+from it instead of adding up columns themselves. Balances are cached on disk, keyed by the content of the saved
+timeseries, so they are only computed again when the timeseries change.
+'''
+
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+import data_cache
+from data_prep import read_aggregate, timeseries_columns, timeseries_hash
+from registry import get_registry, timeseries_path
+
+# Supply and demand categories and the timeseries columns they are the sum of
+SUPPLY = {'nuclear': ['Nuclear Electr.'],
+          'CHP': ['CHP Electr.', 'CSHP Electr.'],
+          'renewable_el': ['Wind Electr.', 'Offshore Electr.', 'PV Electr.', 'Wave Electr.'],
+          'waste': ['Waste 2 Heat', 'Waste 3 Heat'],
+          'PP': ['PP Electr.', 'PP2 Electr.'],
+          'disch': ['Discharge Electr.']}
+DEMAND = {'Unflexible': ['Electr. Demand'],
+          'Heating': ['HP Electr.'],
+          'v2g': ['Flexible Electr.', 'V2G Charge'],
+          'electrolysis': ['H2 Electr.', 'CO2Hydro Electr.', 'NH3Hydro Electr.'],
+          'storage': ['Charge Electr.']}
+CATEGORIES = {**SUPPLY, **DEMAND}
+
+# Balances computed by this process, keyed by the cache key
+_balances = {}
+
+
+class Balance:
+    '''
+    Supply and demand categories of several scenarios. values has shape (scenario, category, time)
+    '''
+
+    def __init__(self, scenarios, categories, index, values):
+        self.scenarios = list(scenarios)
+        self.categories = list(categories)
+        self.index = index
+        self.values = values
+
+    def series(self, scenario, category):
+        '''
+        :param scenario: Scenario name
+        :param category: Category name (see CATEGORIES)
+
+        :return: Series with the category over time
+        '''
+        values = self.values[self.scenarios.index(scenario), self.categories.index(category)]
+        return pd.Series(values, index = self.index, name = category)
+
+    def frame(self, scenario):
+        '''
+        :param scenario: Scenario name
+
+        :return: Dataframe with one column per category
+        '''
+        return pd.DataFrame(self.values[self.scenarios.index(scenario)].T, index = self.index,
+                            columns = self.categories)
+
+    def total(self, categories):
+        '''
+        :param categories: List of category names
+
+        :return: Array with the sum of the categories, shape (scenario, time)
+        '''
+        return self.values[:, [self.categories.index(category) for category in categories]].sum(axis = 1)
+
+
+def _compute(scenarios, saved_columns, level):
+    index = None
+    values = None
+    for s, name in enumerate(scenarios):
+        path = timeseries_path(name)
+        available = set(saved_columns[name])
+        columns = [col for cols in CATEGORIES.values() for col in cols if col in available]
+        data = read_aggregate(path, columns, level = level)
+        if values is None:
+            index = data.index
+            values = np.zeros((len(scenarios), len(CATEGORIES), len(index)))
+
+        # Columns that were not saved (all zero in EnergyPLAN) add nothing
+        for c, cols in enumerate(CATEGORIES.values()):
+            present = [col for col in cols if col in available]
+            if present:
+                values[s, c] = data[present].to_numpy().T.sum(axis = 0)
+    return index, values
+
+
+def get_balance(scenarios = None, level = 'hourly', use_cache = True):
+    '''
+    This function returns the supply and demand categories of the scenarios
+
+    :param scenarios: List of scenario names (the registry's timeseries group if None)
+    :param level: 'hourly', or the mean of 'daily', 'weekly' or 'monthly' periods (see read_aggregate)
+    :param use_cache: Use the cached balance if the timeseries have not changed
+
+    :return: Balance
+    '''
+    scenarios = list(scenarios or get_registry().group('timeseries'))
+
+    # Balances are made from saved timeseries only (FileNotFoundError if a scenario has not been extracted)
+    saved_columns = {name: timeseries_columns(timeseries_path(name)) for name in scenarios}
+
+    text = json.dumps([scenarios, level, CATEGORIES, [timeseries_hash(timeseries_path(name)) for name in scenarios]])
+    key = hashlib.sha256(text.encode()).hexdigest()[:32]
+    # A dot directory, so data_cache does not take the balance cache for a workbook entry
+    path = os.path.join(data_cache.CACHE_DIR, '.balance', f'{key}.npz')
+
+    if use_cache and key in _balances:
+        return _balances[key]
+    if use_cache and os.path.isfile(path):
+        with np.load(path) as npz:
+            balance = Balance(scenarios, CATEGORIES, pd.DatetimeIndex(npz['index']), npz['values'])
+    else:
+        index, values = _compute(scenarios, saved_columns, level)
+        balance = Balance(scenarios, CATEGORIES, index, values)
+        if use_cache:
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+            with open(path + f'.{os.getpid()}.tmp', 'wb') as f:
+                np.savez(f, index = index.to_numpy(), values = values)
+            os.replace(path + f'.{os.getpid()}.tmp', path)
+
+    if use_cache:
+        _balances[key] = balance
+    return balance
+
+
+def load_balance(level = 'hourly'):
+    '''
+    This function computes the balance of the registry's timeseries group and caches it, as a task that plots of the
+    balance depend on (see scheduler)
+
+    :param level: 'hourly', 'daily', 'weekly' or 'monthly' (see get_balance)
+
+    :return: None
+    '''
+    get_balance(level = level)
@@ -0,0 +1,237 @@
+'''
+Benchmarks of the pipeline on a synthetic workbook (see workbook.py).
+
+Each benchmark is timed a number of times and the best time is reported with the throughput. Peak memory is measured
+in a separate run with tracemalloc, since tracing slows everything down. Results are saved as json, so runs before and
+after a change can be compared:
+
+    python benchmarks/run.py [--hours H] [--columns C] [--repeat N] [--quick] [--output FILE] [--compare OLD.json]
+'''
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+import render
+render.set_headless(True)
+
+import data_cache
+import data_prep
+import interface
+from registry import get_registry, timeseries_path, EXTRA_COLUMNS
+from workbook import make_workbook
+
+RESULTS_DIR = os.path.join(REPO, 'benchmarks', 'results')
+
+
+def _benchmarks(workbook, hours, resolutions):
+    # Each benchmark is (name, function, number of items per call, unit, setup). setup makes the inputs the benchmark
+    # needs and is not timed (None if there is nothing to set up). Imports are here so the plotting modules see the
+    # benchmark settings
+    import numpy as np
+    from plot_costs import calc_costs, cost_coefficients, cost_kernel, plot_costs, plot_total_costs
+    from sensitivity_analysis import heatmap
+    from plot_timeseries import plot_april, plot_year
+
+    registry = get_registry()
+    sheets = sorted({scenario.sheet for scenario in registry})
+    timeseries = registry.group('timeseries')
+
+    def annual():
+        data_prep.clear_workbook_cache()
+        for sheet in sheets:
+            data_prep.get_annual_data(workbook, sheet, use_cache = False)
+
+    def hourly():
+        data_prep.clear_workbook_cache()
+        for sheet in sheets:
+            data_prep.get_timeseries(workbook, sheet, EXTRA_COLUMNS, use_cache = False)
+
+    def extract():
+        data_prep.clear_workbook_cache()
+        data_prep.extract_timeseries(workbook, timeseries, EXTRA_COLUMNS, 'Data', file_format = 'npy', workers = 1)
+
+    def extracted():
+        # The timeseries plots read the stores written by extract
+        if not all(os.path.isfile(os.path.join(timeseries_path(name), 'columns.json')) for name in timeseries):
+            extract()
+
+    # Other assumptions on every call, so calc_costs evaluates the categories depending on them again instead of
+    # returning the ones its cost model kept from the call before
+    offshore_capex = np.linspace(1.9, 3.5, 100)
+    nuclear_capex = np.linspace(4.2, 10.2, 100)
+
+    def costs():
+        for CAPEX_offshore, CAPEX_nuclear in zip(offshore_capex, nuclear_capex):
+            calc_costs(CAPEX_offshore = CAPEX_offshore, CAPEX_nuclear = CAPEX_nuclear)
+
+    def kernel():
+        # Coefficients from a new registry (annual data from the on-disk cache), then every category for every call
+        get_registry(reload = True)
+        coefficients = cost_coefficients()
+        for CAPEX_offshore, CAPEX_nuclear in zip(offshore_capex, nuclear_capex):
+            cost_kernel(coefficients, CAPEX_offshore = CAPEX_offshore, CAPEX_nuclear = CAPEX_nuclear)
+
+    benchmarks = [('get_annual_data', annual, len(sheets), 'sheets', None),
+                  ('get_timeseries', hourly, len(sheets) * hours, 'hours', None),
+                  ('extract_timeseries', extract, len(timeseries) * hours, 'hours', None),
+                  ('calc_costs', costs, len(offshore_capex), 'calls', None),
+                  ('cost_kernel', kernel, len(offshore_capex), 'calls', None)]
+    for resolution in resolutions:
+        benchmarks.append((f'heatmap_{resolution}', lambda r = resolution: heatmap(r), resolution ** 2, 'points', None))
+    benchmarks += [('render_plot_costs', plot_costs, 2, 'figures', None),
+                   ('render_plot_total_costs', plot_total_costs, 1, 'figures', None),
+                   ('render_plot_april', lambda: plot_april(workers = 1), len(timeseries), 'figures', extracted),
+                   ('render_plot_year', lambda: plot_year(workers = 1), len(timeseries), 'figures', extracted)]
+    return benchmarks
+
+
+def _time(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            function()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def _peak_memory(function):
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd = REPO, capture_output = True, text = True,
+                              check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(hours = 8784, columns = 80, repeat = 3, resolutions = (10, 30, 100), memory = True, only = None):
+    '''
+    This function runs the benchmarks in a temporary directory
+
+    :param hours: number of hours in each sheet of the synthetic workbook
+    :param columns: number of extra timeseries columns in the synthetic workbook
+    :param repeat: number of timed runs of each benchmark
+    :param resolutions: heatmap resolutions to time
+    :param memory: also measure peak memory if True
+    :param only: list of benchmark names to run (all if None)
+
+    :return: dictionary with the settings and a list of results
+    '''
+    results = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            # Nothing is read from or written to the caches of the repository
+            data_cache.CACHE_DIR = os.path.join(tmp, '.cache')
+            render.set_headless(True, os.path.join(tmp, 'Figures'))
+            render.cache_enabled = False
+
+            registry = get_registry(reload = True)
+            sheets = sorted({scenario.sheet for scenario in registry})
+            workbook = os.path.join(tmp, 'benchmark.xlsx')
+            start = time.perf_counter()
+            make_workbook(workbook, sheets, hours, columns)
+            print(f'Synthetic workbook: {len(sheets)} sheets x {hours} hours ({time.perf_counter() - start:.1f} s)')
+
+            interface.file_path = workbook
+            get_registry(reload = True)
+
+            for name, function, items, unit, setup in _benchmarks(workbook, hours, resolutions):
+                if only and name not in only:
+                    continue
+                if setup:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        setup()
+                # The first run fills the caches the later ones may use (saved timeseries, registry, balances)
+                times = _time(function, repeat)
+                result = {'name': name, 'seconds': min(times), 'mean_seconds': sum(times) / len(times),
+                          'repeat': repeat, 'items': items, 'unit': unit, 'throughput': items / min(times)}
+                if memory:
+                    result['peak_memory_mb'] = _peak_memory(function) / 2 ** 20
+                results.append(result)
+                print(f"{name:<26}{result['seconds']:>10.3f} s{result['throughput']:>14.1f} {unit}/s" +
+                      (f"{result['peak_memory_mb']:>10.1f} MB" if memory else ''))
+        finally:
+            os.chdir(cwd)
+
+    return {'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'commit': _commit(), 'python': platform.python_version(),
+            'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'settings': {'hours': hours, 'columns': columns, 'repeat': repeat, 'resolutions': list(resolutions)},
+            'results': results}
+
+
+def compare(old, new):
+    '''
+    This function prints the change in time and peak memory from one benchmark run to another
+
+    :param old: results of the earlier run (from run or a saved json file)
+    :param new: results of the later run
+
+    :return: None
+    '''
+    before = {result['name']: result for result in old['results']}
+    print(f"\n{'benchmark':<26}{'before':>10}{'after':>10}{'speedup':>10}{'memory':>10}")
+    for result in new['results']:
+        if result['name'] not in before:
+            continue
+        b = before[result['name']]
+        memory = ''
+        if 'peak_memory_mb' in b and 'peak_memory_mb' in result and b['peak_memory_mb']:
+            memory = f"{result['peak_memory_mb'] / b['peak_memory_mb']:>9.2f}x"
+        print(f"{result['name']:<26}{b['seconds']:>9.3f}s{result['seconds']:>9.3f}s"
+              f"{b['seconds'] / result['seconds']:>9.2f}x{memory}")
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Benchmark the pipeline on a synthetic workbook')
+    parser.add_argument('--hours', type = int, default = 8784)
+    parser.add_argument('--columns', type = int, default = 80, help = 'number of extra timeseries columns')
+    parser.add_argument('--repeat', type = int, default = 3)
+    parser.add_argument('--resolutions', type = int, nargs = '+', default = [10, 30, 100])
+    parser.add_argument('--quick', action = 'store_true', help = 'small workbook, one run, no memory measurement')
+    parser.add_argument('--no-memory', action = 'store_true')
+    parser.add_argument('--only', nargs = '+', help = 'names of the benchmarks to run')
+    parser.add_argument('--output', help = 'json file for the results (benchmarks/results/<time>.json if not given)')
+    parser.add_argument('--compare', help = 'json file with earlier results to compare with')
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.hours, args.columns, args.repeat, args.resolutions, args.no_memory = 876, 20, 1, [10, 30], True
+
+    results = run(args.hours, args.columns, args.repeat, args.resolutions, not args.no_memory, args.only)
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok = True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent = 1)
+    print(f'Results saved to {output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == '__main__':
+    main()
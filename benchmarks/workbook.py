@@ -0,0 +1,154 @@
+'''
+Synthetic EnergyPLAN result workbooks for benchmarks.
+
+The sheets have the layout get_annual_data and get_timeseries expect (CO2, RES and FUEL blocks, investment and cost
+tables, the two rows with column names, the annual energy row and the hourly values from row 108) filled with random
+numbers, so the pipeline can be timed without the real workbooks.
+
+Use from the command line:
+
+    python benchmarks/workbook.py OUTPUT.xlsx [--sheets N | --names A B ...] [--hours H] [--columns C]
+'''
+
+import argparse
+import os
+import sys
+import numpy as np
+import openpyxl
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_prep import HOURLY_START
+
+# Timeseries columns used by the analyses. More columns named 'Extra <i> Electr.' are added after them
+COLUMNS = ['Electr. Demand', 'Stabil. Load', 'Nuclear Electr.', 'Wind Electr.', 'Offshore Electr.', 'PV Electr.',
+           'Wave Electr.', 'Biogas', 'Waste 2 Heat', 'Waste 3 Heat', 'CHP Electr.', 'CSHP Electr.', 'PP Electr.',
+           'PP2 Electr.', 'HP Electr.', 'Flexible Electr.', 'V2G Charge', 'H2 Electr.', 'CO2Hydro Electr.',
+           'NH3Hydro Electr.', 'Charge Electr.', 'Discharge Electr.', 'H2 Storage', 'H2 demand', 'CHP 3 Heat']
+
+# Rows (0-based) of the blocks read by get_annual_data
+INV_HEADER = 7
+INV_ROWS = 56
+COSTS_HEADER = 40
+COSTS_ROWS = 30
+COSTS_EMPTY = (44, 47, 59)
+
+# Names of the rows records.ROW_NAMES expects, by row, so records of the synthetic sheets give no warnings
+ROW_NAMES = {INV_HEADER + 1 + label: name for label, name in ((10, 'Wind'), (11, 'Offshore Wind'), (18, 'Nuclear'))}
+ROW_NAMES[COSTS_HEADER + 1 + 28] = 'TOTAL ANNUAL COSTS'
+NAME_ROWS = (82, 83)
+ENERGY_ROW = 86
+
+
+def _split(name):
+    # Column names are split over two rows
+    first, _, second = name.rpartition(' ')
+    return (first, second) if first else (name, None)
+
+
+def _sheet_rows(rng, hours, columns):
+    rows = {}
+
+    def cell(row, col, value):
+        rows.setdefault(row, {})[col] = value
+
+    for header, first, n in (('CO2', 17, 2), ('RES', 21, 3), ('FUEL', 26, 12)):
+        cell(first, 1, header)
+        cell(first, 2, 'Value')
+        for r in range(first + 1, first + 1 + n):
+            cell(r, 1, f'{header.lower()}_{r}')
+            cell(r, 2, float(rng.random() * 10))
+
+    for first_col in (7, 12):
+        for i, name in enumerate(['Investment', 'Total Inv.', 'Annual Inv.', 'Fixed']):
+            cell(INV_HEADER, first_col + i, name)
+    for r in range(INV_HEADER + 1, INV_HEADER + INV_ROWS + 1):
+        cell(r, 7, ROW_NAMES.get(r, f'inv_{r}'))
+        for col, scale in ((8, 1000), (9, 100), (10, 50)):
+            cell(r, col, float(rng.random() * scale))
+    for r in range(INV_HEADER + 1, INV_HEADER + 49):
+        # Grouped table: the group name is only in the first row of each group, and some rows are empty
+        if r % 3 == 0:
+            cell(r, 12, f'group_{r}')
+        if r % 5:
+            for col, scale in ((13, 1000), (14, 100), (15, 50)):
+                cell(r, col, float(rng.random() * scale))
+
+    for i, name in enumerate(['COSTS', 'VARIABLE:', 'FIXED:', 'TOTAL:  ']):
+        cell(COSTS_HEADER, 1 + i, name)
+    for r in range(COSTS_HEADER + 1, COSTS_HEADER + COSTS_ROWS + 1):
+        if r in COSTS_EMPTY:
+            continue
+        cell(r, 1, ROW_NAMES.get(r, f'cost_{r}'))
+        for col, scale in ((2, 100), (3, 100), (4, 1000)):
+            cell(r, col, float(rng.random() * scale))
+
+    names = [('Hour', 'No.')] + [_split(name) for name in columns]
+    for j, (first, second) in enumerate(names):
+        cell(NAME_ROWS[0], j, first)
+        if second:
+            cell(NAME_ROWS[1], j, second)
+
+    # Annual energy with decimal commas, as EnergyPLAN writes it
+    cell(ENERGY_ROW, 0, 'ANNUAL')
+    cell(ENERGY_ROW, 1, 'TWh')
+    for j in range(len(columns)):
+        cell(ENERGY_ROW, j + 2, f'{rng.random() * 10:.2f}'.replace('.', ','))
+
+    grid = []
+    for r in range(HOURLY_START):
+        values = rows.get(r, {})
+        grid.append([values.get(c) for c in range(max(values, default = -1) + 1)])
+
+    hourly = rng.random((hours, len(columns))) * 1000
+    # Some columns are all zero in real results
+    hourly[:, columns.index('Wave Electr.')] = 0
+    for h in range(hours):
+        grid.append([h, h + 1] + hourly[h].tolist())
+    return grid
+
+
+def make_workbook(path, sheets, hours = 8784, columns = 0, seed = 0):
+    '''
+    This function writes a synthetic EnergyPLAN result workbook
+
+    :param path: path to the new excel file
+    :param sheets: list of sheet names
+    :param hours: number of hours in each sheet
+    :param columns: number of extra timeseries columns besides COLUMNS
+    :param seed: seed for the random values
+
+    :return: path
+    '''
+    rng = np.random.default_rng(seed)
+    names = COLUMNS + [f'Extra {i} Electr.' for i in range(columns)]
+
+    workbook = openpyxl.Workbook(write_only = True)
+    for sheet in sheets:
+        worksheet = workbook.create_sheet(sheet)
+        for row in _sheet_rows(rng, hours, names):
+            worksheet.append(row)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok = True)
+    workbook.save(path)
+    return path
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Write a synthetic EnergyPLAN result workbook')
+    parser.add_argument('output')
+    parser.add_argument('--sheets', type = int, default = 7, help = 'number of sheets (named S1, S2, ...)')
+    parser.add_argument('--names', nargs = '+', help = 'sheet names (instead of --sheets)')
+    parser.add_argument('--hours', type = int, default = 8784)
+    parser.add_argument('--columns', type = int, default = 0, help = 'number of extra timeseries columns')
+    parser.add_argument('--seed', type = int, default = 0)
+    args = parser.parse_args(argv)
+
+    sheets = args.names or [f'S{i + 1}' for i in range(args.sheets)]
+    make_workbook(args.output, sheets, args.hours, args.columns, args.seed)
+    print(f'Wrote {args.output}: {len(sheets)} sheets x {args.hours} hours')
+
+
+if __name__ == '__main__':
+    main()
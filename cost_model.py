@@ -0,0 +1,242 @@
+'''
+Scenario costs as a graph of components.
+
+The five cost categories of calc_costs (uranium, renewable investment, O&M, nuclear investment, remaining investment)
+and the capacities they use are components. Each component is a function whose argument names are the assumptions
+and components it depends on, so the dependencies are read from the formulas themselves. cost_kernel evaluates every
+component at once. A CostModel keeps the components it has evaluated, and changing an assumption only evaluates the
+components that depend on it again (e.g. a new nuclear CAPEX only changes the nuclear investment and the total).
+
+    model = CostModel()
+    model.set(CAPEX_nuclear = 5.0)
+    uranium_uses, inv_res_values, OM_values, nuc_inv, remaining_inv = model.costs()
+'''
+
+import inspect
+import numpy as np
+from interface import settings
+from instrument import count
+
+# CAPEX and OPEX assumptions, with the calc_costs defaults
+CAPEX_OPEX_DEFAULTS = {'CAPEX_offshore': 1.9, 'CAPEX_onshore': 1.03, 'CAPEX_nuclear': 6.18, 'OPEX_nuclear': 30.20}
+
+# PV investment and lifetime, and fixed O&M of wind power as a share of CAPEX
+CAPEX_PV = 0.6
+LIFETIME_PV = 40
+FIXED_OM_OFF = 0.0167 # Technology catalouge: 1.44 ved normal CAPEX forecast
+FIXED_OM_ON = 0.0251
+
+# Cost categories in the order calc_costs returns them
+CATEGORIES = ('uranium', 'inv_res', 'OM', 'inv_nuc', 'rem_inv')
+
+
+def default_assumptions():
+    '''
+    This function gives the value from interface of every assumption cost_kernel takes besides CAPEX and OPEX
+
+    :return: dictionary with assumption names and values
+    '''
+
+    (file_path, scenarios, output_file, nuc_size, offshore_size, onshore_size, pv_size, change_cf, offshore_CF_original,
+     onshore_CF_original, PV_CF_original, offshore_CF, onshore_CF, PV_CF, ir, lifetime_nuc, lifetime_off, lifetime_on,
+     uranium_cost, OM_nuc, OM_offshore_2035) = settings()
+
+    # The new capacity factors are only used if change_cf is True
+    if not change_cf:
+        offshore_CF, onshore_CF, PV_CF = offshore_CF_original, onshore_CF_original, PV_CF_original
+
+    return {'ir': ir, 'lifetime_nuc': lifetime_nuc, 'lifetime_off': lifetime_off, 'lifetime_on': lifetime_on,
+            'uranium_cost': uranium_cost, 'OM_nuc': OM_nuc,
+            'offshore_CF': offshore_CF, 'onshore_CF': onshore_CF, 'PV_CF': PV_CF}
+
+
+def original_capacity_factors():
+    '''
+    :return: dictionary with the capacity factors of the EnergyPLAN runs (the sizes in interface are for these)
+    '''
+    offshore_CF_original, onshore_CF_original, PV_CF_original = settings()[8:11]
+    return {'offshore_CF_original': offshore_CF_original, 'onshore_CF_original': onshore_CF_original,
+            'PV_CF_original': PV_CF_original}
+
+
+# --------------------------------------------- COMPONENTS ---------------------------------------------
+# c holds the coefficient arrays of the scenarios (see cost_coefficients). Assumptions have an extra last axis of
+# length 1, so they broadcast against the scenarios
+
+def offshore_size(c, offshore_CF_original, offshore_CF):
+    # Scale capacities to the capacity factors (no change with the original capacity factors)
+    return c['offshore_size'] * (offshore_CF_original / offshore_CF)
+
+
+def onshore_size(c, onshore_CF_original, onshore_CF):
+    return c['onshore_size'] * (onshore_CF_original / onshore_CF)
+
+
+def pv_size(c, PV_CF_original, PV_CF):
+    return c['pv_size'] * (PV_CF_original / PV_CF)
+
+
+def uranium(c, uranium_cost):
+    # Calculate uranium costs
+    return c['nuclear_electr'] * uranium_cost
+
+
+def OM(c, offshore_size, onshore_size, CAPEX_offshore, CAPEX_onshore, OPEX_nuclear, OM_nuc):
+    # Set OPEX values (CAPEX * fixed_OM_nuc cancels out to the nuclear O&M per MW)
+    fixed_OM_nuc = (OM_nuc * 8760 * 0.9) / 1e6
+    OPEX_nuclear = OPEX_nuclear - 14.26 - 9.33
+
+    # Calculate O&M costs
+    return (c['OM'] + c['nuc_size'] * fixed_OM_nuc + CAPEX_offshore * offshore_size * FIXED_OM_OFF
+            + CAPEX_onshore * onshore_size * FIXED_OM_ON + c['nuclear_electr'] * (OPEX_nuclear - 15))
+
+
+def inv_res(c, offshore_size, onshore_size, pv_size, CAPEX_offshore, CAPEX_onshore, ir, lifetime_off, lifetime_on):
+    # Calculate investment in renewable energy (wind, solar, hydro, river etc.)
+    return (c['inv_res']
+            + np.round(offshore_size * CAPEX_offshore * ir / (1 - (1 + ir)**(-lifetime_off)), 0)
+            + np.round(onshore_size * CAPEX_onshore * ir / (1 - (1 + ir)**(-lifetime_on)), 0)
+            + np.round(pv_size * CAPEX_PV * ir / (1 - (1 + ir)**(-LIFETIME_PV)), 0))
+
+
+def inv_nuc(c, CAPEX_nuclear, ir, lifetime_nuc):
+    # Calculate investment in nuclear power
+    return c['nuc_size'] * CAPEX_nuclear * ir / (1 - (1 + ir)**(-lifetime_nuc))
+
+
+def rem_inv(c):
+    # Remaining investments do not depend on the assumptions
+    return c['remaining_inv']
+
+
+def total(c, uranium, inv_res, OM, inv_nuc, rem_inv):
+    return uranium + inv_res + OM + inv_nuc + rem_inv
+
+
+# Components in an order where every component comes after the components it depends on, with the names of the
+# assumptions and components they depend on (their arguments after c)
+COMPONENTS = {function.__name__: (function, tuple(inspect.signature(function).parameters)[1:])
+              for function in (offshore_size, onshore_size, pv_size, uranium, OM, inv_res, inv_nuc, rem_inv, total)}
+
+# Assumptions the components depend on
+ASSUMPTIONS = tuple(CAPEX_OPEX_DEFAULTS) + ('ir', 'lifetime_nuc', 'lifetime_off', 'lifetime_on', 'uranium_cost',
+                                            'OM_nuc', 'offshore_CF', 'onshore_CF', 'PV_CF', 'offshore_CF_original',
+                                            'onshore_CF_original', 'PV_CF_original')
+
+
+def _as_assumption(value):
+    # Add a scenario axis to an assumption
+    return np.asarray(value, dtype = float)[..., np.newaxis]
+
+
+def _coefficient_arrays(coefficients):
+    return {name: coefficients[name].to_numpy() for name in coefficients.columns}
+
+
+def _evaluate(name, c, values):
+    function, deps = COMPONENTS[name]
+    return function(c, *(values[dep] for dep in deps))
+
+
+def evaluate(coefficients, assumptions):
+    '''
+    This function evaluates all cost categories at once
+
+    :param coefficients: dataframe from cost_coefficients
+    :param assumptions: dictionary with a value (number or numpy array) for every name in ASSUMPTIONS
+
+    :return: 5 arrays (see CATEGORIES) with shape (*shape of the assumptions, number of scenarios)
+    '''
+    c = _coefficient_arrays(coefficients)
+    values = {name: _as_assumption(assumptions[name]) for name in ASSUMPTIONS}
+    for name in COMPONENTS:
+        if name != 'total':
+            values[name] = _evaluate(name, c, values)
+
+    shape = np.broadcast_shapes(*(values[name].shape for name in CATEGORIES))
+    return tuple(np.broadcast_to(values[name], shape) for name in CATEGORIES)
+
+
+class CostModel:
+    '''
+    Cost categories of a set of scenarios that are evaluated again only when an assumption they depend on changes
+
+    :param coefficients: dataframe from cost_coefficients (all scenarios in the registry if None)
+    :param assumptions: values for any of ASSUMPTIONS (calc_costs defaults and interface if not given). Values can be
+                        numbers or numpy arrays, which are broadcast against each other
+    '''
+
+    def __init__(self, coefficients = None, **assumptions):
+        if coefficients is None:
+            from plot_costs import cost_coefficients
+            coefficients = cost_coefficients()
+
+        self.scenarios = list(coefficients.index)
+        self.coefficients = _coefficient_arrays(coefficients)
+        self.assumptions = {**CAPEX_OPEX_DEFAULTS, **default_assumptions(), **original_capacity_factors()}
+        self._values = {}
+        self.set(**assumptions)
+
+    def set(self, **changes):
+        '''
+        This function changes assumptions. Components that depend on a changed assumption (directly or through other
+        components) are forgotten, and evaluated again when they are asked for
+
+        :param changes: new values for any of ASSUMPTIONS
+
+        :return: list of the components that were forgotten
+        '''
+        changed = set()
+        for name, value in changes.items():
+            if name not in ASSUMPTIONS:
+                raise KeyError(f'Unknown assumption: {name}')
+            if np.array_equal(self.assumptions[name], value):
+                continue
+            self.assumptions[name] = value
+            self._values.pop(name, None)
+            changed.add(name)
+
+        forgotten = []
+        for name, (function, deps) in COMPONENTS.items():
+            if changed.intersection(deps):
+                changed.add(name)
+                if self._values.pop(name, None) is not None:
+                    forgotten.append(name)
+        return forgotten
+
+    def __getitem__(self, name):
+        '''
+        :param name: Name of a component (see COMPONENTS) or an assumption
+
+        :return: array with shape (*shape of the assumptions it depends on, number of scenarios)
+        '''
+        if name not in self._values:
+            if name in ASSUMPTIONS:
+                self._values[name] = _as_assumption(self.assumptions[name])
+            else:
+                for dep in COMPONENTS[name][1]:
+                    self[dep]
+                count(f'costs.model.{name}')
+                self._values[name] = _evaluate(name, self.coefficients, self._values)
+        return self._values[name]
+
+    def arrays(self):
+        '''
+        :return: 5 arrays (see CATEGORIES) broadcast to the same shape, like cost_kernel
+        '''
+        values = [self[name] for name in CATEGORIES]
+        shape = np.broadcast_shapes(*(value.shape for value in values))
+        return tuple(np.broadcast_to(value, shape) for value in values)
+
+    def total(self):
+        '''
+        :return: array with the total cost of each scenario
+        '''
+        return self['total']
+
+    def costs(self):
+        '''
+        :return: 5 dictionaries (for each category) with scenario costs, like calc_costs. The assumptions must be numbers
+        '''
+        return tuple({name: float(value) for name, value in zip(self.scenarios, np.ravel(values))}
+                     for values in self.arrays())
@@ -0,0 +1,293 @@
+'''
+Persistent cache of data extracted from EnergyPLAN excel files.
+
+Every entry holds the dataframes that one extractor (get_annual_data, get_timeseries) made from one sheet, stored
+column by column in a numpy .npz file. Entries are keyed by a hash of the workbook bytes, the sheet name, the kind of
+extraction and the extractor version, so a changed workbook or extractor never gives old results.
+
+Other caches in the same directory (figures, balances) are kept in directories starting with a dot, which are not
+entries and are left alone by list, verify and evict.
+
+Use from the command line:
+
+    python data_cache.py list
+    python data_cache.py verify
+    python data_cache.py evict --all | --key KEY | --workbook FILE | --older-than DAYS
+'''
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+# Directory with cache entries. Can be changed with the ENERGYPLAN_CACHE environment variable
+CACHE_DIR = os.environ.get('ENERGYPLAN_CACHE', '.cache')
+
+# Set to False to always read from excel
+enabled = True
+
+# Workbook hashes, keyed by (absolute path, modification time, size) so each file version is only hashed once
+_hashes = {}
+
+
+def workbook_hash(file_path):
+    '''
+    This function returns the sha256 hash of the bytes in a workbook
+
+    :param file_path: File path to excel file
+
+    :return: hex digest
+    '''
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+    if key not in _hashes:
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        _hashes[key] = digest.hexdigest()
+    return _hashes[key]
+
+
+def seed_hash(key, digest):
+    '''
+    This function records the hash of a file that was hashed somewhere else (e.g. by the main process of a worker), so
+    workbook_hash does not read the file again
+
+    :param key: (absolute path, modification time in ns, size) of the file when it was hashed
+    :param digest: hex digest from workbook_hash
+
+    :return: None
+    '''
+    _hashes[tuple(key)] = digest
+
+
+def entry_key(digest, sheet, kind, version, extra = ()):
+    '''
+    This function makes the key of a cache entry
+
+    :param digest: Hash of the workbook bytes
+    :param sheet: Name of the sheet in the excel file
+    :param kind: Kind of extraction, e.g. 'annual' or 'timeseries'
+    :param version: Version of the extractor
+    :param extra: Any other arguments that change the result of the extractor
+
+    :return: key string
+    '''
+    text = json.dumps([digest, sheet, kind, version, list(extra)])
+    return hashlib.sha256(text.encode()).hexdigest()[:32]
+
+
+def _file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _save_frame(path, df):
+    # One array per column, plus the column names and the index
+    arrays = {f'c{i}': df.iloc[:, i].to_numpy() for i in range(df.shape[1])}
+    np.savez(path, columns = np.array(list(df.columns), dtype = object), index = df.index.to_numpy(), **arrays)
+
+
+def _load_frame(path):
+    with np.load(path, allow_pickle = True) as npz:
+        columns = list(npz['columns'])
+        df = pd.DataFrame({i: npz[f'c{i}'] for i in range(len(columns))}, index = npz['index'])
+    df.columns = columns
+    return df
+
+
+def load(file_path, sheet, kind, version, extra = (), cache_dir = None):
+    '''
+    This function loads the dataframes of a cache entry
+
+    :param file_path: File path to excel file with EnergyPLAN results
+    :param sheet: Name of the sheet in the excel file
+    :param kind: Kind of extraction, e.g. 'annual' or 'timeseries'
+    :param version: Version of the extractor
+    :param extra: Any other arguments that change the result of the extractor
+    :param cache_dir: Cache directory (CACHE_DIR if None)
+
+    :return: dictionary with dataframes, or None if there is no entry
+    '''
+    if not enabled:
+        return None
+
+    entry = os.path.join(cache_dir or CACHE_DIR, entry_key(workbook_hash(file_path), sheet, kind, version, extra))
+    try:
+        with open(os.path.join(entry, 'meta.json')) as f:
+            meta = json.load(f)
+        return {name: _load_frame(os.path.join(entry, f'{name}.npz')) for name in meta['files']}
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save(file_path, sheet, kind, version, frames, extra = (), cache_dir = None):
+    '''
+    This function stores dataframes in a cache entry
+
+    :param file_path: File path to excel file with EnergyPLAN results
+    :param sheet: Name of the sheet in the excel file
+    :param kind: Kind of extraction, e.g. 'annual' or 'timeseries'
+    :param version: Version of the extractor
+    :param frames: dictionary with dataframes
+    :param extra: Any other arguments that change the result of the extractor
+    :param cache_dir: Cache directory (CACHE_DIR if None)
+
+    :return: None
+    '''
+    if not enabled:
+        return
+
+    cache_dir = cache_dir or CACHE_DIR
+    digest = workbook_hash(file_path)
+    entry = os.path.join(cache_dir, entry_key(digest, sheet, kind, version, extra))
+    if os.path.isdir(entry):
+        return
+
+    # Write to a temporary directory first so other processes never see half an entry
+    os.makedirs(cache_dir, exist_ok = True)
+    tmp = tempfile.mkdtemp(dir = cache_dir, prefix = '.tmp-')
+    try:
+        files = {}
+        for name, df in frames.items():
+            path = os.path.join(tmp, f'{name}.npz')
+            _save_frame(path, df)
+            files[name] = _file_hash(path)
+
+        meta = {'workbook': os.path.abspath(file_path), 'workbook_hash': digest, 'sheet': sheet, 'kind': kind,
+                'version': version, 'extra': list(extra), 'created': time.time(), 'files': files}
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent = 1)
+
+        os.rename(tmp, entry)
+    except OSError:
+        # Another process stored the same entry first
+        shutil.rmtree(tmp, ignore_errors = True)
+
+
+def list_entries(cache_dir = None):
+    '''
+    This function lists all cache entries
+
+    :param cache_dir: Cache directory (CACHE_DIR if None)
+
+    :return: list of dictionaries with key, workbook, sheet, kind, version, created and size in bytes
+    '''
+    cache_dir = cache_dir or CACHE_DIR
+    if not os.path.isdir(cache_dir):
+        return []
+
+    entries = []
+    for key in sorted(os.listdir(cache_dir)):
+        entry = os.path.join(cache_dir, key)
+        if key.startswith('.') or not os.path.isdir(entry):
+            continue
+        try:
+            with open(os.path.join(entry, 'meta.json')) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {}
+        meta['key'] = key
+        meta['size'] = sum(os.path.getsize(os.path.join(entry, name)) for name in os.listdir(entry))
+        entries.append(meta)
+    return entries
+
+
+def verify(cache_dir = None):
+    '''
+    This function checks that the files of every cache entry are intact and says if the workbook they were made from
+    has changed or is gone (these entries can never be used again)
+
+    :param cache_dir: Cache directory (CACHE_DIR if None)
+
+    :return: list of (key, problem) tuples where problem is None for good entries
+    '''
+    cache_dir = cache_dir or CACHE_DIR
+    results = []
+    for meta in list_entries(cache_dir):
+        entry = os.path.join(cache_dir, meta['key'])
+        problem = None
+        if 'files' not in meta:
+            problem = 'missing or broken meta.json'
+        else:
+            for name, digest in meta['files'].items():
+                path = os.path.join(entry, f'{name}.npz')
+                if not os.path.isfile(path) or _file_hash(path) != digest:
+                    problem = f'{name}.npz is missing or corrupt'
+                    break
+
+        if problem is None:
+            if not os.path.isfile(meta['workbook']):
+                problem = 'workbook is gone'
+            elif workbook_hash(meta['workbook']) != meta['workbook_hash']:
+                problem = 'workbook has changed'
+        results.append((meta['key'], problem))
+    return results
+
+
+def evict(keys = None, workbook = None, older_than = None, everything = False, cache_dir = None):
+    '''
+    This function removes cache entries
+
+    :param keys: List of entry keys to remove
+    :param workbook: Remove all entries made from this workbook file
+    :param older_than: Remove entries older than this number of days
+    :param everything: Remove all entries if True
+    :param cache_dir: Cache directory (CACHE_DIR if None)
+
+    :return: number of removed entries
+    '''
+    cache_dir = cache_dir or CACHE_DIR
+    keys = set(keys or [])
+    workbook = os.path.abspath(workbook) if workbook else None
+
+    removed = 0
+    for meta in list_entries(cache_dir):
+        if (everything or meta['key'] in keys
+                or (workbook is not None and meta.get('workbook') == workbook)
+                or (older_than is not None and time.time() - meta.get('created', 0) > older_than * 86400)):
+            shutil.rmtree(os.path.join(cache_dir, meta['key']), ignore_errors = True)
+            removed += 1
+    return removed
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Manage the cache of data extracted from EnergyPLAN workbooks')
+    parser.add_argument('--cache-dir', default = None, help = 'cache directory (default: %s)' % CACHE_DIR)
+    commands = parser.add_subparsers(dest = 'command', required = True)
+    commands.add_parser('list', help = 'list cache entries')
+    commands.add_parser('verify', help = 'check cache entries')
+    evict_parser = commands.add_parser('evict', help = 'remove cache entries')
+    evict_parser.add_argument('--all', action = 'store_true', help = 'remove all entries')
+    evict_parser.add_argument('--key', action = 'append', help = 'remove the entry with this key')
+    evict_parser.add_argument('--workbook', help = 'remove entries made from this workbook')
+    evict_parser.add_argument('--older-than', type = float, help = 'remove entries older than this number of days')
+    evict_parser.add_argument('--invalid', action = 'store_true', help = 'remove entries that fail verify')
+    args = parser.parse_args(argv)
+
+    if args.command == 'list':
+        for meta in list_entries(args.cache_dir):
+            created = time.strftime('%Y-%m-%d %H:%M', time.localtime(meta.get('created', 0)))
+            print(f"{meta['key']}  {meta.get('kind', '?'):<10} {meta.get('sheet', '?'):<20} "
+                  f"{meta['size'] / 1024:8.1f} kB  {created}  {meta.get('workbook', '?')}")
+
+    elif args.command == 'verify':
+        for key, problem in verify(args.cache_dir):
+            print(f"{key}  {problem or 'ok'}")
+
+    elif args.command == 'evict':
+        keys = list(args.key or [])
+        if args.invalid:
+            keys += [key for key, problem in verify(args.cache_dir) if problem]
+        removed = evict(keys, args.workbook, args.older_than, args.all, args.cache_dir)
+        print(f'Removed {removed} entries')
+
+
+if __name__ == '__main__':
+    main()
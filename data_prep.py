@@ -2,9 +2,313 @@
 
 '''
 
+import hashlib
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections import OrderedDict, defaultdict
+import numpy as np
 import pandas as pd
+import data_cache
+import instrument
+from instrument import count, span, timed
 
-def get_timeseries(file_path, sheet, extra_columns, output_file = '.', save = False):
+# Version of the extractors below. Increase it when they change so old cache entries are not used
+EXTRACTOR_VERSION = 2
+
+# Number of workbooks that are kept open in memory at the same time
+WORKBOOK_CACHE_SIZE = 4
+
+# First row (0-based) of the hourly values. The annual data and the column names are in the rows above
+HOURLY_START = 107
+
+# Number of rows the hourly block is read in at a time
+HOURLY_CHUNK = 1024
+
+# Aggregation levels of timeseries from fine to coarse, with their pandas resampling frequencies
+AGGREGATION_LEVELS = {'hourly': 'h', 'daily': 'D', 'weekly': 'W', 'monthly': 'MS'}
+AGGREGATION_STATS = ('mean', 'min', 'max')
+
+# Time of the first hour in the timeseries
+TIMESERIES_START = '2045-01-01'
+
+# Open workbooks, keyed by (absolute path, modification time, size) and ordered from least to most recently used
+_workbook_cache = OrderedDict()
+
+
+def _workbook_key(file_path):
+    stat = os.stat(file_path)
+    return (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+
+
+def _open_workbook(source):
+    # openpyxl is only imported when a workbook is read, not when every result comes from the cache
+    import openpyxl
+
+    # Read-only workbooks stream the sheets row by row instead of loading every cell
+    return openpyxl.load_workbook(source, read_only = True, data_only = True, keep_links = False)
+
+
+def _add_workbook(key, book):
+    path = key[0]
+
+    # Forget older versions of the same file before adding the new one
+    for old_key in [k for k in _workbook_cache if k[0] == path]:
+        _workbook_cache.pop(old_key)['book'].close()
+
+    workbook = {'book': book, 'sheets': {}}
+    _workbook_cache[key] = workbook
+
+    # Drop the least recently used workbooks
+    while len(_workbook_cache) > WORKBOOK_CACHE_SIZE:
+        _workbook_cache.popitem(last = False)[1]['book'].close()
+    return workbook
+
+
+def clear_workbook_cache():
+    '''
+    This function closes all open workbooks, so the next read opens and parses the excel file again
+
+    :return: None
+    '''
+    while _workbook_cache:
+        _workbook_cache.popitem()[1]['book'].close()
+
+
+def _get_workbook(file_path):
+    # Key on modification time and size so edited workbooks are read again
+    key = _workbook_key(file_path)
+
+    workbook = _workbook_cache.get(key)
+    if workbook is None:
+        count('workbook.cache_miss')
+        with span('workbook.open', path = file_path):
+            workbook = _add_workbook(key, _open_workbook(file_path))
+    else:
+        count('workbook.cache_hit')
+        _workbook_cache.move_to_end(key)
+    return workbook
+
+
+def _iter_rows(workbook, sheet, min_row, max_row = None):
+    worksheet = workbook['book'][sheet]
+
+    # Do not trust the sheet dimensions stored in the file (pandas does the same)
+    worksheet.reset_dimensions()
+    return worksheet.iter_rows(min_row = min_row + 1, max_row = max_row, values_only = True)
+
+
+def _row_width(row):
+    # Number of used columns in a row
+    for i in range(len(row) - 1, -1, -1):
+        if row[i] is not None and row[i] != '':
+            return i + 1
+    return 0
+
+
+def _convert_cell(value):
+    # Convert cells the way pandas does: empty cells are missing and whole numbers are integers
+    if value is None or value == '':
+        return np.nan
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _get_sheet(file_path, sheet):
+    '''
+    This function returns a raw copy of the rows above the hourly values of an excel sheet (no header, all cells)
+    from the in-memory workbook cache. The workbook is opened once, and only these rows are read, the first time
+    the sheet is asked for
+
+    :param file_path: File path to excel file with EnergyPLAN results
+    :param sheet: Name of the sheet in the excel file
+
+    :return: raw dataframe and an array with the number of used columns in each row
+    '''
+
+    workbook = _get_workbook(file_path)
+
+    if sheet not in workbook['sheets']:
+        with span('sheet.parse', sheet = sheet):
+            rows = list(_iter_rows(workbook, sheet, 0, HOURLY_START))
+            rows += [()] * (HOURLY_START - len(rows))
+
+            widths = np.array([_row_width(row) for row in rows])
+            width = widths.max(initial = 0)
+            raw = pd.DataFrame([[_convert_cell(value) for value in row[:width]] + [np.nan] * (width - len(row))
+                                for row in rows], dtype = object)
+        workbook['sheets'][sheet] = (raw, widths)
+
+    return workbook['sheets'][sheet]
+
+
+def _read_hourly(file_path, sheet, column_names, keep):
+    '''
+    This function reads the hourly values (from row 108) of an excel sheet one chunk of rows at a time. Columns with
+    only zeros are dropped while reading, so memory use follows the columns that are kept
+
+    :param file_path: File path to excel file with EnergyPLAN results
+    :param sheet: Name of the sheet in the excel file
+    :param column_names: Names of all columns
+    :param keep: Names of columns to keep even if they only have zeros
+
+    :return: dataframe with the columns that are not all zeros and the columns in keep
+    '''
+
+    workbook = _get_workbook(file_path)
+    keep = {i for i, name in enumerate(column_names) if name in keep}
+
+    chunks = []             # (first row, rows, width, {column: values}) for each chunk
+    nonzero = set()         # columns with at least one value that is not 0 (empty cells count as not 0)
+    empty_rows = []         # rows without any values
+    n_rows = 0              # rows up to and including the last row that is not empty
+
+    def add_chunk(first, rows):
+        nonlocal n_rows
+        width = max(len(row) for row in rows)
+        values = np.full((len(rows), width), np.nan)
+        filled = np.zeros(len(rows), dtype = bool)
+        for i, row in enumerate(rows):
+            values[i, :len(row)] = np.array(row, dtype = float)
+            filled[i] = _row_width(row) > 0
+        if filled.any():
+            n_rows = first + np.nonzero(filled)[0][-1] + 1
+        empty_rows.extend(first + np.nonzero(~filled)[0])
+
+        # Empty rows are left out here, since they are dropped if they are at the end
+        used = (values[filled] != 0).any(axis = 0)
+        nonzero.update(np.nonzero(used)[0])
+        stored = range(width) if not filled.all() else [col for col in range(width) if used[col] or col in keep]
+        chunks.append((first, len(rows), width, {col: values[:, col].copy() for col in stored}))
+
+    try:
+        rows = []
+        first = 0
+        for row in _iter_rows(workbook, sheet, HOURLY_START):
+            rows.append(row)
+            if len(rows) == HOURLY_CHUNK:
+                add_chunk(first, rows)
+                first += len(rows)
+                rows = []
+        if rows:
+            add_chunk(first, rows)
+    except (ValueError, TypeError):
+        # Text in the hourly values, read the usual way
+        df = pd.read_excel(file_path, sheet_name = sheet, skiprows = HOURLY_START, header = None)
+        df.columns = column_names
+        return df
+
+    # The number of columns is set by the widest row in the sheet, also above the hourly values
+    width = max([int(_get_sheet(file_path, sheet)[1].max(initial = 0))] + [chunk[2] for chunk in chunks])
+    if width != len(column_names):
+        raise ValueError(f'Length mismatch: Expected axis has {width} elements, new values have '
+                         f'{len(column_names)} elements')
+
+    # Cells in empty rows that are not at the end, and cells past the end of narrower rows, are empty
+    if any(row < n_rows for row in empty_rows):
+        nonzero.update(range(width))
+    for first, rows, chunk_width, _ in chunks:
+        if first < n_rows:
+            nonzero.update(range(chunk_width, width))
+
+    columns = {}
+    for col in sorted(nonzero | keep):
+        parts = [values.get(col, np.zeros(rows) if col < chunk_width else np.full(rows, np.nan))
+                 for first, rows, chunk_width, values in chunks]
+        column = np.concatenate(parts)[:n_rows] if parts else np.array([])
+
+        # Columns with only whole numbers (and no empty cells) are integers
+        if np.all(column == np.round(column)):
+            column = column.astype(np.int64)
+        columns[col] = column
+
+    df = pd.DataFrame({i: columns[col] for i, col in enumerate(columns)}, index = pd.RangeIndex(n_rows))
+    df.columns = [column_names[col] for col in columns]
+    return df
+
+
+def _dedup_names(names):
+    '''
+    Make duplicate column names unique the same way pandas does ('Fixed', 'Fixed.1', ...)
+    '''
+    names = list(names)
+    counts = defaultdict(int)
+    for i, name in enumerate(names):
+        count = counts[name]
+        while count > 0:
+            counts[name] = count + 1
+            name = f'{name}.{count}'
+            count = counts[name]
+        names[i] = name
+        counts[name] = count + 1
+    return names
+
+
+def _read_block(file_path, sheet, skiprows, nrows, usecols = None, header = 0):
+    '''
+    This function returns a block of an excel sheet from the workbook cache. It takes the same arguments as
+    pd.read_excel and gives the same dataframe, without opening and parsing the file again
+
+    :param file_path: File path to excel file with EnergyPLAN results
+    :param sheet: Name of the sheet in the excel file
+    :param skiprows: Number of rows to skip at the top of the sheet
+    :param nrows: Number of rows to read
+    :param usecols: List of column positions to keep (all columns if None)
+    :param header: 0 if the first row of the block holds the column names, None if there are no column names
+
+    :return: dataframe with the block
+    '''
+
+    raw, widths = _get_sheet(file_path, sheet)
+    if skiprows + nrows > HOURLY_START:
+        raise ValueError('Blocks must end above the hourly values')
+
+    # pandas only looks at the rows it needs (one extra row without a header), and the width of the result
+    # follows the widest of these rows
+    first = skiprows + (0 if header is None else 1)
+    last = min(first + nrows, len(raw))
+    rows_read = first + nrows + (1 if header is None else 0)
+    width = int(widths[:rows_read].max(initial = 0))
+
+    # Trailing empty rows are dropped
+    filled = np.nonzero(widths[first:last])[0]
+    last = first + (filled[-1] + 1 if len(filled) else 0)
+
+    columns = list(range(width)) if usecols is None else list(usecols)
+    block = raw.iloc[first:last, columns].reset_index(drop = True)
+
+    # Convert columns to numbers where possible, like pandas does for each column it reads
+    for col in block.columns:
+        if block[col].dtype == object:
+            try:
+                block[col] = pd.to_numeric(block[col])
+            except (ValueError, TypeError):
+                pass
+
+    if header is None:
+        block.columns = range(len(columns))
+    else:
+        # Column names are made from the whole header row before the columns are selected
+        names = []
+        for i in range(width):
+            name = raw.iat[skiprows, i] if skiprows < len(raw) and i < raw.shape[1] else np.nan
+            if pd.isna(name):
+                name = f'Unnamed: {i}'
+            elif isinstance(name, float) and name.is_integer():
+                name = int(name)
+            names.append(name)
+        names = _dedup_names(names)
+        block.columns = [names[i] for i in columns]
+
+    return block
+
+
+@timed('data.get_timeseries')
+def get_timeseries(file_path, sheet, extra_columns, output_file = '.', save = False, use_cache = True,
+                   file_format = 'csv'):
     '''
     This function processes and returns timeseries data from EnergyPLAN excel files with nice names, 
     and only necessary columns
@@ -13,16 +317,24 @@ def get_timeseries(file_path, sheet, extra_columns, output_file = '.', save = Fa
     :param sheet: Name of the sheet in the excel file
     :param extra_columns: Add any extra columns with only 0 values if they are needed
     :param output_file: File to save result in if save = True
-    :param save: Saves the results to csv if True. Else False
+    :param save: Saves the results to output_file if True. Else False
+    :param use_cache: Use the on-disk cache in data_cache if True
+    :param file_format: 'csv' for a csv file, or 'npy' for a binary store directory (see save_timeseries_store)
     
     :return: Timeseries dataframe
     '''
-    
-    # Read excel file
-    xls = pd.ExcelFile(file_path)
+
+    # Use the cached result if this workbook and sheet have been extracted before
+    cached = data_cache.load(file_path, sheet, 'timeseries', EXTRACTOR_VERSION, extra_columns) if use_cache else None
+    if cached is not None:
+        count('data.timeseries_cache_hit')
+        df_hourly_values_filtered = cached['HOURLY']
+        if save == True:
+            _save_timeseries(df_hourly_values_filtered, output_file, file_format)
+        return df_hourly_values_filtered
 
     # read columns from rows 83 and 84 (index 82 and 83)
-    df_columns = pd.read_excel(xls, sheet_name=sheet, skiprows=82, nrows=2, header=None)
+    df_columns = _read_block(file_path, sheet, skiprows=82, nrows=2, header=None)
 
     # Conbine the rows to make column names
     column_names = df_columns.astype(str).apply(lambda x: ' '.join(x.dropna()), axis=0).tolist()
@@ -30,9 +342,9 @@ def get_timeseries(file_path, sheet, extra_columns, output_file = '.', save = Fa
     clean_column_names.insert(0, 'index')
     clean_column_names = ['Hour' if name == 'nan nan' else name for name in clean_column_names]
 
-    # Read the timeseries from row 108 with the new column names
-    df_hourly_values = pd.read_excel(xls, sheet_name=sheet, skiprows=107, header=None)
-    df_hourly_values.columns = clean_column_names
+    # Read the timeseries from row 108 with the new column names (without columns that are all zero)
+    with span('sheet.hourly', sheet = sheet):
+        df_hourly_values = _read_hourly(file_path, sheet, clean_column_names, extra_columns)
 
     # Remove empty columns and 'index'
     df_hourly_values_filtered = df_hourly_values.loc[:, (df_hourly_values != 0).any(axis=0)]
@@ -43,52 +355,334 @@ def get_timeseries(file_path, sheet, extra_columns, output_file = '.', save = Fa
         if col in df_hourly_values.columns:
             df_hourly_values_filtered[col] = df_hourly_values[col]
 
-    # Save to CSV if save = True
+    if use_cache:
+        data_cache.save(file_path, sheet, 'timeseries', EXTRACTOR_VERSION, {'HOURLY': df_hourly_values_filtered},
+                        extra_columns)
+
+    # Save to file if save = True
     if save == True:
-        df_hourly_values_filtered.to_csv(output_file, index=False)
+        _save_timeseries(df_hourly_values_filtered, output_file, file_format)
 
     return df_hourly_values_filtered
 
 
-def get_annual_data(file_path, sheet):
+def _save_timeseries(df, output_file, file_format):
+    with span('timeseries.save', path = output_file, format = file_format):
+        _write_timeseries(df, output_file, file_format)
+
+
+def _write_timeseries(df, output_file, file_format):
+    if file_format == 'csv':
+        df.to_csv(output_file, index=False)
+        save_aggregates(output_file)
+    elif file_format == 'npy':
+        save_timeseries_store(df, output_file)
+    else:
+        raise ValueError(f'Unknown file format: {file_format}')
+
+
+def save_timeseries_store(df, directory):
+    '''
+    This function saves a timeseries dataframe as a binary store: a directory with one .npy file (float array) per
+    column and columns.json with the column names. Columns can then be memory-mapped one at a time
+
+    :param df: Timeseries dataframe
+    :param directory: Directory to save the store in
+
+    :return: None
+    '''
+    os.makedirs(directory, exist_ok = True)
+    columns = [str(col) for col in df.columns]
+    for i, col in enumerate(df.columns):
+        np.save(os.path.join(directory, f'c{i}.npy'), np.asarray(df[col], dtype = float))
+
+    # Write the column index last, so a store is only complete when it exists
+    with open(os.path.join(directory, 'columns.json'), 'w') as f:
+        json.dump({'columns': columns, 'rows': len(df)}, f)
+
+    save_aggregates(directory)
+
+
+class TimeseriesStore:
+    '''
+    Read-only view of a binary timeseries store. Columns are memory-mapped the first time they are used, so only the
+    columns that are used take up memory. Columns are returned as pandas Series, like columns of a dataframe
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'columns.json')) as f:
+            index = json.load(f)
+        self.columns = index['columns']
+        self._files = {col: os.path.join(directory, f'c{i}.npy') for i, col in enumerate(self.columns)}
+        self._rows = index['rows']
+        self._loaded = {}
+
+    def __getitem__(self, column):
+        if column not in self._loaded:
+            if column not in self._files:
+                raise KeyError(column)
+            values = np.load(self._files[column], mmap_mode = 'r')
+            self._loaded[column] = pd.Series(values, name = column, copy = False)
+        return self._loaded[column]
+
+    def __contains__(self, column):
+        return column in self._files
+
+    def __len__(self):
+        return self._rows
+
+    def frame(self, columns = None):
+        '''
+        :param columns: list of columns (all columns if None)
+
+        :return: dataframe with the columns
+        '''
+        return pd.DataFrame({col: self[col] for col in (columns or self.columns)})
+
+
+def open_timeseries(path):
+    '''
+    This function opens timeseries saved by get_timeseries. A binary store is used if there is one, and the csv file
+    otherwise
+
+    :param path: Path to the saved timeseries, with or without .csv at the end (e.g. 'Data/Only RES_timeseries')
+
+    :return: TimeseriesStore or dataframe
+    '''
+    if path.endswith('.csv'):
+        path = path[:-len('.csv')]
+    if os.path.isfile(os.path.join(path, 'columns.json')):
+        return TimeseriesStore(path)
+    return pd.read_csv(path + '.csv')
+
+
+def timeseries_columns(path):
+    '''
+    This function reads the column names of saved timeseries without reading the values
+
+    :param path: Path to the saved timeseries (see open_timeseries)
+
+    :return: list of column names
+    '''
+    path = _strip_csv(path)
+    if os.path.isfile(os.path.join(path, 'columns.json')):
+        with open(os.path.join(path, 'columns.json')) as f:
+            return json.load(f)['columns']
+    if os.path.isfile(path + '.csv'):
+        return list(pd.read_csv(path + '.csv', nrows = 0).columns)
+    raise FileNotFoundError(f'No saved timeseries at {path} (a binary store or {path}.csv). Extract the timeseries '
+                            f'first (python main.py extract)')
+
+
+def _strip_csv(path):
+    return path[:-len('.csv')] if path.endswith('.csv') else path
+
+
+def _aggregates_dir(path):
+    # Levels of a binary store are saved in the store, levels of a csv file in a directory next to it
+    path = _strip_csv(path)
+    if os.path.isfile(os.path.join(path, 'columns.json')):
+        return path
+    return path + '.levels'
+
+
+def _source_signature(path):
+    # Hashes of the files with the hourly values, so levels are made again only when the values change
+    path = _strip_csv(path)
+    if not os.path.isfile(os.path.join(path, 'columns.json')):
+        return [data_cache.workbook_hash(path + '.csv')]
+    names = sorted(name for name in os.listdir(path) if name == 'columns.json' or
+                   (name.startswith('c') and name.endswith('.npy')))
+    return [data_cache.workbook_hash(os.path.join(path, name)) for name in names]
+
+
+def timeseries_hash(path):
+    '''
+    This function returns a hash of the hourly values of saved timeseries
+
+    :param path: Path to the saved timeseries (see open_timeseries)
+
+    :return: hex digest
+    '''
+    return data_cache.entry_key('', '', 'timeseries', EXTRACTOR_VERSION, _source_signature(path))
+
+
+def _level_info(path):
+    # levels.json of saved timeseries if it was made from the current hourly values, else None
+    levels_file = os.path.join(_aggregates_dir(path), 'levels.json')
+    if not os.path.isfile(levels_file):
+        return None
+    with open(levels_file) as f:
+        info = json.load(f)
+    if info['source'] != _source_signature(path):
+        return None
+    # Files written before levels were listed have every level
+    info.setdefault('levels', [level for level in AGGREGATION_LEVELS if level != 'hourly'])
+    return info
+
+
+def save_aggregates(path, start = TIMESERIES_START, levels = None):
+    '''
+    This function saves the daily, weekly and monthly mean, min and max of every column of saved timeseries, so
+    views at any resolution can be read without going through the hourly values
+
+    :param path: Path to the saved timeseries (see open_timeseries)
+    :param start: Time of the first hour
+    :param levels: List of levels to save (every level except hourly if None). Levels saved before from the same
+                   hourly values are kept
+
+    :return: Directory with the levels. Each period is indexed by its first hour
+    '''
+    levels = [level for level in AGGREGATION_LEVELS if level != 'hourly' and (levels is None or level in levels)]
+    info = _level_info(path)
+    saved = set(info['levels']) if info is not None and info['start'] == str(pd.Timestamp(start)) else set()
+
+    data = open_timeseries(path)
+    df = data.frame() if isinstance(data, TimeseriesStore) else data
+    df = df.select_dtypes('number').astype(float)
+    df.index = pd.date_range(start, periods = len(df), freq = 'h')
+
+    directory = _aggregates_dir(path)
+    os.makedirs(directory, exist_ok = True)
+    for level in levels:
+        freq = AGGREGATION_LEVELS[level]
+        resampled = df.resample(freq)
+        for stat in AGGREGATION_STATS:
+            values = getattr(resampled, stat)()
+            np.save(os.path.join(directory, f'{level}_{stat}.npy'), values.to_numpy())
+        # Periods are indexed by their first hour (pandas labels weeks by their last day)
+        first_hours = df.index.to_series().resample(freq).min()
+        np.save(os.path.join(directory, f'{level}_index.npy'), first_hours.to_numpy())
+
+    # Written last, so the levels are only used when they are complete
+    saved.update(levels)
+    with open(os.path.join(directory, 'levels.json'), 'w') as f:
+        json.dump({'columns': [str(col) for col in df.columns], 'start': str(df.index[0]), 'rows': len(df),
+                   'source': _source_signature(path), 'levels': [level for level in AGGREGATION_LEVELS
+                                                                 if level in saved]}, f)
+    return directory
+
+
+def choose_level(start, end, points):
+    '''
+    This function chooses the coarsest aggregation level with at least a given number of values between two times
+
+    :param start: First time of the window
+    :param end: Last time of the window
+    :param points: Number of values needed (e.g. the width of the plot in pixels)
+
+    :return: Name of the level
+    '''
+    span = pd.Timestamp(end) - pd.Timestamp(start)
+    lengths = {'hourly': pd.Timedelta(hours = 1), 'daily': pd.Timedelta(days = 1), 'weekly': pd.Timedelta(days = 7),
+               'monthly': pd.Timedelta(days = 365.25 / 12)}
+    for level in reversed(list(AGGREGATION_LEVELS)):
+        if span / lengths[level] >= points:
+            return level
+    return 'hourly'
+
+
+def read_aggregate(path, columns = None, level = None, stat = 'mean', start = None, end = None, points = None):
+    '''
+    This function reads saved timeseries at an aggregation level. Hourly values are read from the saved timeseries,
+    and each other level is made the first time it is read, and again when the timeseries have been saved again
+
+    :param path: Path to the saved timeseries (see open_timeseries)
+    :param columns: List of columns (all columns if None)
+    :param level: 'hourly', 'daily', 'weekly' or 'monthly'. If None the coarsest level with at least points values
+                  between start and end is used
+    :param stat: 'mean', 'min' or 'max' of each period
+    :param start: First time to read (first hour if None)
+    :param end: Last time to read (last hour if None)
+    :param points: Number of values needed when level is None
+
+    :return: Dataframe with a datetime index
+    '''
+    if level is None:
+        # The number of hours is in the levels file, or else in the hourly values
+        info = _level_info(path)
+        hours = pd.date_range(info['start'] if info else TIMESERIES_START,
+                              periods = info['rows'] if info else len(open_timeseries(path)), freq = 'h')
+        level = choose_level(start if start is not None else hours[0], end if end is not None else hours[-1],
+                             points or 1)
+    if level not in AGGREGATION_LEVELS:
+        raise ValueError(f'Unknown aggregation level: {level}')
+    if stat not in AGGREGATION_STATS:
+        raise ValueError(f'Unknown statistic: {stat}')
+
+    if level == 'hourly':
+        # Every statistic of one hour is the hourly value, read from the saved timeseries without any levels
+        data = open_timeseries(path)
+        index = pd.date_range(TIMESERIES_START, periods = len(data), freq = 'h')
+        if columns is None:
+            columns = data.columns if isinstance(data, TimeseriesStore) else data.select_dtypes('number').columns
+        values = {col: np.asarray(data[col], dtype = float) for col in columns}
+    else:
+        # Only the level asked for is made if it is missing
+        info = _level_info(path)
+        if info is None or level not in info['levels']:
+            save_aggregates(path, levels = [level])
+            info = _level_info(path)
+        index = pd.DatetimeIndex(np.load(os.path.join(_aggregates_dir(path), f'{level}_index.npy')))
+        array = np.load(os.path.join(_aggregates_dir(path), f'{level}_{stat}.npy'), mmap_mode = 'r')
+        positions = {col: i for i, col in enumerate(info['columns'])}
+        values = {col: array[:, positions[col]] for col in (columns or info['columns'])}
+
+    start = pd.Timestamp(start) if start is not None else index[0]
+    end = pd.Timestamp(end) if end is not None else index[-1]
+    first, last = index.searchsorted(start, side = 'right') - 1, index.searchsorted(end, side = 'right')
+    first = max(first, 0)
+    return pd.DataFrame({col: np.array(v[first:last]) for col, v in values.items()}, index = index[first:last])
+
+
+@timed('data.get_annual_data')
+def get_annual_data(file_path, sheet, use_cache = True):
     '''
     This function reads excel sheets with data from EnergyPLAN, extract annual data og adds it to a dictionary of
-    datatypes such as FUEL, CO2, INVESTMENT and COSTS
+    datatypes such as FUEL, CO2, INVESTMENT and COSTS. Every block is served from the same parsed copy of the sheet
     
     :param file_path: File path to excel file with EnergyPLAN results
     :param sheet: Name of the sheet in the excel file
+    :param use_cache: Use the on-disk cache in data_cache if True
     
     :return: dictionary with annual data
     '''
 
+    # Use the cached result if this workbook and sheet have been extracted before
+    cached = data_cache.load(file_path, sheet, 'annual', EXTRACTOR_VERSION) if use_cache else None
+    if cached is not None:
+        count('data.annual_cache_hit')
+        return cached
+
     # Make a dictionary and add CO2, RESULTS and FUEL values
-    data_dict = {'CO2': pd.read_excel(file_path, sheet_name = sheet, usecols = [1, 2], skiprows = 17, nrows = 2),
-                 'RES': pd.read_excel(file_path, sheet_name = sheet, usecols = [1, 2], skiprows = 21, nrows = 3),
-                 'FUEL': pd.read_excel(file_path, sheet_name = sheet, usecols = [1, 2], skiprows = 26, nrows = 12)}
+    data_dict = {'CO2': _read_block(file_path, sheet, usecols = [1, 2], skiprows = 17, nrows = 2),
+                 'RES': _read_block(file_path, sheet, usecols = [1, 2], skiprows = 21, nrows = 3),
+                 'FUEL': _read_block(file_path, sheet, usecols = [1, 2], skiprows = 26, nrows = 12)}
     # Add INVESTMENT costs from the first column
-    INV = pd.read_excel(file_path, sheet_name = sheet, usecols = [7, 8, 9, 10], skiprows = 7, nrows = 56)
+    INV = _read_block(file_path, sheet, usecols = [7, 8, 9, 10], skiprows = 7, nrows = 56)
     INV = INV.iloc[1:]
     data_dict['INV'] = INV
 
     # Add costs
-    COSTS = pd.read_excel(file_path, sheet_name = sheet, usecols = [1, 2, 3, 4], skiprows = 40, nrows = 30)
+    COSTS = _read_block(file_path, sheet, usecols = [1, 2, 3, 4], skiprows = 40, nrows = 30)
     COSTS = COSTS.dropna(how = 'all')
     data_dict['COSTS'] = COSTS
 
     # Add INVESTMENT costs from the second column
-    INV2 = pd.read_excel(file_path, sheet_name = sheet, usecols = [12, 13, 14, 15], skiprows = 7, nrows = 49)
+    INV2 = _read_block(file_path, sheet, usecols = [12, 13, 14, 15], skiprows = 7, nrows = 49)
     INV2.iloc[:, 0] = INV2.iloc[:, 0].ffill()
     INV2 = INV2.dropna()
     INV2 = INV2.iloc[1:]
     data_dict['INV2'] = INV2
 
-    df_columns = pd.read_excel(file_path, sheet_name = sheet, skiprows = 82, nrows = 2, header = None)
+    df_columns = _read_block(file_path, sheet, skiprows = 82, nrows = 2, header = None)
     column_names = df_columns.astype(str).apply(lambda x: ' '.join(x.dropna()), axis = 0).tolist()
     clean_column_names = [' '.join(name.split()).strip() for name in column_names if name.strip()]
     clean_column_names.insert(0, 'index')
     clean_column_names = ['Hour' if name == 'nan nan' else name for name in clean_column_names]
 
-    energy = pd.read_excel(file_path, sheet_name = sheet, skiprows = 86, header = None, nrows = 1)
+    energy = _read_block(file_path, sheet, skiprows = 86, header = None, nrows = 1)
     energy.columns = clean_column_names
     energy = energy.iloc[:, 2:]
     energy = energy.drop('Stabil. Load', axis = 1)
@@ -100,4 +694,69 @@ def get_annual_data(file_path, sheet):
 
     data_dict['ENERGY'] = energy
 
+    if use_cache:
+        data_cache.save(file_path, sheet, 'annual', EXTRACTOR_VERSION, data_dict)
+
     return data_dict
+
+
+def _init_extract_worker(file_path, key, digest, data, profile):
+    # Use the workbook bytes read by the main process instead of reading the file again
+    _add_workbook(key, _open_workbook(io.BytesIO(data)))
+    data_cache.seed_hash(key, digest)
+    instrument.enable(*profile)
+
+
+def _extract_sheet(file_path, name, sheet, extra_columns, output_file, file_format):
+    # Timings of the worker are sent back to the main process with the result
+    instrument.reset()
+    start = time.perf_counter()
+    df = get_timeseries(file_path, sheet, extra_columns, output_file, True, file_format = file_format)
+    return name, time.perf_counter() - start, df.shape, instrument.export()
+
+
+def extract_timeseries(file_path, scenarios, extra_columns, output_dir = 'Data', file_format = 'csv', workers = None):
+    '''
+    This function extracts the timeseries of several scenarios from one EnergyPLAN excel file and saves them to
+    output_dir as '{scenario name}_timeseries'. The file is read once, and the sheets are parsed in parallel worker
+    processes
+
+    :param file_path: File path to excel file with EnergyPLAN results
+    :param scenarios: dictionary with scenario names and excel sheet names
+    :param extra_columns: Add any extra columns with only 0 values if they are needed
+    :param output_dir: Directory to save the timeseries in
+    :param file_format: 'csv' for csv files, or 'npy' for binary store directories
+    :param workers: number of worker processes (one per sheet, up to the number of cores, if None)
+
+    :return: dictionary with the time used for each scenario (seconds)
+    '''
+
+    start = time.perf_counter()
+    os.makedirs(output_dir, exist_ok = True)
+    suffix = '.csv' if file_format == 'csv' else ''
+
+    jobs = {name: (file_path, name, sheet, extra_columns, os.path.join(output_dir, f'{name}_timeseries{suffix}'),
+                   file_format) for name, sheet in scenarios.items()}
+    if not jobs:
+        return {}
+
+    # The hash is made from the bytes the workers parse, so cache entries are keyed by the content they came from
+    key = _workbook_key(file_path)
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    data_cache.seed_hash(key, digest)
+    workers = min(workers or os.cpu_count(), len(jobs))
+
+    timings = {}
+    initargs = (file_path, key, digest, data, instrument.worker_settings())
+    with ProcessPoolExecutor(workers, initializer = _init_extract_worker, initargs = initargs) as pool:
+        futures = [pool.submit(_extract_sheet, *job) for job in jobs.values()]
+        for future in as_completed(futures):
+            name, seconds, shape, profile = future.result()
+            instrument.merge(profile)
+            timings[name] = seconds
+            print(f'{name:<25} {scenarios[name]:<20} {shape[0]:>6} rows {shape[1]:>4} columns {seconds:8.2f} s')
+
+    print(f'Extracted {len(timings)} timeseries in {time.perf_counter() - start:.2f} s')
+    return timings
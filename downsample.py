@@ -0,0 +1,154 @@
+'''
+Downsampling of long timeseries before they are plotted.
+
+A figure cannot show more points than it has pixels across, so a series is reduced to about the pixel width of the
+figure. Two shape-preserving methods are available: LTTB (largest triangle three buckets), which keeps the points that
+matter most for the visual shape, and min/max envelopes, which keep the lowest and highest point in every bucket so no
+peak or trough is lost. Stacked series are reduced with the same points for every layer, chosen from the top of the
+stack, so the layers still fit on top of each other.
+'''
+
+import numpy as np
+
+
+def pixel_width(fig):
+    '''
+    This function returns the width of a figure in pixels
+
+    :param fig: matplotlib figure
+
+    :return: number of pixels
+    '''
+    return int(fig.get_figwidth() * fig.dpi)
+
+
+def lttb(x, y, n):
+    '''
+    This function selects n points of a series with the largest triangle three buckets algorithm
+
+    :param x: array with x values (increasing)
+    :param y: array with y values
+    :param n: number of points to keep (at least 3)
+
+    :return: array with the indices of the points to keep
+    '''
+    x = np.asarray(x, dtype = float)
+    y = np.asarray(y, dtype = float)
+    if n >= len(y) or n < 3:
+        return np.arange(len(y))
+
+    # First and last point are kept, the points between are split into n - 2 buckets
+    edges = np.linspace(1, len(y) - 1, n - 1).astype(int)
+    indices = np.empty(n, dtype = int)
+    indices[0], indices[-1] = 0, len(y) - 1
+
+    selected = 0
+    for b in range(n - 2):
+        start, stop = edges[b], edges[b + 1]
+        # Mean of the next bucket (the last point for the last bucket)
+        next_stop = edges[b + 2] if b + 2 < len(edges) else len(y)
+        next_x = x[stop:next_stop].mean()
+        next_y = y[stop:next_stop].mean()
+
+        # Keep the point forming the largest triangle with the previous kept point and the next bucket mean
+        area = np.abs((x[selected] - next_x) * (y[start:stop] - y[selected])
+                      - (x[selected] - x[start:stop]) * (next_y - y[selected]))
+        selected = start + int(np.argmax(area))
+        indices[b + 1] = selected
+
+    return indices
+
+
+def minmax(y, n):
+    '''
+    This function selects the lowest and highest point in each of n / 2 buckets of a series
+
+    :param y: array with y values
+    :param n: number of points to keep (about)
+
+    :return: array with the indices of the points to keep, in order
+    '''
+    y = np.asarray(y, dtype = float)
+    if n >= len(y) or n < 4:
+        return np.arange(len(y))
+
+    size = -(-len(y) // (n // 2))
+    padded = np.full(-(-len(y) // size) * size, np.nan)
+    padded[:len(y)] = y
+    buckets = padded.reshape(-1, size)
+    # A bucket of only nan values (possible at the end) is filled with the last value so nanargmin works
+    buckets[np.isnan(buckets).all(axis = 1)] = y[-1]
+
+    offsets = np.arange(len(buckets)) * size
+    indices = np.concatenate([[0, len(y) - 1], offsets + np.nanargmin(buckets, axis = 1),
+                              offsets + np.nanargmax(buckets, axis = 1)])
+    return np.unique(indices[indices < len(y)])
+
+
+def select(x, y, n, method = 'lttb'):
+    '''
+    This function selects the points of a series to plot
+
+    :param x: array with x values
+    :param y: array with y values
+    :param n: number of points to keep
+    :param method: 'lttb' or 'minmax'
+
+    :return: array with the indices of the points to keep
+    '''
+    if method == 'lttb':
+        return lttb(x, y, n)
+    if method == 'minmax':
+        return minmax(y, n)
+    raise ValueError(f'Unknown downsampling method: {method}')
+
+
+def window(x, x1, x2):
+    '''
+    This function returns the slice of a series that is visible between x1 and x2, with one point more on each side
+    so lines still reach the edges of the plot
+
+    :param x: array with x values (increasing)
+    :param x1: lower x limit
+    :param x2: upper x limit
+
+    :return: slice
+    '''
+    x = np.asarray(x)
+    start = max(int(np.searchsorted(x, x1, side = 'left')) - 1, 0)
+    stop = min(int(np.searchsorted(x, x2, side = 'right')) + 1, len(x))
+    return slice(start, stop)
+
+
+def reduce_line(x, y, n, method = 'lttb'):
+    '''
+    This function downsamples a series for a line plot
+
+    :param x: array or index with x values
+    :param y: array or series with y values
+    :param n: number of points to keep
+    :param method: 'lttb' or 'minmax'
+
+    :return: x values and y values to plot
+    '''
+    x, y = np.asarray(x), np.asarray(y)
+    indices = select(np.arange(len(y)) if x.dtype.kind == 'M' else x, y, n, method)
+    return x[indices], y[indices]
+
+
+def reduce_stack(x, layers, n, method = 'lttb'):
+    '''
+    This function downsamples the layers of a stackplot. The points are chosen from the top of the stack and used
+    for every layer
+
+    :param x: array or index with x values
+    :param layers: list of arrays or series with the values of each layer
+    :param n: number of points to keep
+    :param method: 'lttb' or 'minmax'
+
+    :return: x values and list with the values of each layer to plot
+    '''
+    x = np.asarray(x)
+    layers = np.vstack([np.asarray(layer, dtype = float) for layer in layers])
+    indices = select(np.arange(len(x)) if x.dtype.kind == 'M' else x, layers.sum(axis = 0), n, method)
+    return x[indices], list(layers[:, indices])
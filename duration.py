@@ -0,0 +1,130 @@
+'''
+Duration curves of EnergyPLAN timeseries.
+
+A duration curve is a timeseries sorted from the highest to the lowest value. Each (workbook, sheet, column) is
+sorted once and kept in memory and in the on-disk cache (see data_cache), so plots and queries of the same curve do
+not read or sort the timeseries again. Percentiles and the number of hours above a threshold are looked up in the
+sorted values.
+'''
+
+import numpy as np
+import pandas as pd
+import data_cache
+from data_prep import EXTRACTOR_VERSION, get_timeseries
+
+# Sorted values in this process, keyed by (workbook hash, sheet, column)
+_curves = {}
+
+
+class DurationCurve:
+    '''
+    Sorted values of one timeseries. ascending holds the values from low to high, values from high to low
+    '''
+
+    def __init__(self, ascending):
+        self.ascending = ascending
+
+    @property
+    def values(self):
+        return self.ascending[::-1]
+
+    def __len__(self):
+        return len(self.ascending)
+
+    def percentile(self, q):
+        '''
+        :param q: percentile or array of percentiles between 0 and 100
+
+        :return: value below which q percent of the hours are (linear interpolation, like np.percentile)
+        '''
+        position = np.asarray(q, dtype = float) / 100 * (len(self.ascending) - 1)
+        below = np.floor(position).astype(int)
+        above = np.minimum(below + 1, len(self.ascending) - 1)
+        fraction = position - below
+        return self.ascending[below] * (1 - fraction) + self.ascending[above] * fraction
+
+    def hours_above(self, threshold):
+        '''
+        :param threshold: value or array of values
+
+        :return: number of hours with a value above the threshold
+        '''
+        return len(self.ascending) - np.searchsorted(self.ascending, threshold, side = 'right')
+
+
+def duration_curve(file_path, sheet, column, use_cache = True):
+    '''
+    This function returns the duration curve of a timeseries column
+
+    :param file_path: File path to excel file with EnergyPLAN results
+    :param sheet: Name of the sheet in the excel file
+    :param column: Name of the timeseries column
+    :param use_cache: Use curves sorted before if True
+
+    :return: DurationCurve
+    '''
+    key = (data_cache.workbook_hash(file_path), sheet, column)
+    if use_cache and key in _curves:
+        return _curves[key]
+
+    cached = data_cache.load(file_path, sheet, 'duration', EXTRACTOR_VERSION, [column]) if use_cache else None
+    if cached is not None:
+        ascending = cached['DURATION']['ascending'].to_numpy()
+    else:
+        data = get_timeseries(file_path, sheet, [column], use_cache = use_cache)
+        ascending = np.sort(np.asarray(data[column], dtype = float))
+        if use_cache:
+            data_cache.save(file_path, sheet, 'duration', EXTRACTOR_VERSION,
+                            {'DURATION': pd.DataFrame({'ascending': ascending})}, [column])
+
+    curve = DurationCurve(ascending)
+    if use_cache:
+        _curves[key] = curve
+    return curve
+
+
+def duration_curves(file_path, sheets, column, use_cache = True):
+    '''
+    This function returns the duration curves of a column in many sheets, e.g. all storage size variants of a scenario
+
+    :param file_path: File path to excel file with EnergyPLAN results
+    :param sheets: List of sheet names
+    :param column: Name of the timeseries column
+    :param use_cache: Use curves sorted before if True
+
+    :return: Array with shape (sheets, hours) with each curve from high to low
+    '''
+    curves = [duration_curve(file_path, sheet, column, use_cache) for sheet in sheets]
+    return np.vstack([curve.values for curve in curves])
+
+
+def percentiles(file_path, sheets, column, q):
+    '''
+    This function returns percentiles of a column in many sheets
+
+    :param file_path: File path to excel file with EnergyPLAN results
+    :param sheets: List of sheet names
+    :param column: Name of the timeseries column
+    :param q: percentile or list of percentiles between 0 and 100
+
+    :return: Dataframe with one row per sheet and one column per percentile
+    '''
+    q = np.atleast_1d(q)
+    return pd.DataFrame([duration_curve(file_path, sheet, column).percentile(q) for sheet in sheets],
+                        index = list(sheets), columns = list(q))
+
+
+def hours_above(file_path, sheets, column, thresholds):
+    '''
+    This function returns how many hours a column is above thresholds in many sheets
+
+    :param file_path: File path to excel file with EnergyPLAN results
+    :param sheets: List of sheet names
+    :param column: Name of the timeseries column
+    :param thresholds: value or list of values
+
+    :return: Dataframe with one row per sheet and one column per threshold
+    '''
+    thresholds = np.atleast_1d(thresholds)
+    return pd.DataFrame([duration_curve(file_path, sheet, column).hours_above(thresholds) for sheet in sheets],
+                        index = list(sheets), columns = list(thresholds))
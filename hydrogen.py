@@ -1,54 +1,183 @@
+from duration import duration_curve
 from data_prep import get_timeseries
-import matplotlib.pyplot as plt
-import seaborn as sns
+import numpy as np
+import pandas as pd
+from registry import get_registry
+from render import finish, figure_name, with_suffix, render_all, cached_figure
+
+# Hydrogen out of the electrolysers per unit of electricity in (approximate, used by storage_what_if)
+ELECTROLYSER_EFFICIENCY = 0.73
+
+def plot_h2_storage_individual(file, outputfile = '--', workers = None):
+    '''
+    This function plots duration curves for hydrogen storage with unlimited and limited storage capacity, one figure
+    for each scenario with storage variants in the registry. In headless mode (see render) the figures are rendered
+    at the same time in worker processes
+
+    :param file: path to the excel file
+    :param outputfile: name of the output file. The figure name is added to it for each figure
+    :param workers: number of worker processes (all cores if None)
+
+    :return: None
+    '''
+    render_all(storage_figures(file, outputfile), workers)
+
+
+def storage_figures(file, outputfile = '--'):
+    '''
+    This function lists the figures plot_h2_storage_individual makes, as (function, keyword arguments) tasks for
+    render_all or a task graph (see scheduler). The arguments are the same as for plot_h2_storage_individual
+
+    :return: list of tasks, one for each scenario with storage variants
+    '''
+    # Storage variants of each scenario (see interface.storage_variants)
+    panels = [dict(scenario1 = unlimited, scenario2 = limited, title = name, filename = figure_name('storage', name),
+                   limit_label = 'Storage Capacity Limited to 180.2 GWh')
+              for name, (unlimited, limited) in get_registry().storage_variants.items()]
+
+    return [(plot_storage, dict(panel, file = file, outputfile = with_suffix(outputfile, panel['filename'])))
+            for panel in panels]
+
+
+def _storage_inputs(file, **arguments):
+    return [file]
+
+
+@cached_figure(_storage_inputs)
+def plot_storage(file, scenario1, scenario2, title, filename, limit_label, storage_key = 'H2 Storage', outputfile = '--'):
+    '''
+    This function plots the duration curves of the storage content in two scenarios
+
+    :param file: path to the excel file
+    :param scenario1: excel sheet name of the scenario with unlimited storage capacity
+    :param scenario2: excel sheet name of the scenario with limited storage capacity
+    :param title: title of the figure
+    :param filename: name of the figure, used if there is no output file
+    :param limit_label: legend label for scenario2
+    :param storage_key: timeseries column with the storage content
+    :param outputfile: name of the output file
+
+    :return: None
+    '''
+
+    import matplotlib.pyplot as plt
+    import seaborn as sns
 
-def plot_h2_storage_individual(file):
     # Set Seaborn style and color palette
     sns.set_theme(style = "whitegrid")
-    colors = sns.color_palette("mako", n_colors = 4)
-    sns.set_palette(colors)
-
-    scenarios = {'Only RES': 'Renewable', '1GW Nuclear': 'Nuclear_flex', '3GW Nuclear': '3GW', 'High Nuclear': 'Nuclear'}
+    mako = sns.color_palette("mako", n_colors = 5)
+    sns.set_palette(mako[:4])
 
     # X-axis values and constants
     x_values = list(range(8784))
     precentage = [0.486 * 100 for _ in x_values]
 
-    # Helper function for plotting
-    def plot_storage(scenario1, scenario2, title, filename, limit_label, storage_key = 'H2 Storage'):
-        data1 = get_timeseries(file, scenario1, ["Nuclear Electr.", storage_key], ".")
-        data2 = get_timeseries(file, scenario2, ["Nuclear Electr.", storage_key], ".")
-        max1 = max(data1[storage_key] / 1000)
+    # Storage content from high to low [GWh]
+    curve1 = duration_curve(file, scenario1, storage_key).values / 1000
+    curve2 = duration_curve(file, scenario2, storage_key).values / 1000
+    max1 = curve1[0]
+
+    fig, ax1 = plt.subplots(figsize = (6, 6))
+    ax2 = ax1.twinx()
+
+    prop = 658.7 / max1
+
+    ax1.fill_between(x_values, curve1, color = mako[1],
+                     label = "Unlimited Storage Capacity")
+    ax1.fill_between(x_values, curve2, color = mako[3],
+                     label = limit_label)
+    ax2.plot(x_values, precentage, color = mako[4], linewidth = 1,
+             label = "48.6% of unconstraind storage capacity")
+
+    ax1.set_xlabel("Hour", fontsize = 14)
+    ax1.set_ylim(-658.7 * 0.05, 658.7 * 1.05)
+    ax2.set_ylim(-0.05 * prop * 100, 1.05 * prop * 100)
+
+    ax2.tick_params(axis = 'y', labelsize = 13, colors = mako[4])
+    ax2.spines['right'].set_color(mako[4])
+    ax2.yaxis.label.set_color(mako[4])
+
+    fig.tight_layout()
+    finish(outputfile, filename, fig)
+
+
+def simulate_storage(production, consumption, caps, initial = 0.0):
+    '''
+    This function simulates the content of a storage for many storage capacities at once. Each hour production is
+    added and consumption taken out; what does not fit is curtailed and what is missing is unmet demand
+
+    :param production: array with hourly production into the storage [MWh]
+    :param consumption: array with hourly consumption from the storage [MWh]
+    :param caps: array with storage capacities [MWh]
+    :param initial: content at the start as a share of the capacity, between 0 and 1
 
-        fig, ax1 = plt.subplots(figsize = (6, 6))
-        ax2 = ax1.twinx()
+    :return: dataframe indexed by capacity with unmet demand, curtailment [MWh], hours with unmet demand, hours with
+             a full storage (never for a capacity of 0, which is no storage), utilization (mean content / capacity)
+             and the highest content
+    '''
+    if not 0 <= initial <= 1:
+        raise ValueError(f'initial must be a share of the capacity between 0 and 1, not {initial}')
 
-        prop = 658.7 / max1
+    caps = np.asarray(caps, dtype = float)
+    # A capacity of 0 is no storage, which is never full
+    has_storage = caps > 0
+    net = np.asarray(production, dtype = float) - np.asarray(consumption, dtype = float)
 
-        ax1.fill_between(x_values, sorted(data1[storage_key] / 1000, reverse = True), color = palet[1],
-                         label = "Unlimited Storage Capacity")
-        ax1.fill_between(x_values, sorted(data2[storage_key] / 1000, reverse = True), color = palet[3],
-                         label = limit_label)
-        ax2.plot(x_values, precentage, color = mako[4], linewidth = 1,
-                 label = "48.6% of unconstraind storage capacity")
+    content = caps * initial
+    unmet = np.zeros_like(caps)
+    curtailed = np.zeros_like(caps)
+    hours_unmet = np.zeros(len(caps), dtype = int)
+    hours_full = np.zeros(len(caps), dtype = int)
+    content_sum = np.zeros_like(caps)
+    content_max = content.copy()
+    excess = np.empty_like(caps)
 
-        ax1.set_xlabel("Hour", fontsize = 14)
-        ax1.set_ylim(-658.7 * 0.05, 658.7 * 1.05)
-        ax2.set_ylim(-0.05 * prop * 100, 1.05 * prop * 100)
+    # One step per hour, vectorized over the capacities
+    for step in net:
+        content += step
+        if step > 0:
+            # What does not fit is curtailed
+            np.subtract(content, caps, out = excess)
+            np.maximum(excess, 0, out = excess)
+            curtailed += excess
+        else:
+            # What is missing is unmet demand
+            np.minimum(content, 0, out = excess)
+            unmet -= excess
+            hours_unmet += excess < 0
+        content -= excess
+        hours_full += (content >= caps) & has_storage
+        content_sum += content
+        np.maximum(content_max, content, out = content_max)
 
-        ax2.tick_params(axis = 'y', labelsize = 13, colors = mako[4])
-        ax2.spines['right'].set_color(mako[4])
-        ax2.yaxis.label.set_color(mako[4])
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        utilization = np.where(has_storage, content_sum / len(net) / caps, 0)
 
-        fig.tight_layout()
-        plt.show()
+    return pd.DataFrame({'unmet': unmet, 'curtailed': curtailed, 'hours_unmet': hours_unmet,
+                         'hours_full': hours_full, 'utilization': utilization, 'max_content': content_max},
+                        index = pd.Index(caps, name = 'capacity'))
 
 
-    plot_storage(scenario1 = 'Nuclear_flex_dh_640', scenario2 = 'Nuclear_flex_dh_180', title = '1 GW Nuclear',
-        filename = 'storage_1GW', limit_label = 'Storage Capacity Limited to 180.2 GWh')
+def storage_what_if(file, sheet, caps, production = 'H2 Electr.', consumption = 'H2 demand',
+                    efficiency = ELECTROLYSER_EFFICIENCY, initial = 0.0):
+    '''
+    This function estimates how a scenario would do with other hydrogen storage capacities, without running EnergyPLAN
+    again. The storage is filled by the electrolysers and emptied by the hydrogen demand of the scenario. The default
+    column names are names from the EnergyPLAN hourly output, which may differ between EnergyPLAN versions and models;
+    pass the names of the columns explicitly if they are not in the sheet
 
-    plot_storage(scenario1 = 'Nuc3_800', scenario2 = 'Nuc3_144', title = '3 GW Nuclear', filename = 'storage_3GW',
-        limit_label = 'Storage Capacity Limited to 180.2 GWh')
+    :param file: path to the excel file
+    :param sheet: excel sheet name of the scenario
+    :param caps: list or array with storage capacities to try [MWh]
+    :param production: timeseries column with electricity to the electrolysers
+    :param consumption: timeseries column with hydrogen demand
+    :param efficiency: hydrogen out per unit of electricity in
+    :param initial: content at the start as a share of the capacity, between 0 and 1
 
-    plot_storage(scenario1 = 'Nuc_800', scenario2 = 'Nuc_0', title = 'High Nuclear',
-        filename = 'storage_high_nuclear', limit_label = 'Storage Capacity Limited to 180.2 GWh')
+    :return: dataframe indexed by capacity (see simulate_storage)
+    '''
+    data = get_timeseries(file, sheet, [production, consumption])
+    for column in (production, consumption):
+        if column not in data.columns:
+            raise ValueError(f"Sheet {sheet} has no timeseries column '{column}' (columns: {list(data.columns)})")
+    return simulate_storage(data[production] * efficiency, data[consumption], caps, initial)
@@ -0,0 +1,267 @@
+'''
+Timers and counters for finding where a run spends its time.
+
+Instrumentation is off by default and then costs one check of a global per call. Turn it on with enable, or with the
+environment variable ENERGYPLAN_PROFILE=1. While on, every span (a named, timed block of code) is added to a table
+of calls, total and longest time, and counters count events like cache hits. With a trace file (enable(trace = ...)
+or ENERGYPLAN_TRACE=trace.json) every span is also kept as an event in the Chrome trace format, which can be opened
+in chrome://tracing or https://ui.perfetto.dev. When instrumentation is turned on by the environment, the table is
+printed and the trace written when the process ends (once, see final_report). Worker processes are started with
+worker_settings, so their events are on the same timeline as the main process.
+
+    with span('sheet.parse', sheet = sheet):
+        ...
+
+    @timed('costs.kernel')
+    def cost_kernel(...):
+        ...
+'''
+
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import nullcontext
+
+ENABLED = os.environ.get('ENERGYPLAN_PROFILE', '') not in ('', '0')
+
+# Path of the trace file, or None if no trace events are kept
+TRACE = os.environ.get('ENERGYPLAN_TRACE') or None
+if TRACE:
+    ENABLED = True
+
+# Span name: [calls, total seconds, longest seconds], counter name: count, and trace events
+_timers = {}
+_counters = {}
+_events = []
+
+# Context manager returned by span while instrumentation is off
+_NULL = nullcontext()
+
+# Time all trace events are relative to, as a wall clock time (shared with worker processes) and the same time on
+# the perf_counter clock of this process
+_EPOCH = time.time()
+_T0 = time.perf_counter()
+
+# True when the report has been printed
+_reported = False
+
+
+def enable(enabled = True, trace = None, epoch = None):
+    '''
+    This function turns instrumentation on or off
+
+    :param enabled: True to time spans and count events
+    :param trace: path of a Chrome trace file to keep events for (see write_trace), or None
+    :param epoch: wall clock time (time.time) trace events are relative to, to share the timeline of another process,
+                  or None to keep the one of this process
+
+    :return: None
+    '''
+    global ENABLED, TRACE, _EPOCH, _T0
+    ENABLED = enabled
+    TRACE = trace
+    if epoch is not None:
+        _EPOCH = epoch
+        _T0 = time.perf_counter() - (time.time() - epoch)
+
+
+def worker_settings():
+    '''
+    This function returns the arguments for enable in a worker process, so the worker records the same things and its
+    trace events line up with the events of this process
+
+    :return: (enabled, trace, epoch)
+    '''
+    return ENABLED, TRACE, _EPOCH
+
+
+def reset():
+    '''
+    This function forgets all timings, counts and trace events
+    '''
+    _timers.clear()
+    _counters.clear()
+    del _events[:]
+
+
+class _Span:
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        seconds = end - self.start
+        timer = _timers.get(self.name)
+        if timer is None:
+            _timers[self.name] = [1, seconds, seconds]
+        else:
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+        if TRACE:
+            _events.append({'name': self.name, 'ph': 'X', 'ts': (self.start - _T0) * 1e6, 'dur': seconds * 1e6,
+                            'pid': os.getpid(), 'tid': threading.get_ident(), 'args': self.args})
+        return False
+
+
+def span(name, **args):
+    '''
+    This function times a block of code
+
+    :param name: name of the span, e.g. 'sheet.parse'. Spans with the same name are added up in the summary
+    :param args: values shown with the span in the trace, e.g. the sheet name
+
+    :return: context manager
+    '''
+    if not ENABLED:
+        return _NULL
+    return _Span(name, args)
+
+
+def timed(name = None):
+    '''
+    This function makes a decorator that times every call of a function
+
+    :param name: name of the span (module.function if None)
+
+    :return: decorator
+    '''
+    def decorator(function):
+        label = name or f'{function.__module__}.{function.__qualname__}'
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return function(*args, **kwargs)
+            with _Span(label, {}):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name, n = 1):
+    '''
+    This function adds to a counter
+
+    :param name: name of the counter, e.g. 'workbook.cache_hit'
+    :param n: number to add
+
+    :return: None
+    '''
+    if ENABLED:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def export():
+    '''
+    This function returns everything recorded by this process, to be merged into another process (see merge)
+    '''
+    return {'timers': _timers, 'counters': _counters, 'events': _events}
+
+
+def merge(data):
+    '''
+    This function adds timings, counts and trace events recorded by a worker process
+
+    :param data: return value of export in the worker, or None
+
+    :return: None
+    '''
+    if not data:
+        return
+    for name, (calls, total, longest) in data['timers'].items():
+        timer = _timers.setdefault(name, [0, 0.0, 0.0])
+        timer[0] += calls
+        timer[1] += total
+        timer[2] = max(timer[2], longest)
+    for name, n in data['counters'].items():
+        _counters[name] = _counters.get(name, 0) + n
+    _events.extend(data['events'])
+
+
+def summary():
+    '''
+    :return: list of (span name, calls, total seconds, mean seconds, longest seconds), most total time first
+    '''
+    rows = [(name, calls, total, total / calls, longest) for name, (calls, total, longest) in _timers.items()]
+    return sorted(rows, key = lambda row: row[2], reverse = True)
+
+
+def report(file = None):
+    '''
+    This function prints the table of spans and the counters
+
+    :param file: file to print to (stderr if None)
+
+    :return: None
+    '''
+    file = file or sys.stderr
+    print(f"\n{'span':<40}{'calls':>8}{'total s':>12}{'mean ms':>12}{'max ms':>12}", file = file)
+    for name, calls, total, mean, longest in summary():
+        print(f'{name:<40}{calls:>8}{total:>12.3f}{mean * 1e3:>12.2f}{longest * 1e3:>12.2f}', file = file)
+    if _counters:
+        print(f"\n{'counter':<40}{'count':>8}", file = file)
+        for name, n in sorted(_counters.items()):
+            print(f'{name:<40}{n:>8}', file = file)
+
+
+def write_trace(path = None):
+    '''
+    This function writes the trace events to a Chrome trace file
+
+    :param path: path to the trace file (TRACE if None)
+
+    :return: path to the trace file
+    '''
+    path = path or TRACE
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok = True)
+    counters = [{'name': name, 'ph': 'C', 'ts': (time.perf_counter() - _T0) * 1e6, 'pid': os.getpid(),
+                 'args': {'count': n}} for name, n in _counters.items()]
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': _events + counters, 'displayTimeUnit': 'ms'}, f)
+    return path
+
+
+def final_report():
+    '''
+    This function prints the table of spans and writes the trace file, once per process. It is called when the
+    process ends if instrumentation is turned on by the environment, and does nothing if it has already been called
+
+    :return: path to the trace file, or None
+    '''
+    global _reported
+    if _reported or not ENABLED:
+        return None
+    _reported = True
+    report()
+    if TRACE:
+        path = write_trace()
+        print(f'Trace written to {path}', file = sys.stderr)
+        return path
+    return None
+
+
+def _at_exit():
+    if _timers:
+        final_report()
+
+
+if ENABLED:
+    _main_pid = os.getpid()
+    # Only the process that turned instrumentation on reports, not worker processes started from it
+    atexit.register(lambda: os.getpid() == _main_pid and _at_exit())
@@ -20,6 +20,14 @@ scenarios = {'Only RES': 'Renewable',
              'High Nuclear w/ DH': 'Nuclear_dh'}
 
 
+# Scenarios with hourly timeseries saved in Data/ (see data_prep.extract_timeseries)
+timeseries_scenarios = ['Only RES', '1GW Nuclear', '3GW Nuclear', 'High Nuclear']
+
+# Sheets of the hydrogen storage variants: scenario name, sheet with unlimited and sheet with limited storage
+storage_variants = {'1GW Nuclear': ('Nuclear_flex_dh_640', 'Nuclear_flex_dh_180'),
+                    '3GW Nuclear': ('Nuc3_800', 'Nuc3_144'),
+                    'High Nuclear': ('Nuc_800', 'Nuc_0')}
+
 # Set name of output file
 output_file = "output"
 
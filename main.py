@@ -1,45 +1,184 @@
-from sensitivity_analysis import heatmap, CAPEX_sens, OPEX_sens
-from plot_costs import calc_costs, plot_costs, plot_total_costs
-from plot_timeseries import plot_april, plot_year, plot_imp_exp
-from market_economic import plot_monthly_cf
-from hydrogen import plot_h2_storage_individual
-from data_prep import get_timeseries
+'''
+Runs the analyses of the thesis from the command line. Several analyses can be given at once: they are run as one
+graph of tasks (see scheduler) where every excel sheet, timeseries and balance is loaded once and shared by the
+analyses that need it, and independent tasks run at the same time. Figures are saved to Figures/ unless --show is
+given. A failing analysis does not stop the others: the failures are listed at the end and the exit status is 1.
 
-scenarios = {'Only RES':        'Renewable',
-             '1GW Nuclear':     'Nuclear_flex',
-             '3GW Nuclear':     '3GW',
-             'High Nuclear':    'Nuclear'}
-def main():
+    python main.py costs total-costs heatmap        # cost figures
+    python main.py extract april year imp-exp       # extract the timeseries, then plot them
+    python main.py all --workers 4                  # every figure
+'''
 
-    #for name, sheet_name in scenarios.items():
-    #    get_timeseries('Excel/Original.xlsx', sheet_name, ['Nuclear Electr.', "Wave Electr.", "CHP 3 Heat", "Discharge Electr.", "Charge Electr.", 'H2 Storage'], f'Data/{name}_timeseries.csv', True)
+import argparse
+import os
+import sys
+import render
+from registry import get_registry
 
-    ''' ------------------------------------------------ PLOTS -------------------------------------------------'''
-    # TODO: Comment out the functions you do not want to run
+# Analyses that can be run, in the order they are listed in the help. 'all' runs every analysis except the optional
+# ones (OPTIONAL), which must be asked for by name
+ANALYSES = {'costs': 'Relative costs (differences between scenarios)',
+            'total-costs': 'Total costs',
+            'heatmap': 'Least cost scenario for a variation of offshore wind and nuclear CAPEX',
+            'cf-heatmap': 'Least cost scenario for a variation of offshore and onshore wind capacity factors',
+            'capex-sens': 'Sensitivity to offshore wind CAPEX',
+            'opex-sens': 'Sensitivity to nuclear OPEX',
+            'april': 'Supply and demand in april',
+            'year': 'Supply and demand over the year',
+            'imp-exp': 'Electricity import and export',
+            'h2-storage': 'Duration curves for H2 storage',
+            'monthly-cf': 'Monthly capacity factors of offshore wind and nuclear power (needs market_economic.py)',
+            'extract': 'Extract the timeseries of all scenarios to Data/ (run after each new EnergyPLAN run)'}
+OPTIONAL = ('monthly-cf', 'extract')
 
-                                        # COSTS
-    plot_costs(2.5, 1.13, 6.18, OPEX_nuclear = 30.20, outputfile = '--')                        # Relative costs (differences between scenarios)
-    #plot_total_costs()                  # Total costs
 
-                                        # SENSITIVITY ANALYSIS
-    #heatmap(5, 2.1, 4.2, 4.2, 10.2)                           # Heatmap with a variation of offshore wind and nuclear CAPEX
-    #CAPEX_sens(6.18, 2.1, 3.3, 'CAPEX_intersection_original')                        # Sensitivity to offshore wind CAPEX
-    #CAPEX_sens(4.72, 2.1, 3.3, 'CAPEX_intersection_adj_nuclear')                        # Sensitivity to offshore wind CAPEX
+def plot_monthly_cf(*args, **kwargs):
+    # market_economic is not in every copy of the project, so it is only imported when this plot is made
+    try:
+        from market_economic import plot_monthly_cf
+    except ModuleNotFoundError as error:
+        if error.name != 'market_economic':
+            raise
+        raise ModuleNotFoundError('plot_monthly_cf needs market_economic.py, which is not in this directory',
+                                  name = error.name) from error
+    return plot_monthly_cf(*args, **kwargs)
 
-    #OPEX_sens(1.9, plotname = 'OPEX_sens1.9')                         # Sensitivity to nuclear OPEX
-    #OPEX_sens(2.5, plotname = 'OPEX_sens2.5')                         # Sensitivity to nuclear OPEX
 
-                                        # TIMESERIES
-    #plot_april()                        # Supply and demand for the month of april
-    #plot_year()                         # Yearly supply and demand
-    #plot_imp_exp()
-                                        # CAPACITY FACTOR
-    #plot_monthly_cf()                   # for each month for offshore and nuclear power
+def build_tasks(analyses, timeseries_format = 'csv', downsample = None):
+    '''
+    This function makes the task graph for a list of analyses
 
-                                        # HYDROGEN STORAGE
-    #plot_h2_storage_individual('./Excel/original.xlsx')        # Duration curves for H2 storage
+    :param analyses: list of analysis names (see ANALYSES)
+    :param timeseries_format: 'csv' or 'npy', the format extracted timeseries are saved in
+    :param downsample: number of points in the timeseries plots, True for the pixel width, or None for every point
 
+    :return: list of Task
+    '''
+    from scheduler import Task
+    from registry import load_annual, extract_scenario
+    from balance import load_balance
+    from duration import duration_curve
+
+    registry = get_registry()
+    tasks = []
+
+    # Extracted timeseries are saved before any balance is computed from them
+    extracted = []
+    if 'extract' in analyses:
+        for name in registry.group('timeseries'):
+            tasks.append(Task(f'timeseries:{name}', extract_scenario, {'name': name, 'file_format': timeseries_format}))
+            extracted.append(f'timeseries:{name}')
+
+    def annual(group):
+        sheets = sorted(set(registry.group(group).values()))
+        tasks.extend(Task(f'annual:{sheet}', load_annual, {'sheet': sheet}) for sheet in sheets)
+        return [f'annual:{sheet}' for sheet in sheets]
+
+    def balance(level):
+        tasks.append(Task(f'balance:{level}', load_balance, {'level': level}, extracted))
+        return [f'balance:{level}']
+
+    def duration(sheets):
+        tasks.extend(Task(f'duration:{sheet}', duration_curve,
+                          {'file_path': registry.file_path, 'sheet': sheet, 'column': 'H2 Storage'}) for sheet in sheets)
+        return [f'duration:{sheet}' for sheet in sheets]
+
+    if 'costs' in analyses:
+        from plot_costs import plot_costs
+        tasks.append(Task('figure:costs', plot_costs, dict(CAPEX_offshore = 2.5, CAPEX_onshore = 1.13,
+                                                           CAPEX_nuclear = 6.18, OPEX_nuclear = 30.20), annual('all')))
+    if 'total-costs' in analyses:
+        from plot_costs import plot_total_costs
+        tasks.append(Task('figure:total-costs', plot_total_costs, {}, annual('all')))
+    if 'heatmap' in analyses:
+        from sensitivity_analysis import heatmap
+        tasks.append(Task('figure:heatmap', heatmap, dict(resolution = 5, off_low = 2.1, off_upp = 4.2, nuc_low = 4.2,
+                                                          nuc_upp = 10.2), annual('dh')))
+    if 'cf-heatmap' in analyses:
+        from sensitivity_analysis import cf_heatmap
+        tasks.append(Task('figure:cf-heatmap', cf_heatmap, {}, annual('dh')))
+    if 'capex-sens' in analyses:
+        from sensitivity_analysis import CAPEX_sens
+        for name, nuc_capex in (('CAPEX_intersection_original', 6.18), ('CAPEX_intersection_adj_nuclear', 4.72)):
+            tasks.append(Task(f'figure:{name}', CAPEX_sens, dict(nuc_capex = nuc_capex, x1 = 2.1, x2 = 3.3,
+                                                                 plotname = os.path.join(render.FIGURE_DIR, name)),
+                              annual('dh')))
+    if 'opex-sens' in analyses:
+        from sensitivity_analysis import OPEX_sens
+        for name, offshore_capex in (('OPEX_sens_1_9', 1.9), ('OPEX_sens_2_5', 2.5)):
+            tasks.append(Task(f'figure:{name}', OPEX_sens, dict(offshore_capex = offshore_capex,
+                                                                plotname = os.path.join(render.FIGURE_DIR, name)),
+                              annual('dh')))
+    if 'april' in analyses:
+        from plot_timeseries import april_figures
+        for function, kwargs in april_figures(downsample = downsample):
+            tasks.append(Task(f"figure:april:{kwargs['name']}", function, kwargs, balance('hourly')))
+    if 'year' in analyses:
+        from plot_timeseries import year_figures
+        for function, kwargs in year_figures(downsample = downsample):
+            tasks.append(Task(f"figure:year:{kwargs['name']}", function, kwargs, balance(kwargs['level'])))
+    if 'imp-exp' in analyses:
+        from plot_timeseries import plot_imp_exp
+        tasks.append(Task('figure:imp-exp', plot_imp_exp, {}, balance('daily')))
+    if 'h2-storage' in analyses:
+        from hydrogen import storage_figures
+        for function, kwargs in storage_figures(registry.file_path):
+            tasks.append(Task(f"figure:{kwargs['filename']}", function, kwargs,
+                              duration([kwargs['scenario1'], kwargs['scenario2']])))
+    if 'monthly-cf' in analyses:
+        tasks.append(Task('figure:monthly-cf', plot_monthly_cf))
+    return tasks
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Plots and analysis of EnergyPLAN scenario results',
+                                     formatter_class = argparse.RawDescriptionHelpFormatter,
+                                     epilog = 'analyses:\n' + '\n'.join(f'  {name:<14}{text}'
+                                                                        for name, text in ANALYSES.items()))
+    parser.add_argument('analyses', nargs = '+', choices = list(ANALYSES) + ['all'], metavar = 'analysis',
+                        help = 'analyses to run (see below), or all for every analysis except '
+                               + ' and '.join(OPTIONAL))
+    parser.add_argument('--file', help = 'excel file with EnergyPLAN results (interface.file_path if not given)')
+    parser.add_argument('--workers', type = int, help = 'number of worker processes (all cores if not given)')
+    parser.add_argument('--show', action = 'store_true', help = 'show figures one after the other instead of saving')
+    parser.add_argument('--figure-dir', default = 'Figures', help = 'directory for saved figures')
+    parser.add_argument('--figure-format', default = 'png', help = 'file format for saved figures (png, pdf, eps)')
+    parser.add_argument('--timeseries-format', choices = ['csv', 'npy'], default = 'csv',
+                        help = 'format of extracted timeseries')
+    parser.add_argument('--downsample', type = int, help = 'number of points in the timeseries plots')
+    parser.add_argument('--profile', action = 'store_true', help = 'print where the time was spent')
+    parser.add_argument('--trace', help = 'write a Chrome trace file of the run')
+    args = parser.parse_args(argv)
+
+    import interface
+    import instrument
+    from scheduler import TaskFailures, run
+
+    if args.file:
+        interface.file_path = args.file
+        get_registry(reload = True)
+    if not args.show:
+        render.set_headless(True, args.figure_dir, args.figure_format)
+    if args.profile or args.trace:
+        instrument.enable(True, args.trace)
+
+    analyses = [name for name in ANALYSES if name not in OPTIONAL] if 'all' in args.analyses else args.analyses
+    if 'all' in args.analyses:
+        analyses += [name for name in OPTIONAL if name in args.analyses]
+
+    failures = None
+    try:
+        run(build_tasks(analyses, args.timeseries_format, args.downsample), args.workers)
+    except TaskFailures as error:
+        failures = error
+
+    # Printed once, also when ENERGYPLAN_PROFILE is set
+    instrument.final_report()
+    if failures:
+        print(failures, file = sys.stderr)
+        return 1
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,162 @@
+'''
+Monte Carlo analysis of scenario costs with uncertain CAPEX, OPEX and other assumptions.
+
+Samples are drawn and evaluated in batches with cost_kernel, and only running statistics are kept: mean and standard
+deviation (merged batch by batch), quantiles from a histogram sketch and how often each scenario is the cheapest. The
+number of samples is therefore not limited by memory.
+'''
+
+import numpy as np
+from plot_costs import cost_coefficients, cost_kernel
+
+# Number of bins in the quantile sketch. Quantiles are accurate to about (max - min) / QUANTILE_BINS
+QUANTILE_BINS = 2048
+
+
+def draw(distribution, size, rng):
+    '''
+    This function draws samples from a distribution
+
+    :param distribution: a number (no uncertainty) or a tuple ('triangular', low, mode, high), ('uniform', low, high),
+                         ('normal', mean, sd) or ('lognormal', mean, sigma) (parameters of the underlying normal)
+    :param size: number of samples
+    :param rng: numpy random generator
+
+    :return: array with samples
+    '''
+    if np.isscalar(distribution):
+        return np.full(size, float(distribution))
+
+    kind, *args = distribution
+    if kind == 'triangular':
+        return rng.triangular(*args, size = size)
+    if kind == 'uniform':
+        return rng.uniform(*args, size = size)
+    if kind == 'normal':
+        return rng.normal(*args, size = size)
+    if kind == 'lognormal':
+        return rng.lognormal(*args, size = size)
+    raise ValueError(f'Unknown distribution: {kind}')
+
+
+class _QuantileSketch:
+    '''
+    Histogram with a fixed number of equal bins for each scenario. When a value falls outside the range, the bin width
+    is doubled by merging neighbouring bins, so any stream of values fits in the same memory
+    '''
+
+    def __init__(self, n_scenarios, bins = QUANTILE_BINS):
+        self.bins = bins
+        self.counts = np.zeros((n_scenarios, bins), dtype = np.int64)
+        self.low = np.zeros(n_scenarios)
+        self.width = np.zeros(n_scenarios)
+        self.min = np.full(n_scenarios, np.inf)
+        self.max = np.full(n_scenarios, -np.inf)
+
+    def _grow(self, s, left):
+        merged = self.counts[s].reshape(-1, 2).sum(axis = 1)
+        empty = np.zeros(self.bins // 2, dtype = np.int64)
+        if left:
+            self.low[s] -= self.bins * self.width[s]
+            self.counts[s] = np.concatenate([empty, merged])
+        else:
+            self.counts[s] = np.concatenate([merged, empty])
+        self.width[s] *= 2
+
+    def add(self, values):
+        '''
+        :param values: array with shape (samples, scenarios)
+        '''
+        for s in range(values.shape[1]):
+            v = values[:, s]
+            v_min, v_max = v.min(), v.max()
+
+            if self.width[s] == 0:
+                # First batch sets the range, with room on both sides
+                span = max(v_max - v_min, abs(v_max) * 1e-9, 1e-9)
+                self.low[s] = v_min - span / 2
+                self.width[s] = 2 * span / self.bins
+
+            while v_min < self.low[s]:
+                self._grow(s, left = True)
+            while v_max >= self.low[s] + self.bins * self.width[s]:
+                self._grow(s, left = False)
+
+            index = ((v - self.low[s]) / self.width[s]).astype(np.int64)
+            self.counts[s] += np.bincount(np.clip(index, 0, self.bins - 1), minlength = self.bins)
+            self.min[s] = min(self.min[s], v_min)
+            self.max[s] = max(self.max[s], v_max)
+
+    def quantile(self, q):
+        '''
+        :param q: quantile between 0 and 1
+
+        :return: array with the quantile for each scenario
+        '''
+        result = np.empty(len(self.counts))
+        for s, counts in enumerate(self.counts):
+            cumulative = np.cumsum(counts)
+            target = q * cumulative[-1]
+            k = min(np.searchsorted(cumulative, target), self.bins - 1)
+            below = cumulative[k - 1] if k > 0 else 0
+            fraction = (target - below) / counts[k] if counts[k] else 0.5
+            result[s] = np.clip(self.low[s] + (k + fraction) * self.width[s], self.min[s], self.max[s])
+        return result
+
+
+def monte_carlo(distributions, samples = 1000000, batch_size = 100000, scenarios = None,
+                quantiles = (0.05, 0.25, 0.5, 0.75, 0.95), seed = None):
+    '''
+    This function estimates the distribution of total costs for each scenario when assumptions are uncertain
+
+    :param distributions: dictionary with cost_kernel assumptions ('CAPEX_offshore', 'CAPEX_nuclear', 'ir', ...) and
+                          their distributions (see draw). Assumptions that are not given use the calc_costs defaults
+    :param samples: number of samples
+    :param batch_size: number of samples evaluated at the same time
+    :param scenarios: dictionary with scenario names and excel sheet names (all scenarios in interface if None)
+    :param quantiles: quantiles of total cost to estimate
+    :param seed: seed for the random generator
+
+    :return: dictionary with 'scenarios', 'samples', 'mean', 'std', 'min', 'max', 'quantiles' (dictionary with
+             quantile: array), 'components' (mean of the 5 cost categories) and 'p_cheapest' (probability that each
+             scenario has the lowest total cost)
+    '''
+
+    rng = np.random.default_rng(seed)
+    coefficients = cost_coefficients(scenarios)
+    n_scenarios = len(coefficients)
+
+    count = 0
+    mean = np.zeros(n_scenarios)
+    m2 = np.zeros(n_scenarios)
+    component_sums = np.zeros((5, n_scenarios))
+    cheapest = np.zeros(n_scenarios, dtype = np.int64)
+    sketch = _QuantileSketch(n_scenarios)
+
+    while count < samples:
+        n = min(batch_size, samples - count)
+        assumptions = {name: draw(distribution, n, rng) for name, distribution in distributions.items()}
+        components = np.stack(cost_kernel(coefficients, **assumptions))
+        total = components.sum(axis = 0)
+
+        # Merge mean and variance of the batch into the running values (Chan et al.)
+        batch_mean = total.mean(axis = 0)
+        batch_m2 = ((total - batch_mean) ** 2).sum(axis = 0)
+        delta = batch_mean - mean
+        mean += delta * n / (count + n)
+        m2 += batch_m2 + delta ** 2 * count * n / (count + n)
+        count += n
+
+        component_sums += components.sum(axis = 1)
+        cheapest += np.bincount(np.argmin(total, axis = 1), minlength = n_scenarios)
+        sketch.add(total)
+
+    return {'scenarios': list(coefficients.index),
+            'samples': count,
+            'mean': mean,
+            'std': np.sqrt(m2 / max(count - 1, 1)),
+            'min': sketch.min,
+            'max': sketch.max,
+            'quantiles': {q: sketch.quantile(q) for q in quantiles},
+            'components': component_sums / count,
+            'p_cheapest': cheapest / count}
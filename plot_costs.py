@@ -1,10 +1,89 @@
-import matplotlib.pyplot as plt
-from data_prep import get_annual_data
 import numpy as np
-import seaborn as sns
-from interface import settings, get_file_path, get_scensrios
+import pandas as pd
+from interface import settings, get_file_path
+from registry import get_registry
+from render import finish, with_suffix, cached_figure
+from instrument import count, timed
+from cost_model import CostModel, default_assumptions, evaluate, original_capacity_factors
 
-def calc_costs(CAPEX_offshore = 1.9, CAPEX_onshore = 1.03, CAPEX_nuclear = 6.18, OPEX_nuclear = 30.20):
+# Cost model used by calc_costs, and the registry it was made from
+_model = None
+_model_registry = None
+
+
+@timed('costs.coefficients')
+def cost_coefficients(scenarios = None):
+    '''
+    This function reads the numbers calc_costs needs from the annual data of each scenario. None of them depend on the
+    CAPEX and OPEX assumptions, so this only has to be done once before evaluating any number of assumptions
+
+    :param scenarios: dictionary with scenario names and excel sheet names (all scenarios in the registry if None)
+
+    :return: dataframe with one row per scenario
+    '''
+
+    registry = get_registry()
+    scenarios = scenarios or registry.group('all')
+
+    coefficients = {}
+    for name, sheet in scenarios.items():
+        # Records are built once from the annual data and shared through the registry
+        coefficients[name] = {**registry.record(sheet).coefficients(),
+                              'nuc_size': registry[name].nuc_size,
+                              'offshore_size': registry[name].offshore_size,
+                              'onshore_size': registry[name].onshore_size,
+                              'pv_size': registry[name].pv_size}
+
+    return pd.DataFrame.from_dict(coefficients, orient = 'index', dtype = float)
+
+
+@timed('costs.kernel')
+def cost_kernel(coefficients, CAPEX_offshore = 1.9, CAPEX_onshore = 1.03, CAPEX_nuclear = 6.18, OPEX_nuclear = 30.20,
+                ir = None, lifetime_nuc = None, lifetime_off = None, lifetime_on = None, uranium_cost = None,
+                OM_nuc = None, offshore_CF = None, onshore_CF = None, PV_CF = None):
+    '''
+    This function calculates costs within 5 different categories for every scenario in a coefficient table. The
+    assumptions can be numbers or numpy arrays, which are broadcast against each other
+
+    :param coefficients: dataframe from cost_coefficients
+    :param CAPEX_offshore: Offshore wind CAPEX assumption
+    :param CAPEX_onshore: Onshore wind CAPEX assumption
+    :param CAPEX_nuclear: Nuclear CAPEX assumption
+    :param OPEX_nuclear: Nuclear OPEX assumption
+    :param ir, lifetime_nuc, lifetime_off, lifetime_on, uranium_cost, OM_nuc: Constants (from interface if None)
+    :param offshore_CF, onshore_CF, PV_CF: Capacity factors the wind and PV capacities are scaled to (from interface
+                                           if None, see default_assumptions)
+
+    :return: 5 arrays (uranium, renewable investment, O&M, nuclear investment, remaining investment) with shape
+             (*shape of the assumptions, number of scenarios)
+    '''
+
+    given = {'ir': ir, 'lifetime_nuc': lifetime_nuc, 'lifetime_off': lifetime_off, 'lifetime_on': lifetime_on,
+             'uranium_cost': uranium_cost, 'OM_nuc': OM_nuc,
+             'offshore_CF': offshore_CF, 'onshore_CF': onshore_CF, 'PV_CF': PV_CF}
+    assumptions = {'CAPEX_offshore': CAPEX_offshore, 'CAPEX_onshore': CAPEX_onshore, 'CAPEX_nuclear': CAPEX_nuclear,
+                   'OPEX_nuclear': OPEX_nuclear, **default_assumptions(), **original_capacity_factors()}
+    assumptions.update({name: value for name, value in given.items() if value is not None})
+
+    # The formulas of each category are in cost_model
+    return evaluate(coefficients, assumptions)
+
+
+def shared_model():
+    '''
+    This function returns the cost model (see cost_model) of all scenarios in the registry that calc_costs uses, so
+    calls that change only some assumptions only calculate the categories depending on them again
+
+    :return: CostModel
+    '''
+    global _model, _model_registry
+    registry = get_registry()
+    if _model is None or _model_registry is not registry:
+        _model, _model_registry = CostModel(cost_coefficients()), registry
+    return _model
+
+
+def calc_costs(CAPEX_offshore = 1.9, CAPEX_onshore = 1.03, CAPEX_nuclear = 6.18, OPEX_nuclear = 30.20, verbose = False):
     '''
     This function calculates costs within 5 different categories for each scenario
 
@@ -12,80 +91,45 @@ def calc_costs(CAPEX_offshore = 1.9, CAPEX_onshore = 1.03, CAPEX_nuclear = 6.18,
     :param CAPEX_onshore: Onshore wind CAPEX assumption
     :param CAPEX_nuclear: Nuclear CAPEX assumption
     :param OPEX_nuclear: Nuclear OPEX assumption
+    :param verbose: Print the assumptions and the capacities of the scenarios if True
 
     :return: 5 dictionaries (for each category) with scenario costs
     '''
-    print(f'Calculating costs\t CAPEX offshore = {CAPEX_offshore}, CAPEX nuclear = {CAPEX_nuclear}')
-
-    (file_path, scenarios, output_file, nuc_size, offshore_size, onshore_size, pv_size, change_cf, offshore_CF_original,
-     onshore_CF_original, PV_CF_original, offshore_CF, onshore_CF, PV_CF, ir, lifetime_nuc, lifetime_off, lifetime_on,
-     uranium_cost, OM_nuc, OM_offshore_2035) = settings()
-
-    # read data to annual lists
-    data = {name: get_annual_data(file_path, sheet) for name, sheet in scenarios.items()}
-    CAPEX_PV = 0.6
-    lifetime_pv = 40
-    # Change CF if true
-    if change_cf:
-        offshore_size = {k: v * offshore_CF_original / offshore_CF for k, v in offshore_size.items()}
-        onshore_size = {k: v * onshore_CF_original / onshore_CF for k, v in onshore_size.items()}
-        pv_size = {k: v * PV_CF_original / PV_CF for k, v in pv_size.items()}
-
-    print('Offshore capacities:\n', offshore_size, '\nOnshore capacities:\n', onshore_size, '\nPV capacities:\n', pv_size)
-    # Set OPEX values
-    fixed_OM_nuc = (OM_nuc * 8760 * 0.9) / (CAPEX_nuclear * 1e6)
-    fixed_OM_off = 0.0167 # Technology catalouge: 1.44 ved normal CAPEX forecast
-    fixed_OM_on = 0.0251
-    OPEX_nuclear = OPEX_nuclear - 14.26 - 9.33
-
-
-    # Make empty dicts for saving costs
-    uranium_uses, inv_res_values, OM_values, nuc_inv, remaining_inv = {}, {}, {}, {}, {}
-
-    # Process each scenario
-    for name, scenario in data.items():
-        # Get annual nuclear electricity production (TWh) (if there is some)
-        if 'Nuclear Electr.' in scenario['ENERGY']:
-            nuclear_electr = scenario['ENERGY']['Nuclear Electr.'].iloc[0]
-        else:
-            nuclear_electr = 0  # Set to zero if empty
-
-        # Calculate uranium costs
-        uranium_use = nuclear_electr * uranium_cost
-
-        # Calculate O&M costs
-        OM = (sum(scenario['INV'].get('Fixed', [0])) + sum(scenario['INV2'].get('Fixed.1', [0]))
-              - scenario['INV'].get('Fixed', [0])[18] + CAPEX_nuclear * nuc_size[name] * fixed_OM_nuc
-              - scenario['INV'].get('Fixed', [0])[11] + CAPEX_offshore* offshore_size[name] * fixed_OM_off
-              - scenario['INV'].get('Fixed', [0])[10] + CAPEX_onshore * onshore_size[name] * fixed_OM_on
-              + scenario['COSTS'].get('TOTAL:  ')[22]) - scenario['COSTS'].get('VARIABLE:')[10] + nuclear_electr * (OPEX_nuclear - 15)
-
-        # Calculate investment in renewable energy (wind, solar, hydro, river etc.)
-        inv_res = (sum(scenario['INV'].get('Annual Inv.', [0])[12:16])
-                   + round(offshore_size[name] * CAPEX_offshore * ir / (1 - (1 + ir)**(-lifetime_off)), 0)
-                   + round(onshore_size[name] * CAPEX_onshore * ir / (1 - (1 + ir)**(-lifetime_on)), 0)
-                   + round(pv_size[name] * CAPEX_PV * ir / (1 - (1 + ir)**(-lifetime_pv)), 0))
-
-        # Calculate investment in nuclear power
-        inv_nuc = nuc_size[name] * CAPEX_nuclear * ir / (1 - (1 + ir)**(-lifetime_nuc))
-
-        # Calculate remaining investments
-        rem_inv = (scenario['COSTS'].get('TOTAL:  ')[28] - sum(scenario['INV'].get('Annual Inv.', [0])[9:16]) - scenario['INV'].get('Annual Inv.', [0])[18] - sum(scenario['INV'].get('Fixed', [0])) - sum(scenario['INV2'].get('Fixed.1', [0])) - scenario['COSTS'].get('TOTAL:  ')[22] + scenario['COSTS'].get('VARIABLE:')[10]) #sum(scenario['INV'].get('Annual Inv.', [0])) + sum(
-
-        # Save in dictionaries before moving on to the next scenario
-        uranium_uses[name] = uranium_use
-        inv_res_values[name] = inv_res
-        OM_values[name] = OM
-        nuc_inv[name] = inv_nuc
-        remaining_inv[name] = rem_inv
+    count('costs.calc_costs')
+    if verbose:
+        print(f'Calculating costs\t CAPEX offshore = {CAPEX_offshore}, CAPEX nuclear = {CAPEX_nuclear}')
+
+    # Only the categories that depend on a changed assumption are calculated again
+    model = shared_model()
+    model.set(CAPEX_offshore = CAPEX_offshore, CAPEX_onshore = CAPEX_onshore, CAPEX_nuclear = CAPEX_nuclear,
+              OPEX_nuclear = OPEX_nuclear, **default_assumptions(), **original_capacity_factors())
+
+    if verbose:
+        offshore_size, onshore_size, pv_size = ({name: float(value) for name, value in zip(model.scenarios,
+                                                                                           np.ravel(model[size]))}
+                                                for size in ('offshore_size', 'onshore_size', 'pv_size'))
+        print('Offshore capacities:\n', offshore_size, '\nOnshore capacities:\n', onshore_size, '\nPV capacities:\n',
+              pv_size)
+
+    # Make one dictionary with scenario costs for each category
+    uranium_uses, inv_res_values, OM_values, nuc_inv, remaining_inv = model.costs()
 
     return uranium_uses, inv_res_values, OM_values, nuc_inv, remaining_inv
 
+
+def _cost_inputs(**arguments):
+    return [get_file_path()]
+
+
+@cached_figure(_cost_inputs, settings)
 def plot_costs(CAPEX_offshore = 1.9, CAPEX_onshore = 1.03, CAPEX_nuclear = 6.18, OPEX_nuclear = 30.44, outputfile = '--'):
 
-    file_path = get_file_path()
-    scenarios = get_scensrios()
-    data = {name: get_annual_data(file_path, sheet) for name, sheet in scenarios.items()}
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    registry = get_registry()
+    scenarios = registry.group('all')
+    data = {name: registry[name].annual for name in scenarios}
 
     uranium_uses, inv_res_values, OM_values, nuc_inv, remaining_inv = calc_costs(CAPEX_offshore, CAPEX_onshore, CAPEX_nuclear, OPEX_nuclear)
     tot_cost = {}
@@ -192,7 +236,7 @@ def plot_costs(CAPEX_offshore = 1.9, CAPEX_onshore = 1.03, CAPEX_nuclear = 6.18,
     labelspacing=4)
 
     plt.tight_layout()
-    plt.show()
+    finish(outputfile, 'costs')
 
     yellows = sns.color_palette('YlOrRd', 16)
     yellows = yellows[7::-1]
@@ -224,14 +268,18 @@ def plot_costs(CAPEX_offshore = 1.9, CAPEX_onshore = 1.03, CAPEX_nuclear = 6.18,
     ax.spines['top'].set_color('black')
     plt.xticks(color = 'black')
 
-    plt.show()
+    finish(with_suffix(outputfile, 'difference'), 'costs_difference')
+
 
+@cached_figure(_cost_inputs, settings)
+def plot_total_costs(CAPEX_offshore = 1.9, CAPEX_onshore = 1.03, CAPEX_nuclear = 6.18, OPEX_nuclear = 30.44, outputfile = '--'):
 
-def plot_total_costs(CAPEX_offshore = 1.9, CAPEX_onshore = 1.03, CAPEX_nuclear = 6.18, OPEX_nuclear = 30.44):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
 
-    file_path = get_file_path()
-    scenarios = get_scensrios()
-    data = {name: get_annual_data(file_path, sheet) for name, sheet in scenarios.items()}
+    registry = get_registry()
+    scenarios = registry.group('all')
+    data = {name: registry[name].annual for name in scenarios}
 
     uranium_uses, inv_res_values, OM_values, nuc_inv, remaining_inv = calc_costs(CAPEX_offshore, CAPEX_onshore, CAPEX_nuclear, OPEX_nuclear)
     tot_cost = {}
@@ -316,7 +364,62 @@ def plot_total_costs(CAPEX_offshore = 1.9, CAPEX_onshore = 1.03, CAPEX_nuclear =
     plt.legend(loc = 'center left', bbox_to_anchor = (1.02, 0.5),  # Push legend outside the axes
         borderaxespad = 0., frameon = False, labelspacing=4)
     plt.tight_layout()
-    plt.show()
+    finish(outputfile, 'total_costs')
 
     sns.color_palette(palette='colorblind', n_colors=5, desat=None, as_cmap=False)
 
+
+
+@cached_figure()
+def plot_least_cost_probability(result, outputfile = '--'):
+    '''
+    This function plots the probability that each scenario is the least cost scenario, and the spread of total costs,
+    from the result of monte_carlo.monte_carlo
+
+    :param result: dictionary from monte_carlo.monte_carlo
+    :param outputfile: name of the output file
+
+    :return: None
+    '''
+
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    names = result['scenarios']
+    order = np.argsort(result['p_cheapest'])
+    y = np.arange(len(names))
+
+    quantiles = result['quantiles']
+    low = quantiles[min(quantiles)] / 1000
+    high = quantiles[max(quantiles)] / 1000
+    median = quantiles.get(0.5, result['mean']) / 1000
+
+    blues = sns.color_palette('Blues', len(names) + 2)[2:]
+
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize = (11, 4), sharey = True, gridspec_kw = {'width_ratios': [1, 1.4]})
+
+    # Probability of being the least cost scenario
+    bars = ax1.barh(y, result['p_cheapest'][order] * 100, color = [blues[i] for i in range(len(names))])
+    for bar, p in zip(bars, result['p_cheapest'][order]):
+        ax1.text(bar.get_width() + 1, bar.get_y() + bar.get_height() / 2, f'{p * 100:.1f}%', ha = 'left',
+                 va = 'center', fontsize = 10)
+    ax1.set_yticks(y)
+    ax1.set_yticklabels([names[i] for i in order])
+    ax1.set_xlim(0, 110)
+    ax1.set_xlabel('Probability of least cost [%]')
+
+    # Spread of total costs
+    ax2.hlines(y, low[order], high[order], color = blues[-1], linewidth = 3,
+               label = f'{min(quantiles) * 100:.0f}-{max(quantiles) * 100:.0f}% interval')
+    ax2.scatter(median[order], y, color = 'black', zorder = 5, label = 'Median')
+    ax2.set_xlabel('Total annual costs [bEUR]')
+    ax2.grid(True, linestyle = '--', axis = 'x')
+    ax2.legend(loc = 'lower right', frameon = False)
+
+    for ax in [ax1, ax2]:
+        for spine in ['top', 'right']:
+            ax.spines[spine].set_visible(False)
+
+    fig.suptitle(f"{result['samples']:,} samples", fontsize = 10)
+    plt.tight_layout()
+    finish(outputfile, 'least_cost_probability')
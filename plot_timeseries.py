@@ -1,36 +1,85 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-
-def plot_imp_exp():
-    scenarios = {'Only RES': 'Renewable', '1GW Nuclear': 'Nuclear_flex', '3GW Nuclear': '3GW', 'High Nuclear': 'Nuclear'}
-    data_dict = {name: pd.read_csv(f'Data/{name}_timeseries.csv') for name, sheet in scenarios.items()}
+import numpy as np
+from balance import SUPPLY, get_balance
+from registry import get_registry, timeseries_path
+from render import finish, figure_name, with_suffix, render_all, cached_figure
+from downsample import pixel_width, window, reduce_line, reduce_stack
+
+def _all_timeseries(**arguments):
+    return [timeseries_path(name) for name in get_registry().group('timeseries')]
+
+
+def _scenario_timeseries(name, **arguments):
+    return [timeseries_path(name)]
+
+
+def _demand_lines(frame):
+    # Each demand line is drawn on top of the ones before it
+    return [frame['Unflexible'],
+            frame['Unflexible'] + frame['Heating'],
+            frame['Unflexible'] + frame['Heating'] + frame['electrolysis'],
+            frame['Unflexible'] + frame['Heating'] + frame['v2g'] + frame['electrolysis'],
+            frame['Unflexible'] + frame['Heating'] + frame['v2g'] + frame['electrolysis'] + frame['storage']]
+
+
+def _stack_and_lines(x, layers, layer_labels, lines, line_labels, layer_colors, line_colors, linewidth,
+                     downsample = None, method = 'lttb', xlim = None):
+    '''
+    This function plots a stackplot of supply and lines of demand in the current figure, downsampled if asked
+
+    :param x: x values of all series
+    :param layers: list with the series in the stackplot
+    :param layer_labels: list with the labels of the layers
+    :param lines: list with the series plotted as lines
+    :param line_labels: list with the labels of the lines
+    :param layer_colors: colors of the layers
+    :param line_colors: colors of the lines
+    :param linewidth: width of the lines
+    :param downsample: number of points to plot in the visible window, True for the pixel width of the figure, or None
+                       to plot every point
+    :param method: downsampling method, 'lttb' or 'minmax' (see downsample)
+    :param xlim: visible x range (x1, x2), or None for all
+
+    :return: None
+    '''
+
+    import matplotlib.pyplot as plt
+
+    x = np.asarray(x)
+    layers = [np.asarray(layer) for layer in layers]
+    lines = [np.asarray(line) for line in lines]
+
+    if downsample:
+        n = pixel_width(plt.gcf()) if downsample is True else int(downsample)
+        # Points outside the window are never seen, so they are dropped before downsampling
+        visible = window(x, *xlim) if xlim else slice(None)
+        layer_x, layers = reduce_stack(x[visible], [layer[visible] for layer in layers], n, method)
+        lines = [reduce_line(x[visible], line[visible], n, method) for line in lines]
+    else:
+        layer_x = x
+        lines = [(x, line) for line in lines]
+
+    plt.stackplot(layer_x, *layers, colors = layer_colors, labels = layer_labels)
+    for (line_x, line), color, label in zip(lines, line_colors, line_labels):
+        plt.plot(line_x, line, color = color, label = label, linewidth = linewidth)
+    if xlim:
+        plt.xlim(*xlim)
+
+
+@cached_figure(_all_timeseries)
+def plot_imp_exp(outputfile = '--'):
+    import matplotlib.pyplot as plt
+
+    balance = get_balance(level = 'daily')
     colors = ['#8FD7D7',  '#FF8CA1', '#BDD373','#FFB255']
     q = 0
     plt.figure(figsize = (12, 4))
 
-    for name, data in data_dict.items():
-        data.index = pd.date_range(start = '2045-01-01', periods = 8784, freq = 'h')
-
-        # ---------------- Extract relevant data from csv file ----------------
-
-        # Import
-        imp = data['Discharge Electr.']
-        # Export
-        exp = data['Charge Electr.']
-
-        weekly_data = pd.DataFrame({
-            'import': imp,
-            'export': exp,
-        }).resample('D').mean()
-
-        netto = []
-        for i, val in enumerate(weekly_data['export']):
-            netto.append(weekly_data['import'][i]- weekly_data['export'][i])
+    # Daily net import (import - export) of every scenario
+    netto_all = balance.total(['disch']) - balance.total(['storage'])
 
+    for name, netto in zip(balance.scenarios, netto_all):
         # ------------------------------ PLOT -------------------------------
 
-
         # Plot demand
         plt.plot(netto, color = colors[q], label = name, linewidth=(6-q))
 
@@ -44,143 +93,128 @@ def plot_imp_exp():
     plt.subplots_adjust(bottom = 0.05)  # reserve more space below the plot  # or 0.35 if more space is needed
     plt.tight_layout()
 
-    plt.show()
+    finish(outputfile, 'imp_exp')
+
+
+def plot_april(outputfile = '--', workers = None, downsample = None, method = 'lttb'):
+    '''
+    This function plots supply and demand in april, one figure for each scenario. In headless mode (see render) the
+    figures are rendered at the same time in worker processes
 
+    :param outputfile: name of the output file. The scenario name is added to it for each figure
+    :param workers: number of worker processes (all cores if None)
+    :param downsample: number of points to plot, True for the pixel width of the figure, or None for every hour
+    :param method: downsampling method, 'lttb' or 'minmax' (see downsample)
+
+    :return: None
+    '''
+    render_all(april_figures(outputfile, downsample, method), workers)
+
+
+def april_figures(outputfile = '--', downsample = None, method = 'lttb'):
+    '''
+    This function lists the figures plot_april makes, as (function, keyword arguments) tasks for render_all or a task
+    graph (see scheduler). The arguments are the same as for plot_april
+
+    :return: list of tasks, one for each scenario
+    '''
+    return [(_plot_april_scenario, {'name': name, 'outputfile': with_suffix(outputfile, name),
+                                    'downsample': downsample, 'method': method})
+            for name in get_registry().group('timeseries')]
+
+
+@cached_figure(_scenario_timeseries)
+def _plot_april_scenario(name, outputfile = '--', downsample = None, method = 'lttb'):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
 
-def plot_april():
     blues = sns.color_palette("Blues", desat = None, as_cmap = False)
     oragnes = sns.color_palette("Oranges", desat = None, as_cmap = False)
 
     linjetykkelse = 1.8
 
-    file_path = 'Excel/Original.xlsx'
-    # Excel sheet names
-    scenarios = {'Only RES': 'Renewable', '1GW Nuclear': '1GW', '3GW Nuclear': '3GW', 'High Nuclear': 'Nuclear'}
-
-    data_dict = {name: pd.read_csv(f'Data/{name}_timeseries.csv') for name, sheet in scenarios.items()}
-
-    for name, data in data_dict.items():
-        # ---------------- Extract relevant data from csv file ----------------
-
-        # Supply
-        nuclear = data['Nuclear Electr.']
-        wind_onshore_el = data['Wind Electr.']
-        wind_offshore_el = data['Offshore Electr.']
-        pv_el = data['PV Electr.']
-        wave_el = data['Wave Electr.']
-        biogas = data['Biogas']
-        waste = data['Waste 2 Heat'] + data['Waste 3 Heat']
-        CHP = data['CHP Electr.'] + data['CSHP Electr.'] #+ data['CHP2+3']
-        PP = data['PP Electr.'] + data['PP2 Electr.']
-        renewable_el = wind_onshore_el.values + wind_offshore_el.values + pv_el.values + wave_el.values
-        disch = data['Discharge Electr.']
-
-        # Demand
-        Unflexible = data['Electr. Demand'] #+ data['Elec.dem  Cooling']
-        Heating = (data['HP Electr.'])
-        #transport = data['H2 demand']
-        v2g = data['Flexible Electr.'] + data['V2G Charge']
-        electrolysis = data['H2 Electr.'] + data['CO2Hydro Electr.'] + data['NH3Hydro Electr.']
-        storage = data['Charge Electr.']
-        # ------------------------------ PLOT -------------------------------
+    # Hourly supply and demand categories (see balance)
+    frame = get_balance(level = 'hourly').frame(name)
 
-        plt.figure(figsize=(25, 8))
+    # ------------------------------ PLOT -------------------------------
 
-        # Plot supply
-        plt.stackplot(wind_onshore_el.index, nuclear, CHP, renewable_el, waste, PP, disch,
-                      colors=blues,#['dimgray','cornflowerblue', 'limegreen', 'midnightblue', 'chocolate'],
-                      labels = ['Nuclear power','Renewable electricity', 'Waste incineration', 'Power plants', 'CHP plants', "Storage"])
+    plt.figure(figsize=(25, 8))
+
+    # Plot supply and demand
+    _stack_and_lines(np.arange(len(frame)), [frame[category] for category in SUPPLY],
+                     ['Nuclear power','Renewable electricity', 'Waste incineration', 'Power plants', 'CHP plants', "Storage"],
+                     _demand_lines(frame),
+                     ['Unflexible demand', 'Electricity for heating', 'Electricity for electrolysis',
+                      'Electricity for transport', 'Storage'],
+                     blues, oragnes[1:6], linjetykkelse, downsample, method, xlim = (2160, 2879))
+
+    plt.grid(True, linestyle='--', alpha=0.5, axis = 'y')
+    plt.xlabel('Hour', fontsize=14)
+    plt.ylabel('Power (MW)', fontsize=14)
+    plt.legend(loc='upper center', bbox_to_anchor=(0.5, -0.1), ncol=3)
+    plt.ylim(0,25000)
+    plt.tight_layout()
+    finish(outputfile, figure_name('april', name))
+
+
+def plot_year(outputfile = '--', workers = None, downsample = None, method = 'lttb', level = 'daily'):
+    '''
+    This function plots daily mean supply and demand over the year, one figure for each scenario. In headless mode (see
+    render) the figures are rendered at the same time in worker processes
+
+    :param outputfile: name of the output file. The scenario name is added to it for each figure
+    :param workers: number of worker processes (all cores if None)
+    :param downsample: number of points to plot, True for the pixel width of the figure, or None for every day
+    :param method: downsampling method, 'lttb' or 'minmax' (see downsample)
+    :param level: mean over 'hourly', 'daily', 'weekly' or 'monthly' periods (see read_aggregate)
+
+    :return: None
+    '''
+    render_all(year_figures(outputfile, downsample, method, level), workers)
+
+
+def year_figures(outputfile = '--', downsample = None, method = 'lttb', level = 'daily'):
+    '''
+    This function lists the figures plot_year makes, as (function, keyword arguments) tasks for render_all or a task
+    graph (see scheduler). The arguments are the same as for plot_year
+
+    :return: list of tasks, one for each scenario
+    '''
+    return [(_plot_year_scenario, {'name': name, 'outputfile': with_suffix(outputfile, name),
+                                   'downsample': downsample, 'method': method, 'level': level})
+            for name in get_registry().group('timeseries')]
+
+
+@cached_figure(_scenario_timeseries)
+def _plot_year_scenario(name, outputfile = '--', downsample = None, method = 'lttb', level = 'daily'):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
 
-        # Plot demand
-        plt.plot(Unflexible, color = oragnes[1], label = 'Unflexible demand', linewidth=linjetykkelse)
-        plt.plot(Unflexible + Heating, color = oragnes[2], label = 'Electricity for heating', linewidth=linjetykkelse)
-        plt.plot(Unflexible + Heating  + electrolysis, color = oragnes[3], label = 'Electricity for electrolysis', linewidth=linjetykkelse)
-        plt.plot(Unflexible + Heating  + v2g + electrolysis, color = oragnes[4], label = 'Electricity for transport', linewidth=linjetykkelse)
-        plt.plot(Unflexible + Heating  + v2g + electrolysis + storage, color = oragnes[5], label = 'Storage', linewidth=linjetykkelse)
-
-        plt.grid(True, linestyle='--', alpha=0.5, axis = 'y')
-        plt.xlabel('Hour', fontsize=14)
-        plt.ylabel('Power (MW)', fontsize=14)
-        plt.legend(loc='upper center', bbox_to_anchor=(0.5, -0.1), ncol=3)
-        plt.ylim(0,25000)
-        plt.xlim(2160,2879)
-        plt.tight_layout()
-        plt.show()
-
-def plot_year():
     blues = sns.color_palette("Blues", desat = None, as_cmap = False)
     oragnes = sns.color_palette("Oranges", desat = None, as_cmap = False)
 
     linjetykkelse = 1.8
 
-    file_path = 'Excel/Final.xlsx'
-    # Excel sheet names
-    scenarios = {'Only RES': 'Renewable', '1GW Nuclear': '1GW', '3GW Nuclear': '3GW', 'High Nuclear': 'Nuclear'}
-
-    data_dict = {name: pd.read_csv(f'Data/{name}_timeseries.csv') for name, sheet in scenarios.items()}
-
-    for name, data in data_dict.items():
-
-        data.index = pd.date_range(start = '2045-01-01', periods = 8784, freq = 'h')
-
-        # ---------------- Extract relevant data from csv file ----------------
-
-        # Supply
-        nuclear = data['Nuclear Electr.']
-        wind_onshore_el = data['Wind Electr.']
-        wind_offshore_el = data['Offshore Electr.']
-        pv_el = data['PV Electr.']
-        wave_el = data['Wave Electr.']
-        biogas = data['Biogas']
-        waste = data['Waste 2 Heat'] + data['Waste 3 Heat']
-        CHP = data['CHP Electr.'] + data['CSHP Electr.']
-        PP = data['PP Electr.'] + data['PP2 Electr.']
-        renewable_el = wind_onshore_el + wind_offshore_el + pv_el + wave_el
-        disch = data['Discharge Electr.']
-
-        # Demand
-        Unflexible = data['Electr. Demand']
-        Heating = data['HP Electr.']
-        v2g = data['Flexible Electr.'] + data['V2G Charge']
-        electrolysis = data['H2 Electr.'] + data['CO2Hydro Electr.'] + data['NH3Hydro Electr.']
-        storage = data['Charge Electr.']
-
-        # ----------------------- Resample to weekly mean -----------------------
-        weekly_data = pd.DataFrame({
-            'nuclear': nuclear,
-            'CHP': CHP,
-            'renewable_el': renewable_el,
-            'waste': waste,
-            'PP': PP,
-            'disch': disch,
-            'Unflexible': Unflexible,
-            'Heating': Heating,
-            'v2g': v2g,
-            'electrolysis': electrolysis,
-            'storage': storage
-        }).resample('D').mean()
+    # Mean supply and demand categories of each period (see balance)
+    weekly_data = get_balance(level = level).frame(name)
 
-        # ------------------------------ PLOT -------------------------------
+    # ------------------------------ PLOT -------------------------------
 
-        plt.figure(figsize=(25, 8))
+    plt.figure(figsize=(25, 8))
 
-        # Plot supply
-        plt.stackplot(weekly_data.index, weekly_data['nuclear'], weekly_data['CHP'], weekly_data['renewable_el'],
-            weekly_data['waste'], weekly_data['PP'], weekly_data['disch'], colors = blues,
-            labels = ['Nuclear power', 'CHP plants', 'Renewable electricity', 'Waste incineration', 'Power plants',
-                      'Storage'])
+    # Plot supply and demand
+    _stack_and_lines(weekly_data.index, [weekly_data[category] for category in SUPPLY],
+                     ['Nuclear power', 'CHP plants', 'Renewable electricity', 'Waste incineration', 'Power plants',
+                      'Storage'],
+                     _demand_lines(weekly_data),
+                     ['Unflexible demand', 'Electricity for heating', 'Electricity for electrolysis',
+                      'Electricity for transport', 'Storage'],
+                     blues, oragnes[1:6], linjetykkelse, downsample, method)
 
-        # Plot demand
-        plt.plot(weekly_data['Unflexible'], color=oragnes[1], label='Unflexible demand', linewidth=linjetykkelse)
-        plt.plot(weekly_data['Unflexible'] + weekly_data['Heating'], color=oragnes[2], label='Electricity for heating', linewidth=linjetykkelse)
-        plt.plot(weekly_data['Unflexible'] + weekly_data['Heating'] + weekly_data['electrolysis'], color=oragnes[3], label='Electricity for electrolysis', linewidth=linjetykkelse)
-        plt.plot(weekly_data['Unflexible'] + weekly_data['Heating'] + weekly_data['v2g'] + weekly_data['electrolysis'], color=oragnes[4], label='Electricity for transport', linewidth=linjetykkelse)
-        plt.plot(weekly_data['Unflexible'] + weekly_data['Heating'] + weekly_data['v2g'] + weekly_data['electrolysis'] + weekly_data['storage'], color=oragnes[5], label='Storage', linewidth=linjetykkelse)
-
-        plt.grid(True, linestyle='--', alpha=0.5, axis='y')
-        plt.xlabel('Time', fontsize=14)
-        plt.ylabel('Power (MW)', fontsize=14)
-        plt.legend(loc='upper center', bbox_to_anchor=(0.5, -0.1), ncol=3)
-        plt.ylim(0, 25000)
-        plt.tight_layout()
-        plt.show()
\ No newline at end of file
+    plt.grid(True, linestyle='--', alpha=0.5, axis='y')
+    plt.xlabel('Time', fontsize=14)
+    plt.ylabel('Power (MW)', fontsize=14)
+    plt.legend(loc='upper center', bbox_to_anchor=(0.5, -0.1), ncol=3)
+    plt.ylim(0, 25000)
+    plt.tight_layout()
+    finish(outputfile, figure_name('year', name))
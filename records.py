@@ -0,0 +1,181 @@
+'''
+Compact record of the annual values the cost calculation needs from one scenario.
+
+get_annual_data gives a dictionary of dataframes for each sheet. A ScenarioRecord takes the few columns the costs are
+calculated from (annual investment and fixed O&M of each unit, variable and total costs, annual energy) out of them
+once, as read-only numpy arrays indexed by the row labels of the tables, so the rows the calculation uses are named
+offsets below instead of label lookups in dataframes. The column labels are checked when the record is built, so a
+sheet with a different layout fails there and not with a wrong cost. The names of the rows at the offsets are compared
+with ROW_NAMES too, but only with a warning, as these names are not yet confirmed against an EnergyPLAN export.
+'''
+
+import hashlib
+import warnings
+import numpy as np
+
+# First row label of the INV table (get_annual_data leaves out the row below its header)
+INV_FIRST_ROW = 1
+
+# Rows of the INV table of the units whose costs depend on the assumptions, and the renewables (onshore and offshore
+# wind, PV, hydro, river etc.)
+FIXED_ROWS = {'nuclear': 18, 'offshore': 11, 'onshore': 10}
+RENEWABLE_ROWS = slice(10, 17)
+# Renewables besides wind and PV, which are calculated from their sizes
+OTHER_RENEWABLE_ROWS = slice(13, 17)
+
+# Rows of the COSTS table: the costs moved from total to O&M, the total annual costs and the variable costs
+# taken out of O&M
+COSTS_ROWS = {'om': 22, 'annual': 28, 'variable': 10}
+
+# Names expected in the first column of each table for rows at the offsets above (not yet confirmed against an
+# EnergyPLAN export, so a mismatch is a warning). A row matches if its name starts with the expected name (without
+# case and extra whitespace)
+ROW_NAMES = {'INV': {FIXED_ROWS['onshore']: 'Wind', FIXED_ROWS['offshore']: 'Offshore Wind',
+                     FIXED_ROWS['nuclear']: 'Nuclear'},
+             'COSTS': {COSTS_ROWS['annual']: 'Total'}}
+
+
+def _label(name):
+    return ' '.join(str(name).split())
+
+
+def _check_row_names(data, sheet, table):
+    # A table with rows added, removed or moved has other names at the offsets
+    frame = data[table]
+    names = frame.iloc[:, 0]
+    for row, expected in ROW_NAMES[table].items():
+        name = _label(names.get(row, '')) if row in names.index else ''
+        if not name.lower().startswith(expected.lower()):
+            warnings.warn(f"Sheet {sheet}: row {row} of {table} is '{name}', expected '{expected}'. Check that the layout "
+                          f"of the table is the one the costs are calculated from", stacklevel = 3)
+
+
+def _column(data, sheet, table, label, required = True, by_label = True):
+    # Column of a table as an array indexed by row label (missing rows are nan), or only the rows in the table
+    frame = data[table]
+    columns = {_label(column): column for column in frame.columns}
+    if label not in columns:
+        if not required:
+            return np.zeros(0)
+        raise ValueError(f"Sheet {sheet}: no column '{label}' in {table} (columns: {list(columns)})")
+
+    if not by_label:
+        values = frame[columns[label]].to_numpy(dtype = float, copy = True)
+        values.flags.writeable = False
+        return values
+
+    values = np.full(frame.index.max() + 1 if len(frame) else 0, np.nan)
+    values[frame.index.to_numpy()] = frame[columns[label]].to_numpy(dtype = float)
+    values.flags.writeable = False
+    return values
+
+
+class ScenarioRecord:
+    '''
+    Annual values of one scenario used in the cost calculation (see from_annual)
+
+    :param sheet: Name of the sheet in the excel file
+    :param inv_annual: annual investment of each unit, indexed by the row labels of INV
+    :param inv_fixed: fixed O&M of each unit, indexed by the row labels of INV
+    :param inv2_fixed: fixed O&M of the rows in the second investment table (INV2), which is only summed
+    :param costs_variable: variable costs, indexed by the row labels of COSTS
+    :param costs_total: total costs, indexed by the row labels of COSTS
+    :param nuclear_electr: annual nuclear electricity production (TWh)
+    '''
+
+    __slots__ = ('sheet', 'inv_annual', 'inv_fixed', 'inv2_fixed', 'costs_variable', 'costs_total', 'nuclear_electr',
+                 '_hash')
+
+    def __init__(self, sheet, inv_annual, inv_fixed, inv2_fixed, costs_variable, costs_total, nuclear_electr):
+        self.sheet = sheet
+        self.inv_annual = inv_annual
+        self.inv_fixed = inv_fixed
+        self.inv2_fixed = inv2_fixed
+        self.costs_variable = costs_variable
+        self.costs_total = costs_total
+        self.nuclear_electr = float(nuclear_electr)
+
+        digest = hashlib.sha256(sheet.encode())
+        for values in self._arrays():
+            digest.update(np.ascontiguousarray(values).tobytes())
+            digest.update(b'|')
+        digest.update(np.float64(self.nuclear_electr).tobytes())
+        self._hash = int.from_bytes(digest.digest()[:8], 'little')
+
+    @classmethod
+    def from_annual(cls, sheet, data):
+        '''
+        This function builds a record from the annual data of a sheet
+
+        :param sheet: Name of the sheet in the excel file
+        :param data: dictionary from get_annual_data
+
+        :return: ScenarioRecord
+        '''
+        inv_annual = _column(data, sheet, 'INV', 'Annual Inv.')
+        inv_fixed = _column(data, sheet, 'INV', 'Fixed')
+        # The second table has no fixed O&M in some sheets
+        inv2_fixed = _column(data, sheet, 'INV2', 'Fixed.1', required = False, by_label = False)
+        costs_variable = _column(data, sheet, 'COSTS', 'VARIABLE:')
+        costs_total = _column(data, sheet, 'COSTS', 'TOTAL:')
+
+        for table in ROW_NAMES:
+            _check_row_names(data, sheet, table)
+
+        # Every row used in the calculation must be in the tables
+        for table, values, rows in (('INV', inv_fixed, FIXED_ROWS.values()),
+                                    ('INV', inv_annual, [*range(RENEWABLE_ROWS.start, RENEWABLE_ROWS.stop),
+                                                         FIXED_ROWS['nuclear']]),
+                                    ('COSTS', costs_total, [COSTS_ROWS['om'], COSTS_ROWS['annual']]),
+                                    ('COSTS', costs_variable, [COSTS_ROWS['variable']])):
+            missing = [row for row in rows if row >= len(values) or np.isnan(values[row])]
+            if missing:
+                raise ValueError(f'Sheet {sheet}: rows {missing} of {table} are empty')
+
+        # Annual nuclear electricity production (TWh) (zero if there is none)
+        energy = data['ENERGY']
+        nuclear_electr = energy['Nuclear Electr.'].iloc[0] if 'Nuclear Electr.' in energy else 0
+
+        return cls(sheet, inv_annual, inv_fixed, inv2_fixed, costs_variable, costs_total, nuclear_electr)
+
+    def _arrays(self):
+        return self.inv_annual, self.inv_fixed, self.inv2_fixed, self.costs_variable, self.costs_total
+
+    def coefficients(self):
+        '''
+        This function calculates the parts of the costs that do not depend on the assumptions
+
+        :return: dictionary with nuclear_electr, OM, inv_res and remaining_inv (see cost_coefficients)
+        '''
+        fixed = self.inv_fixed
+        fixed_sum = fixed[INV_FIRST_ROW:].sum() + self.inv2_fixed.sum()
+        total_om = self.costs_total[COSTS_ROWS['om']]
+        variable = self.costs_variable[COSTS_ROWS['variable']]
+
+        return {'nuclear_electr': self.nuclear_electr,
+                # O&M costs without nuclear, offshore and onshore wind, which depend on the assumptions
+                'OM': fixed_sum - sum(fixed[row] for row in FIXED_ROWS.values()) + total_om - variable,
+                # Investments in other renewables (hydro, river etc.)
+                'inv_res': self.inv_annual[OTHER_RENEWABLE_ROWS].sum(),
+                'remaining_inv': (self.costs_total[COSTS_ROWS['annual']] - self.inv_annual[RENEWABLE_ROWS].sum()
+                                  - self.inv_annual[FIXED_ROWS['nuclear']] - fixed_sum - total_om + variable)}
+
+    @property
+    def nbytes(self):
+        '''
+        Memory used by the arrays of the record
+        '''
+        return sum(values.nbytes for values in self._arrays())
+
+    def __eq__(self, other):
+        if not isinstance(other, ScenarioRecord):
+            return NotImplemented
+        return (self._hash == other._hash and self.sheet == other.sheet
+                and self.nuclear_electr == other.nuclear_electr
+                and all(np.array_equal(a, b, equal_nan = True) for a, b in zip(self._arrays(), other._arrays())))
+
+    def __hash__(self):
+        return self._hash
+
+    def __repr__(self):
+        return f'ScenarioRecord({self.sheet!r}, {self.nbytes} bytes)'
@@ -0,0 +1,220 @@
+'''
+Registry of the EnergyPLAN scenarios.
+
+The registry holds what is known about each scenario (excel sheet, nuclear, offshore wind, onshore wind and PV
+capacities, district heating) and the groups of scenarios the analyses use. Annual and hourly data are loaded the
+first time they are needed and then kept, so every analysis using the shared registry (get_registry) reads each sheet
+only once. The registry is built from the settings in interface.
+'''
+
+import os
+import interface
+from data_prep import get_annual_data, get_timeseries, open_timeseries
+from records import ScenarioRecord
+
+# Directory with the saved timeseries of each scenario
+DATA_DIR = 'Data'
+
+# Timeseries columns that are always extracted, even if they are all zero
+EXTRA_COLUMNS = ['Nuclear Electr.', 'Wave Electr.', 'CHP 3 Heat', 'Discharge Electr.', 'Charge Electr.', 'H2 Storage']
+
+# Registry shared by all analyses
+_registry = None
+
+
+def timeseries_path(name):
+    '''
+    :param name: Scenario name
+
+    :return: Path to the saved timeseries of the scenario
+    '''
+    return os.path.join(DATA_DIR, f'{name}_timeseries')
+
+
+class Scenario:
+    '''
+    One EnergyPLAN scenario. annual and hourly are loaded the first time they are used
+    '''
+
+    def __init__(self, registry, name, sheet, nuc_size = 0, offshore_size = 0, onshore_size = 0, pv_size = 0,
+                 dh = False):
+        self.registry = registry
+        self.name = name
+        self.sheet = sheet
+        self.nuc_size = nuc_size
+        self.offshore_size = offshore_size
+        self.onshore_size = onshore_size
+        self.pv_size = pv_size
+        self.dh = dh
+
+    def __repr__(self):
+        return f'Scenario({self.name!r}, sheet = {self.sheet!r})'
+
+    @property
+    def annual(self):
+        '''
+        Dictionary with the annual dataframes (see get_annual_data)
+        '''
+        return self.registry.annual(self.sheet)
+
+    @property
+    def record(self):
+        '''
+        ScenarioRecord with the annual values the costs are calculated from (see records)
+        '''
+        return self.registry.record(self.sheet)
+
+    @property
+    def hourly(self):
+        '''
+        Hourly timeseries: the saved timeseries if there are any, else read from the excel file
+        '''
+        return self.registry.hourly(self.name)
+
+
+class ScenarioRegistry:
+    '''
+    Scenarios and groups of scenarios, with data loaded on demand
+
+    :param file_path: File path to excel file with EnergyPLAN results
+    :param scenarios: list of Scenario
+    :param groups: dictionary with group names and lists of scenario names
+    :param storage_variants: dictionary with scenario names and (unlimited storage sheet, limited storage sheet)
+    '''
+
+    def __init__(self, file_path, scenarios = (), groups = None, storage_variants = None):
+        self.file_path = file_path
+        self.scenarios = {}
+        self.groups = dict(groups or {})
+        self.storage_variants = dict(storage_variants or {})
+        self._annual = {}
+        self._records = {}
+        self._hourly = {}
+        for scenario in scenarios:
+            self.add(scenario)
+
+    @classmethod
+    def from_interface(cls):
+        '''
+        This function builds a registry from the settings in interface
+
+        :return: ScenarioRegistry
+        '''
+        dh_scenarios = interface.get_dh_scenarios()
+        registry = cls(interface.get_file_path(), storage_variants = interface.storage_variants)
+        for name, sheet in {**dh_scenarios, **interface.get_scensrios()}.items():
+            registry.add(Scenario(registry, name, sheet,
+                                  nuc_size = interface.nuc_size.get(name, 0),
+                                  offshore_size = interface.offshore_size.get(name, 0),
+                                  onshore_size = interface.onshore_size.get(name, 0),
+                                  pv_size = interface.pv_size.get(name, 0),
+                                  dh = sheet.endswith('_dh')))
+
+        registry.groups = {'all': list(interface.get_scensrios()),
+                           'dh': list(dh_scenarios),
+                           'timeseries': list(interface.timeseries_scenarios),
+                           'storage': list(interface.storage_variants)}
+        return registry
+
+    def add(self, scenario):
+        '''
+        :param scenario: Scenario to add (replaces a scenario with the same name)
+        '''
+        scenario.registry = self
+        self.scenarios[scenario.name] = scenario
+
+    def __getitem__(self, name):
+        return self.scenarios[name]
+
+    def __contains__(self, name):
+        return name in self.scenarios
+
+    def __iter__(self):
+        return iter(self.scenarios.values())
+
+    def group(self, group = 'all'):
+        '''
+        :param group: Name of a group ('all', 'dh', 'timeseries' or 'storage')
+
+        :return: dictionary with scenario names and excel sheet names, like interface.scenarios
+        '''
+        return {name: self.scenarios[name].sheet for name in self.groups[group]}
+
+    def annual(self, sheet):
+        '''
+        :param sheet: Name of the sheet in the excel file
+
+        :return: Dictionary with the annual dataframes of the sheet, loaded once
+        '''
+        if sheet not in self._annual:
+            self._annual[sheet] = get_annual_data(self.file_path, sheet)
+        return self._annual[sheet]
+
+    def record(self, sheet):
+        '''
+        :param sheet: Name of the sheet in the excel file
+
+        :return: ScenarioRecord with the values of the sheet the costs are calculated from, built once
+        '''
+        if sheet not in self._records:
+            self._records[sheet] = ScenarioRecord.from_annual(sheet, self.annual(sheet))
+        return self._records[sheet]
+
+    def hourly(self, name):
+        '''
+        :param name: Scenario name
+
+        :return: Hourly timeseries of the scenario, loaded once. Saved timeseries are used if there are any
+        '''
+        if name not in self._hourly:
+            path = timeseries_path(name)
+            if os.path.isfile(os.path.join(path, 'columns.json')) or os.path.isfile(path + '.csv'):
+                self._hourly[name] = open_timeseries(path)
+            else:
+                self._hourly[name] = get_timeseries(self.file_path, self.scenarios[name].sheet, EXTRA_COLUMNS)
+        return self._hourly[name]
+
+
+def get_registry(reload = False):
+    '''
+    This function returns the registry shared by all analyses
+
+    :param reload: Build the registry from interface again (e.g. after changing settings) if True
+
+    :return: ScenarioRegistry
+    '''
+    global _registry
+    if _registry is None or reload:
+        _registry = ScenarioRegistry.from_interface()
+    return _registry
+
+
+def load_annual(sheet):
+    '''
+    This function loads the annual data of a sheet into the shared registry and the on-disk cache, as a task that
+    analyses needing the sheet depend on (see scheduler)
+
+    :param sheet: Name of the sheet in the excel file
+
+    :return: None
+    '''
+    get_registry().annual(sheet)
+
+
+def extract_scenario(name, file_format = 'csv'):
+    '''
+    This function extracts the timeseries of one scenario from the excel file and saves it to DATA_DIR, like
+    data_prep.extract_timeseries does for many scenarios
+
+    :param name: Scenario name
+    :param file_format: 'csv' for a csv file, or 'npy' for a binary store directory
+
+    :return: None
+    '''
+    registry = get_registry()
+    path = timeseries_path(name) + ('.csv' if file_format == 'csv' else '')
+    os.makedirs(DATA_DIR, exist_ok = True)
+    get_timeseries(registry.file_path, registry[name].sheet, EXTRA_COLUMNS, path, True, file_format = file_format)
+
+    # Read the saved timeseries the next time they are needed
+    registry._hourly.pop(name, None)
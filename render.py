@@ -0,0 +1,330 @@
+'''
+Showing and saving figures.
+
+By default figures are shown on screen, and saved too if the plotting function is given an output file. In headless
+mode (set_headless, or the environment variable ENERGYPLAN_HEADLESS=1) figures are never shown: matplotlib uses a
+file-only backend and every figure is saved, to FIGURE_DIR if no output file is given. Independent figures can then be
+rendered at the same time in worker processes with render_all.
+
+Plotting functions decorated with cached_figure are not rendered again in headless mode if their figures are already
+on disk: a fingerprint of the function, the source of its module and of the modules that compute the plotted values
+(DATA_MODULES), its arguments and the content of its input files is stored with the hashes of the saved figures, and a figure with a known fingerprint is reused. Every figure is
+listed as reused or regenerated in a manifest (manifest.json in FIGURE_DIR).
+'''
+
+import functools
+import hashlib
+import importlib.util
+import inspect
+import json
+import os
+import pickle
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import data_cache
+import instrument
+from instrument import count, span
+
+# Directory and file format for figures saved without a given output file
+FIGURE_DIR = 'Figures'
+FIGURE_FORMAT = 'png'
+
+# Modules that compute the values the figures show. Their source is part of every fingerprint, so an edit to a
+# calculation renders the figures again (add new calculation modules here)
+DATA_MODULES = ('interface', 'data_prep', 'registry', 'records', 'cost_model', 'plot_costs', 'balance', 'downsample',
+                'duration')
+
+
+def _use_agg():
+    # matplotlib is only imported by the plotting functions. Until then, the backend is chosen through the environment
+    if 'matplotlib' in sys.modules:
+        sys.modules['matplotlib'].use('Agg')
+    else:
+        os.environ['MPLBACKEND'] = 'Agg'
+
+
+HEADLESS = os.environ.get('ENERGYPLAN_HEADLESS', '') not in ('', '0')
+if HEADLESS:
+    _use_agg()
+
+# Set to False to always render figures again
+cache_enabled = True
+
+# Paths saved by finish, figures rendered or reused by this process, and whether this process is a render_all worker
+_saved = []
+_manifest = []
+_worker = False
+_module_hashes = {}
+
+
+def set_headless(headless = True, figure_dir = None, figure_format = None):
+    '''
+    This function turns headless mode on or off
+
+    :param headless: True to save figures without showing them
+    :param figure_dir: directory for figures without a given output file
+    :param figure_format: file format for output files without an extension (e.g. 'png', 'pdf', 'eps')
+
+    :return: None
+    '''
+    global HEADLESS, FIGURE_DIR, FIGURE_FORMAT
+    HEADLESS = headless
+    FIGURE_DIR = figure_dir or FIGURE_DIR
+    FIGURE_FORMAT = figure_format or FIGURE_FORMAT
+    if headless:
+        _use_agg()
+
+
+def figure_name(*parts):
+    '''
+    This function joins parts of a figure name into a file name (e.g. ('april', '1GW Nuclear w/ DH') gives
+    'april_1GW_Nuclear_w_DH')
+    '''
+    return '_'.join(re.sub(r'[^\w.-]+', '_', str(part)).strip('_') for part in parts if part)
+
+
+def with_suffix(outputfile, suffix):
+    '''
+    This function adds a suffix to an output file name, for plotting functions that make more than one figure
+    (e.g. ('costs.pdf', 'diff') gives 'costs_diff.pdf'). '--' (no output file) is kept as it is
+    '''
+    if outputfile in (None, '--'):
+        return outputfile
+    root, ext = os.path.splitext(outputfile)
+    return f'{root}_{figure_name(suffix)}{ext}'
+
+
+def output_path(outputfile, default_name):
+    '''
+    This function gives the path a figure is saved to
+
+    :param outputfile: output file given to the plotting function ('--' or None if not given)
+    :param default_name: name of the figure, used in headless mode if there is no output file
+
+    :return: path, or None if the figure is not saved
+    '''
+    if outputfile in (None, '--'):
+        if not HEADLESS:
+            return None
+        outputfile = os.path.join(FIGURE_DIR, default_name)
+
+    if not os.path.splitext(outputfile)[1]:
+        outputfile = f'{outputfile}.{FIGURE_FORMAT}'
+    return outputfile
+
+
+def finish(outputfile = '--', default_name = 'figure', fig = None):
+    '''
+    This function ends a plot: the figure is saved if there is an output path, and shown unless in headless mode
+
+    :param outputfile: output file given to the plotting function ('--' if not given)
+    :param default_name: name of the figure, used in headless mode if there is no output file
+    :param fig: figure (the current figure if None)
+
+    :return: path the figure was saved to, or None
+    '''
+    import matplotlib.pyplot as plt
+
+    fig = fig or plt.gcf()
+    path = output_path(outputfile, default_name)
+    if path:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok = True)
+        with span('figure.save', path = path):
+            fig.savefig(path, bbox_inches = 'tight')
+        _saved.append(path)
+
+    if HEADLESS:
+        plt.close(fig)
+    else:
+        plt.show()
+    return path
+
+
+def input_hash(path):
+    '''
+    This function returns a hash of the content of an input file: an excel file, a timeseries store directory or a
+    timeseries csv file (path without .csv, as given to open_timeseries)
+
+    :param path: path to the input
+
+    :return: hex digest, or None if the input does not exist
+    '''
+    if os.path.isdir(path):
+        digest = hashlib.sha256()
+        for name in sorted(os.listdir(path)):
+            digest.update(name.encode())
+            digest.update(data_cache.workbook_hash(os.path.join(path, name)).encode())
+        return digest.hexdigest()
+    if os.path.isfile(path):
+        return data_cache.workbook_hash(path)
+    if os.path.isfile(path + '.csv'):
+        return data_cache.workbook_hash(path + '.csv')
+    return None
+
+
+def _module_hash(module_name):
+    # The source of a module is its version: any edit to it renders the figures depending on it again. Modules are
+    # found without importing them, so modules a figure does not use are not loaded
+    if module_name not in _module_hashes:
+        module = sys.modules.get(module_name)
+        if module is not None:
+            source = getattr(module, '__file__', None)
+        else:
+            spec = importlib.util.find_spec(module_name)
+            source = spec.origin if spec is not None else None
+        _module_hashes[module_name] = (data_cache.workbook_hash(source) if source and os.path.isfile(source)
+                                       else module_name)
+    return _module_hashes[module_name]
+
+
+def _fingerprint(function, arguments, files, state):
+    digest = hashlib.sha256()
+    for part in (function.__module__, function.__qualname__, _module_hash(function.__module__),
+                 _module_hash(__name__), *(_module_hash(name) for name in DATA_MODULES), FIGURE_DIR, FIGURE_FORMAT):
+        digest.update(str(part).encode())
+    digest.update(pickle.dumps([arguments, [(path, input_hash(path)) for path in files], state]))
+    return digest.hexdigest()[:32]
+
+
+def _entry_path(fingerprint):
+    # A dot directory, so data_cache does not take the figure cache for a workbook entry
+    return os.path.join(data_cache.CACHE_DIR, '.figures', f'{fingerprint}.pkl')
+
+
+def _load_entry(fingerprint):
+    # An entry is only valid if every figure it lists is still on disk, unchanged
+    try:
+        with open(_entry_path(fingerprint), 'rb') as f:
+            entry = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+    for path, digest in entry['files'].items():
+        if not os.path.isfile(path) or data_cache.workbook_hash(path) != digest:
+            return None
+    return entry
+
+
+def _save_entry(fingerprint, entry):
+    path = _entry_path(fingerprint)
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    with open(path + f'.{os.getpid()}.tmp', 'wb') as f:
+        pickle.dump(entry, f)
+    os.replace(path + f'.{os.getpid()}.tmp', path)
+
+
+def write_manifest(path = None):
+    '''
+    This function writes the list of figures rendered or reused by this process to a json file
+
+    :param path: path to the manifest (manifest.json in FIGURE_DIR if None)
+
+    :return: path to the manifest
+    '''
+    path = path or os.path.join(FIGURE_DIR, 'manifest.json')
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok = True)
+    summary = {status: sum(record['status'] == status for record in _manifest) for status in ('reused', 'regenerated')}
+    with open(path, 'w') as f:
+        json.dump({'written': time.strftime('%Y-%m-%d %H:%M:%S'), **summary, 'figures': _manifest}, f, indent = 1)
+    return path
+
+
+def _record(record):
+    _manifest.append(record)
+    if not _worker:
+        write_manifest()
+
+
+def cached_figure(files = None, state = None):
+    '''
+    This function makes a decorator for plotting functions that reuses their figures in headless mode when nothing
+    they depend on has changed
+
+    :param files: function that takes the arguments of the plotting function and returns a list of input file paths
+    :param state: function without arguments that returns other values the figures depend on (e.g. interface settings)
+
+    :return: decorator
+    '''
+    def decorator(function):
+        signature = inspect.signature(function)
+
+        label = f'figure.render.{function.__qualname__}'
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not HEADLESS or not cache_enabled:
+                with span(label):
+                    return function(*args, **kwargs)
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            fingerprint = _fingerprint(function, arguments, files(**arguments) if files else [],
+                                       state() if state else None)
+
+            start = time.perf_counter()
+            entry = _load_entry(fingerprint)
+            if entry is not None:
+                status, result = 'reused', entry['result']
+            else:
+                status, first = 'regenerated', len(_saved)
+                with span(label, fingerprint = fingerprint):
+                    result = function(*args, **kwargs)
+                entry = {'files': {path: data_cache.workbook_hash(path) for path in _saved[first:]}, 'result': result}
+                _save_entry(fingerprint, entry)
+
+            count(f'figure.{status}')
+            _record({'function': f'{function.__module__}.{function.__qualname__}', 'fingerprint': fingerprint,
+                     'status': status, 'files': list(entry['files']),
+                     'seconds': round(time.perf_counter() - start, 3)})
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def _init_worker(figure_dir, figure_format, enabled, profile):
+    global _worker, cache_enabled
+    set_headless(True, figure_dir, figure_format)
+    _worker = True
+    cache_enabled = enabled
+    instrument.enable(*profile)
+
+
+def _call(task):
+    # Manifest records and timings made in a worker are sent back to the main process with the result
+    function, kwargs = task
+    first = len(_manifest)
+    instrument.reset()
+    result = function(**kwargs)
+    return result, _manifest[first:], instrument.export()
+
+
+def render_all(tasks, workers = None):
+    '''
+    This function renders independent figures. In headless mode they are rendered at the same time in worker
+    processes, otherwise one after the other so they can be shown
+
+    :param tasks: list of (function, keyword arguments) tuples. Functions must be defined at module level
+    :param workers: number of worker processes (all cores if None, no pool if 1)
+
+    :return: list with the return value of each task
+    '''
+    if not HEADLESS or workers == 1 or len(tasks) <= 1:
+        return [function(**kwargs) for function, kwargs in tasks]
+
+    initargs = (FIGURE_DIR, FIGURE_FORMAT, cache_enabled, instrument.worker_settings())
+    with ProcessPoolExecutor(workers, initializer = _init_worker, initargs = initargs) as pool:
+        outputs = list(pool.map(_call, tasks))
+
+    for _, records, profile in outputs:
+        for record in records:
+            _record(record)
+        instrument.merge(profile)
+    return [result for result, _, _ in outputs]
@@ -0,0 +1,214 @@
+'''
+Running analyses as a graph of tasks.
+
+Each task is a module-level function with keyword arguments and the names of the tasks it depends on. Data loads
+(an annual sheet, a timeseries, a duration curve, a balance) are tasks of their own, so analyses that need the same
+data depend on the same task and the data is loaded once. Loads fill the on-disk cache (see data_cache) and the
+registry, which the analyses then read from.
+
+In headless mode (see render) tasks run in worker processes as soon as the tasks they depend on are done, the tasks
+with the longest chain of tasks after them first, so the whole graph takes about as long as its longest chain.
+Otherwise tasks run one after the other in this process, so figures can be shown.
+
+A task that fails does not stop the run: the tasks that depend on it are skipped, every other task still runs, and
+the failures are raised together at the end as TaskFailures.
+'''
+
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import data_cache
+import instrument
+import interface
+import render
+from instrument import span
+from registry import get_registry
+
+
+class Task:
+    '''
+    One task in a graph
+
+    :param name: unique name of the task, e.g. 'annual:Nuclear_dh' or 'figure:heatmap'
+    :param function: module-level function to call
+    :param kwargs: keyword arguments for the function
+    :param deps: names of the tasks that must be done first
+    '''
+
+    def __init__(self, name, function, kwargs = None, deps = ()):
+        self.name = name
+        self.function = function
+        self.kwargs = dict(kwargs or {})
+        self.deps = list(deps)
+
+    def __repr__(self):
+        return f'Task({self.name!r}, deps = {self.deps})'
+
+
+class TaskFailures(Exception):
+    '''
+    Raised by run when tasks failed
+
+    :param failed: dictionary with the names of the failed tasks and their exceptions
+    :param skipped: names of the tasks that were skipped because a task they depend on failed
+    :param results: results of the tasks that were done (see run)
+    '''
+
+    def __init__(self, failed, skipped, results):
+        self.failed = failed
+        self.skipped = skipped
+        self.results = results
+        lines = [f'  {name}: {type(error).__name__}: {error}' for name, error in failed.items()]
+        if skipped:
+            lines.append(f"  skipped (depend on a failed task): {', '.join(skipped)}")
+        super().__init__(f'{len(failed)} of {len(failed) + len(skipped) + len(results)} tasks failed:\n'
+                         + '\n'.join(lines))
+
+
+def _graph(tasks):
+    # Tasks with the same name are the same task, e.g. a sheet several analyses need
+    graph = {}
+    for task in tasks:
+        graph.setdefault(task.name, task)
+
+    for task in graph.values():
+        missing = [dep for dep in task.deps if dep not in graph]
+        if missing:
+            raise ValueError(f'Task {task.name} depends on unknown tasks: {missing}')
+    return graph
+
+
+def _order(graph):
+    # Topological order (Kahn), keeping the order tasks were given in where there is a choice
+    waiting = {name: len(set(task.deps)) for name, task in graph.items()}
+    dependents = {name: [] for name in graph}
+    for task in graph.values():
+        for dep in set(task.deps):
+            dependents[dep].append(task.name)
+
+    order = []
+    ready = [name for name, n in waiting.items() if n == 0]
+    while ready:
+        name = ready.pop(0)
+        order.append(name)
+        for dependent in dependents[name]:
+            waiting[dependent] -= 1
+            if waiting[dependent] == 0:
+                ready.append(dependent)
+
+    if len(order) < len(graph):
+        raise ValueError(f'Tasks depend on each other in a cycle: {sorted(set(graph) - set(order))}')
+    return order, dependents
+
+
+def _chain_lengths(order, dependents):
+    # Number of tasks in the longest chain starting at each task
+    lengths = {}
+    for name in reversed(order):
+        lengths[name] = 1 + max((lengths[dependent] for dependent in dependents[name]), default = 0)
+    return lengths
+
+
+def _init_worker(file_path, figure_dir, figure_format, cache_enabled, cache_dir, profile):
+    # Workers use the same workbook, cache and figure settings as the main process
+    interface.file_path = file_path
+    data_cache.CACHE_DIR = cache_dir
+    get_registry(reload = True)
+    render._init_worker(figure_dir, figure_format, cache_enabled, profile)
+
+
+def _call(function, kwargs):
+    start = time.perf_counter()
+    result, records, profile = render._call((function, kwargs))
+    return result, records, profile, time.perf_counter() - start
+
+
+def run(tasks, workers = None, verbose = True):
+    '''
+    This function runs a graph of tasks
+
+    :param tasks: list of Task. Tasks with a name that is already in the list are left out
+    :param workers: number of worker processes in headless mode (all cores if None, no pool if 1)
+    :param verbose: print each task when it is done
+
+    :return: dictionary with task names and (return value, seconds). TaskFailures is raised after all other tasks
+             are done if any task failed
+    '''
+    graph = _graph(tasks)
+    order, dependents = _order(graph)
+    results = {}
+    failed = {}
+    skipped = []
+
+    def done(name, result, seconds):
+        results[name] = (result, seconds)
+        if verbose:
+            print(f'{name:<45} {seconds:8.2f} s')
+
+    def fail(name, error):
+        failed[name] = error
+        print(f'{name:<45} FAILED', file = sys.stderr)
+        traceback.print_exception(error, file = sys.stderr)
+
+    def blocked(name):
+        # Tasks that depend on a failed or skipped task are skipped
+        if any(dep in failed or dep in skipped for dep in graph[name].deps):
+            skipped.append(name)
+            return True
+        return False
+
+    start = time.perf_counter()
+    if not render.HEADLESS or workers == 1 or len(graph) <= 1:
+        for name in order:
+            if blocked(name):
+                continue
+            task = graph[name]
+            task_start = time.perf_counter()
+            try:
+                with span(f'task.{name}'):
+                    result = task.function(**task.kwargs)
+            except Exception as error:
+                fail(name, error)
+                continue
+            done(name, result, time.perf_counter() - task_start)
+    else:
+        lengths = _chain_lengths(order, dependents)
+        waiting = {name: set(graph[name].deps) for name in order}
+        initargs = (get_registry().file_path, render.FIGURE_DIR, render.FIGURE_FORMAT, render.cache_enabled,
+                    data_cache.CACHE_DIR, instrument.worker_settings())
+        with ProcessPoolExecutor(workers, initializer = _init_worker, initargs = initargs) as pool:
+            running = {}
+            while waiting or running:
+                # Start the ready tasks with the longest chains after them first
+                ready = sorted((name for name, deps in waiting.items() if not deps), key = lambda n: -lengths[n])
+                for name in ready:
+                    del waiting[name]
+                    if blocked(name):
+                        for deps in waiting.values():
+                            deps.discard(name)
+                    else:
+                        running[pool.submit(_call, graph[name].function, graph[name].kwargs)] = name
+                if not running:
+                    continue
+
+                finished, _ = wait(running, return_when = FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        result, records, profile, seconds = future.result()
+                    except Exception as error:
+                        fail(name, error)
+                    else:
+                        for record in records:
+                            render._record(record)
+                        instrument.merge(profile)
+                        done(name, result, seconds)
+                    for deps in waiting.values():
+                        deps.discard(name)
+
+    if verbose:
+        print(f'Ran {len(results)} of {len(graph)} tasks in {time.perf_counter() - start:.2f} s')
+    if failed:
+        raise TaskFailures(failed, skipped, results)
+    return results
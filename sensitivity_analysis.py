@@ -1,11 +1,70 @@
-from plot_costs import calc_costs
+from plot_costs import cost_coefficients, cost_kernel
+from cost_model import CostModel, CATEGORIES, original_capacity_factors
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from interface import get_scensrios, get_dh_scenarios
+from interface import settings, get_file_path, get_dh_scenarios
+from registry import get_registry
+from render import finish, figure_name, cached_figure
+from instrument import timed
+
+def _least_cost(total):
+    # Index of the least cost scenario, its cost and the margin to the runner-up along the last axis
+    best_scenario_number = np.argmin(total, axis = -1)
+    if total.shape[-1] > 1:
+        lowest_two = np.partition(total, 1, axis = -1)
+        return best_scenario_number, lowest_two[..., 0], lowest_two[..., 1] - lowest_two[..., 0]
+    return best_scenario_number, total[..., 0], np.full(total.shape[:-1], np.inf)
+
+
+@timed('costs.least_cost_grid')
+def least_cost_grid(coefficients, offshore_capex_values, nuclear_capex_values, CAPEX_onshore = 1.13,
+                    OPEX_nuclear = 30.20, tile_size = 256):
+    '''
+    This function finds the least cost scenario for every combination of offshore wind and nuclear CAPEX. The grid is
+    processed in tiles of tile_size x tile_size points, so memory use does not grow with the resolution
+
+    :param coefficients: dataframe from cost_coefficients with the scenarios to compare
+    :param offshore_capex_values: offshore wind CAPEX values (rows of the grid)
+    :param nuclear_capex_values: nuclear CAPEX values (columns of the grid)
+    :param CAPEX_onshore: Onshore wind CAPEX assumption
+    :param OPEX_nuclear: Nuclear OPEX assumption
+    :param tile_size: number of rows and columns in each tile
 
-def heatmap(resolution = 30, off_low = 2.18, off_upp = 3.2, nuc_low = 4.29, nuc_upp = 10.24):
+    :return: arrays with the index of the least cost scenario, its total cost and the cost margin to the runner-up
+    '''
+
+    offshore_capex_values = np.asarray(offshore_capex_values, dtype = float)
+    nuclear_capex_values = np.asarray(nuclear_capex_values, dtype = float)
+    shape = (len(offshore_capex_values), len(nuclear_capex_values))
+
+    best_scenario_number = np.empty(shape, dtype = int)
+    best_cost = np.empty(shape)
+    margin = np.full(shape, np.inf)
+
+    for i in range(0, shape[0], tile_size):
+        for j in range(0, shape[1], tile_size):
+            c_off = offshore_capex_values[i:i + tile_size, np.newaxis]
+            c_nuc = nuclear_capex_values[np.newaxis, j:j + tile_size]
+
+            # Total cost for every point in the tile and every scenario
+            total = sum(cost_kernel(coefficients, c_off, CAPEX_onshore, c_nuc, OPEX_nuclear))
+
+            tile = (slice(i, i + tile_size), slice(j, j + tile_size))
+            best_scenario_number[tile], best_cost[tile], margin[tile] = _least_cost(total)
+
+    return best_scenario_number, best_cost, margin
+
+
+def _inputs(**arguments):
+    return [get_file_path()]
+
+
+def _state():
+    return settings(), get_dh_scenarios()
+
+
+@cached_figure(_inputs, _state)
+def heatmap(resolution = 30, off_low = 2.18, off_upp = 3.2, nuc_low = 4.29, nuc_upp = 10.24, outputfile = '--'):
     '''
     This function plots the least cost scenario of a range of offshore wind and nuclear CAPEX combinations in a heatmap
 
@@ -14,11 +73,15 @@ def heatmap(resolution = 30, off_low = 2.18, off_upp = 3.2, nuc_low = 4.29, nuc_
     :param off_upp: upper bound for offshore wind CAPEX
     :param nuc_low: lower bound for nuclear CAPEX
     :param nuc_upp: upper bound for nuclear CAPEX
+    :param outputfile: name of the output file
 
-    :return: None
+    :return: arrays with the least cost scenario index, its cost and the cost margin to the runner-up for every point
     '''
 
-    scenarios = get_dh_scenarios()
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    scenarios = get_registry().group('dh')
 
     # Set range and resolution of sensitivity analysis
     offshore_capex_values = np.linspace(off_low, off_upp, resolution)
@@ -30,25 +93,10 @@ def heatmap(resolution = 30, off_low = 2.18, off_upp = 3.2, nuc_low = 4.29, nuc_
     # Get scenario names
     names = list(scenarios.keys())
 
-    # Make empty arrays
-    best_cost = np.full((len(nuclear_capex_values), len(offshore_capex_values)), np.inf)
-    best_scenario = np.empty_like(best_cost, dtype=object)
-    best_scenario_number = np.full((len(nuclear_capex_values), len(offshore_capex_values)), np.inf)
-
-    # Iterate through every CAPEX combination
-    for i, c_off in enumerate(offshore_capex_values):
-        for j, c_nuc in enumerate(nuclear_capex_values):
-            uranium_uses, inv_res_values, OM_values, nuc_inv, remaining_inv = calc_costs(c_off, 1.13, c_nuc)
-            for idx, n in enumerate(names):
-                # Calculate total scenario cost
-                total = uranium_uses[n] + inv_res_values[n] + OM_values[n] + nuc_inv[n] + remaining_inv[n]
-
-                # Add values to array if it is the least cost scenario
-                if total < best_cost[i, j]:
-                    best_cost[i, j] = total             # Save cost
-                    best_scenario[i, j] = n             # Save scenario name
-                    best_scenario_number[i, j] = idx    # Save scenario index
-
+    # Calculate the least cost scenario for every CAPEX combination
+    coefficients = cost_coefficients(scenarios)
+    best_scenario_number, best_cost, margin = least_cost_grid(coefficients, offshore_capex_values,
+                                                              nuclear_capex_values)
 
     # Make pandas DataFrame for seaborn heatmap
     df = pd.DataFrame(best_scenario_number,
@@ -77,229 +125,296 @@ def heatmap(resolution = 30, off_low = 2.18, off_upp = 3.2, nuc_low = 4.29, nuc_
     ax.set_xlabel("Nuclear CAPEX [MEUR/MW]")
     ax.set_ylabel("Offshore Wind CAPEX [MEUR/MW]")
     plt.tight_layout()
-    plt.show()
+    finish(outputfile, 'heatmap')
 
+    return best_scenario_number, best_cost, margin
 
-def CAPEX_sens(nuc_capex = 6.18, x1 = 1.9, x2 = 3.5, plotname = '--'):
+
+@timed('costs.cf_sweep')
+def cf_sweep(coefficients, offshore_CF_values, onshore_CF_values, PV_CF_values, **assumptions):
+    '''
+    This function calculates the capacities and costs of every scenario for every combination of offshore wind, onshore
+    wind and PV capacity factors at once. The capacities in interface are scaled from the original capacity factors to
+    each combination, like calc_costs does when change_cf is True, but nothing in interface is changed
+
+    :param coefficients: dataframe from cost_coefficients with the scenarios to compare
+    :param offshore_CF_values: offshore wind capacity factors (first axis)
+    :param onshore_CF_values: onshore wind capacity factors (second axis)
+    :param PV_CF_values: PV capacity factors (third axis)
+    :param assumptions: values for any other assumption in cost_model.ASSUMPTIONS (calc_costs defaults if not given).
+                        The capacity factors are the axes of the sweep, so they can not be given here
+
+    :return: dictionary with arrays of shape (offshore, onshore, PV, scenarios) for the capacities ('offshore_size',
+             'onshore_size', 'pv_size'), each cost category (see CATEGORIES) and 'total', and arrays of shape
+             (offshore, onshore, PV) with the least cost scenario index ('best'), its cost ('best_cost') and the margin
+             to the runner-up ('margin')
     '''
-    This function plots how total costs change for scenarios when offshore wind CAPEX changes
 
-    :param x1: lower bound for offshore wind CAPEX
-    :param x2: upper bound for offshore wind CAPEX
+    swept = sorted({'offshore_CF', 'onshore_CF', 'PV_CF'}.intersection(assumptions))
+    if swept:
+        raise ValueError(f'{", ".join(swept)} are the axes of the sweep, give them as arrays of values instead')
 
-    :return: None
+    # One axis for each capacity factor, broadcast against each other
+    offshore_CF = np.asarray(offshore_CF_values, dtype = float)[:, np.newaxis, np.newaxis]
+    onshore_CF = np.asarray(onshore_CF_values, dtype = float)[np.newaxis, :, np.newaxis]
+    PV_CF = np.asarray(PV_CF_values, dtype = float)[np.newaxis, np.newaxis, :]
+
+    model = CostModel(coefficients, **assumptions, offshore_CF = offshore_CF, onshore_CF = onshore_CF, PV_CF = PV_CF)
+    shape = np.broadcast_shapes(offshore_CF.shape, onshore_CF.shape, PV_CF.shape) + (len(model.scenarios),)
+
+    result = {name: np.broadcast_to(model[name], shape)
+              for name in ('offshore_size', 'onshore_size', 'pv_size') + CATEGORIES + ('total',)}
+    result['best'], result['best_cost'], result['margin'] = _least_cost(result['total'])
+    return result
+
+
+@cached_figure(_inputs, _state)
+def cf_heatmap(resolution = 30, off_low = 0.35, off_upp = 0.55, on_low = 0.22, on_upp = 0.40, PV_CF = None,
+               CAPEX_offshore = 2.5, CAPEX_onshore = 1.13, CAPEX_nuclear = 6.18, OPEX_nuclear = 30.20, outputfile = '--'):
     '''
+    This function plots the least cost scenario of a range of offshore and onshore wind capacity factor combinations in
+    a heatmap
 
-    # Make array
-    x = np.array([x1, x2])
+    :param resolution: resolution of the heatmap
+    :param off_low: lower bound for the offshore wind capacity factor
+    :param off_upp: upper bound for the offshore wind capacity factor
+    :param on_low: lower bound for the onshore wind capacity factor
+    :param on_upp: upper bound for the onshore wind capacity factor
+    :param PV_CF: PV capacity factor (the original from interface if None)
+    :param CAPEX_offshore: Offshore wind CAPEX assumption
+    :param CAPEX_onshore: Onshore wind CAPEX assumption (the same as in heatmap and the sensitivity plots)
+    :param CAPEX_nuclear: Nuclear CAPEX assumption
+    :param OPEX_nuclear: Nuclear OPEX assumption
+    :param outputfile: name of the output file
+
+    :return: dictionary from cf_sweep
+    '''
 
-    # Calculate cost with CAPEX assumtions
-    lower_sum = calc_costs(x1, 1.13, nuc_capex)
-    upper_sum = calc_costs(x2, 1.13, nuc_capex)
-
-    sum_RES_lower, sum_1gw_lower, sum_3gw_lower, sum_high_lower = 0, 0, 0, 0
-    sum_RES_upper, sum_1gw_upper, sum_3gw_upper, sum_high_upper = 0, 0, 0, 0
-
-    # Calculate upper and lower sum for each scenario
-    for item in lower_sum:
-        sum_RES_lower += item['Only RES']
-        sum_1gw_lower += item['1GW Nuclear w/ DH']
-        sum_3gw_lower += item['3GW Nuclear w/ DH']
-        sum_high_lower += item['High Nuclear w/ DH']
-
-    for item in upper_sum:
-        sum_RES_upper += item['Only RES']
-        sum_1gw_upper += item['1GW Nuclear w/ DH']
-        sum_3gw_upper += item['3GW Nuclear w/ DH']
-        sum_high_upper += item['High Nuclear w/ DH']
-
-    # Choose scenarios to plot
-    scenarios = {
-        'Only Renewables': np.array([sum_RES_lower, sum_RES_upper]),
-        '1 GW Nuclear w/ DH': np.array([sum_1gw_lower, sum_1gw_upper]),
-        '3 GW Nuclear w/ DH': np.array([sum_3gw_lower, sum_3gw_upper]),
-        'High Nuclear w/ DH': np.array([sum_high_lower, sum_high_upper]),
-    }
-
-    scenario_names = list(scenarios.keys())
-    scenario_lines = [scenarios[name] for name in scenario_names]
-
-    # Function to compute intersection between two lines
-    def compute_intersection(x_vals, y1, y2):
-        m1, b1 = np.polyfit(x_vals, y1, 1)
-        m2, b2 = np.polyfit(x_vals, y2, 1)
-        x_int = (b2 - b1) / (m1 - m2)
-        y_int = m1 * x_int + b1
-        return x_int, y_int
-
-    intersections = []
-    # Create intersections between adjacent scenarios
-    for x_line in scenario_lines:
-        for y_line in scenario_lines:
-            intersections.append(compute_intersection(x, x_line, y_line))
+    import matplotlib.pyplot as plt
+    import seaborn as sns
 
-    # Plot
+    scenarios = get_registry().group('dh')
+    names = list(scenarios.keys())
+    if PV_CF is None:
+        PV_CF = original_capacity_factors()['PV_CF_original']
 
-    # Set Seaborn style and color palette
-    sns.set_theme(style = "whitegrid")
-    #colors = sns.color_palette("mako", n_colors = 4)
-    #colors = sns.color_palette("hls", n_colors = 6)
-    colors = ['#8FD7D7',  '#FF8CA1', '#BDD373','#FFB255']
-    #colors = ['#00B0BE',  '#F45F74',  '#98C127', '#FFB255']
+    # Make offshore go the other way in the map
+    offshore_CF_values = np.linspace(off_low, off_upp, resolution)[::-1]
+    onshore_CF_values = np.linspace(on_low, on_upp, resolution)
 
-    sns.set_palette(colors)
+    sweep = cf_sweep(cost_coefficients(scenarios), offshore_CF_values, onshore_CF_values, [PV_CF],
+                     CAPEX_offshore = CAPEX_offshore, CAPEX_onshore = CAPEX_onshore, CAPEX_nuclear = CAPEX_nuclear,
+                     OPEX_nuclear = OPEX_nuclear)
 
-    plt.figure(figsize=(5, 4))
+    # Make pandas DataFrame for seaborn heatmap
+    df = pd.DataFrame(sweep['best'][:, :, 0],
+                      columns = [f"{v:.2f}" for v in onshore_CF_values],
+                      index = [f"{v:.2f}" for v in offshore_CF_values])
+
+    # Make figure and plot heatmap
+    plt.figure(figsize = (8, 4))
+    cmap = plt.get_cmap("Blues", len(names))
+    ax = sns.heatmap(df, cmap = cmap, annot = False, fmt = "", vmin = -0.5, vmax = len(names) - 0.5)
 
-    for label, y_vals in scenarios.items():
-        plt.plot(x, y_vals/1000, label=label, linewidth=4)
+    # Make colorbar to the right of the chart
+    colorbar = ax.collections[0].colorbar
+    colorbar.set_ticks(np.arange(len(names)))
+    colorbar.set_ticklabels(names)
 
-    y_low = min(sum_RES_lower, sum_1gw_lower, sum_3gw_lower, sum_high_lower)
-    y_high = max(sum_RES_upper, sum_1gw_upper, sum_3gw_upper, sum_high_upper)
+    ax.set_xlabel("Onshore Wind capacity factor")
+    ax.set_ylabel("Offshore Wind capacity factor")
+    plt.tight_layout()
+    finish(outputfile, 'cf_heatmap')
 
-    # Mark intersections
-    for i, q in enumerate(intersections):
-        xi, yi = q[0], q[1] / 1000
-        if x1 <= xi <= x2:
-            # Sjekk y-verdier for alle scenarier i punktet xi
-            y_vals_at_xi = [np.polyval(np.polyfit(x, line, 1), xi) for line in scenario_lines]
-            y_vals_at_xi = [o / 1000 for o in y_vals_at_xi]
-            min_y = min(y_vals_at_xi)
+    return sweep
 
-            if np.isclose(yi, min_y, atol = 1e-3):  # litt mer romslig toleranse
-                plt.scatter(xi, yi, color = 'black', s = 100, zorder = 5)
-                xi2 = xi
-                if yi <= (y_low/ 1000 + 0.400):
-                    yi2 = y_low / 1000 + 0.300
-                    xi2 = xi + 0.3
-                else:
-                    yi2 = yi
 
-                if xi >= (x2 - 0.3):
-                    xi2 = x2 - 0.3
+# Names used in the legend of the sensitivity plots
+PLOT_LABELS = {'Only RES': 'Only Renewables', '1GW Nuclear w/ DH': '1 GW Nuclear w/ DH',
+               '3GW Nuclear w/ DH': '3 GW Nuclear w/ DH'}
 
-                plt.annotate(f"(CAPEX = {xi:.2f})", xy = (xi, yi - 0.05), xytext = (xi2, yi2 - 0.3),
-                             arrowprops = dict(arrowstyle = '->', lw = 1, color = 'black'), fontsize = 10)
 
-     # Labels and formatting
-    plt.xlabel("Offshore wind CAPEX [MEUR/MW-e]", fontsize=12)
-    plt.ylabel("Total annual costs [bEUR]", fontsize=12)
-    #plt.title("Scenario Cost Comparison vs Offshore Wind CAPEX", fontsize=14)
+def scenario_lines(coefficients, parameter, x1, x2, **assumptions):
+    '''
+    This function describes the total cost of each scenario as a straight line in one of the calc_costs assumptions,
+    through the costs at x1 and x2
 
-    plt.ylim(23.400, (y_high + 100)/ 1000)
+    :param coefficients: dataframe from cost_coefficients with the scenarios to compare
+    :param parameter: name of the assumption ('CAPEX_offshore', 'CAPEX_onshore', 'CAPEX_nuclear' or 'OPEX_nuclear')
+    :param x1: lower bound for the assumption
+    :param x2: upper bound for the assumption
+    :param assumptions: values for the other assumptions (calc_costs defaults if not given)
 
-    plt.tight_layout()
-    plt.show()
+    :return: arrays with the intercept and slope of each scenario line
+    '''
 
+    assumptions[parameter] = np.array([x1, x2])
+    total = sum(cost_kernel(coefficients, **assumptions))
 
-def OPEX_sens(offshore_capex = 2.5, x1 = 23, x2 = 35, plotname = '--'):
+    slopes = (total[1] - total[0]) / (x2 - x1)
+    intercepts = total[0] - slopes * x1
+    return intercepts, slopes
+
+
+def lower_envelope(intercepts, slopes, x1 = -np.inf, x2 = np.inf):
     '''
-    This function plots how total costs for scenarios change for scenarios when the total nuclear OPEX changes
+    This function finds the lower envelope of the lines y = intercept + slope * x, i.e. which line is lowest for every
+    x between x1 and x2, in O(n log n) time
 
-    :param x1: lower bound for nuclear OPEX
-    :param x2: upper bound for nuclear OPEX
-    :return:
+    :param intercepts: intercept of each line
+    :param slopes: slope of each line
+    :param x1: lower bound for x
+    :param x2: upper bound for x
+
+    :return: array with the x values where the lowest line changes (breakeven points), and array with the index of the
+             lowest line on each interval between them (one more than the number of breakeven points)
+    '''
+
+    intercepts = np.asarray(intercepts, dtype = float)
+    slopes = np.asarray(slopes, dtype = float)
+
+    # x value where line b becomes cheaper than line a (a has the larger slope)
+    def crossing(a, b):
+        return (intercepts[b] - intercepts[a]) / (slopes[a] - slopes[b])
+
+    # Going from low to high x the lowest line has a decreasing slope, so add lines from steepest to flattest and
+    # drop the lines that are never lowest
+    hull = []
+    for k in np.lexsort((intercepts, -slopes)):
+        if hull and slopes[hull[-1]] == slopes[k]:
+            continue    # parallel to a line that is at least as cheap
+        while len(hull) >= 2 and crossing(hull[-2], k) <= crossing(hull[-2], hull[-1]):
+            hull.pop()
+        hull.append(k)
+
+    breakpoints = np.array([crossing(a, b) for a, b in zip(hull[:-1], hull[1:])])
+
+    # Keep the part of the envelope between x1 and x2
+    start = np.searchsorted(breakpoints, x1, side = 'right')
+    end = np.searchsorted(breakpoints, x2, side = 'left')
+    return breakpoints[start:end], np.array(hull[start:end + 1])
+
+
+def breakeven(parameter, x1, x2, scenarios = None, **assumptions):
+    '''
+    This function finds the values of one calc_costs assumption where the least cost scenario changes
+
+    :param parameter: name of the assumption ('CAPEX_offshore', 'CAPEX_onshore', 'CAPEX_nuclear' or 'OPEX_nuclear')
+    :param x1: lower bound for the assumption
+    :param x2: upper bound for the assumption
+    :param scenarios: dictionary with scenario names and excel sheet names (DH scenarios if None)
+    :param assumptions: values for the other assumptions (calc_costs defaults if not given)
+
+    :return: array with breakeven values, and list with the least cost scenario on each interval between them
+    '''
+
+    coefficients = cost_coefficients(scenarios or get_registry().group('dh'))
+    intercepts, slopes = scenario_lines(coefficients, parameter, x1, x2, **assumptions)
+    breakpoints, cheapest = lower_envelope(intercepts, slopes, x1, x2)
+    return breakpoints, [coefficients.index[i] for i in cheapest]
+
+
+@cached_figure(_inputs, _state)
+def plot_sensitivity(parameter, x1, x2, scenarios = None, xlabel = None, annotation = None, y_min = 23.4,
+                     label_offset = (0.3, 0.3), plotname = '--', **assumptions):
     '''
+    This function plots how total costs for scenarios change when one calc_costs assumption changes, and marks the
+    breakeven points between the least cost scenarios
+
+    :param parameter: name of the assumption ('CAPEX_offshore', 'CAPEX_onshore', 'CAPEX_nuclear' or 'OPEX_nuclear')
+    :param x1: lower bound for the assumption
+    :param x2: upper bound for the assumption
+    :param scenarios: dictionary with scenario names and excel sheet names (DH scenarios if None)
+    :param xlabel: label of the x axis
+    :param annotation: name of the assumption in the breakeven annotations
+    :param y_min: lower limit of the y axis [bEUR]
+    :param label_offset: how far (x, y) annotations close to the bottom of the plot are moved
+    :param plotname: name of the output file
+    :param assumptions: values for the other assumptions (calc_costs defaults if not given)
+
+    :return: array with breakeven values, and list with the least cost scenario on each interval between them
+    '''
+
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    coefficients = cost_coefficients(scenarios or get_registry().group('dh'))
+    intercepts, slopes = scenario_lines(coefficients, parameter, x1, x2, **assumptions)
+    breakpoints, cheapest = lower_envelope(intercepts, slopes, x1, x2)
 
     # Make array
-    y = np.array([x1, x2])
-
-    # Calculate costs
-    lower_sum = calc_costs(offshore_capex, 1.13, 6.18, y[0])
-    upper_sum = calc_costs(offshore_capex, 1.13, 6.18, y[1])
-
-    sum_RES_lower, sum_1gw_lower, sum_3gw_lower, sum_high_lower = 0, 0, 0, 0
-    sum_RES_upper, sum_1gw_upper, sum_3gw_upper, sum_high_upper = 0, 0, 0, 0
-
-    # Calculate upper and lower sum for each scenario
-    for item in lower_sum:
-        sum_RES_lower += item['Only RES']
-        sum_1gw_lower += item['1GW Nuclear w/ DH']
-        sum_3gw_lower += item['3GW Nuclear w/ DH']
-        sum_high_lower += item['High Nuclear w/ DH']
-
-    for item in upper_sum:
-        sum_RES_upper += item['Only RES']
-        sum_1gw_upper += item['1GW Nuclear w/ DH']
-        sum_3gw_upper += item['3GW Nuclear w/ DH']
-        sum_high_upper += item['High Nuclear w/ DH']
-
-    # Choose scenarios to plot
-    scenarios = {
-        'Only Renewables': np.array([sum_RES_lower, sum_RES_upper]),
-        '1 GW Nuclear w/ DH': np.array([sum_1gw_lower, sum_1gw_upper]),
-        '3 GW Nuclear w/ DH': np.array([sum_3gw_lower, sum_3gw_upper]),
-        'High Nuclear w/ DH': np.array([sum_high_lower, sum_high_upper]),
-    }
-
-    scenario_names = list(scenarios.keys())
-    scenario_lines = [scenarios[name] for name in scenario_names]
-
-    # Function to compute intersection between two lines
-    def compute_intersection(x_vals, y1, y2):
-        m1, b1 = np.polyfit(x_vals, y1, 1)
-        m2, b2 = np.polyfit(x_vals, y2, 1)
-        x_int = (b2 - b1) / (m1 - m2)
-        y_int = m1 * x_int + b1
-        return x_int, y_int
-
-    intersections = []
-    # Create intersections between adjacent scenarios
-    for x_line in scenario_lines:
-        for y_line in scenario_lines:
-            intersections.append(compute_intersection(y, x_line, y_line))
+    x = np.array([x1, x2])
 
     # Plot
 
     # Set Seaborn style and color palette
     sns.set_theme(style = "whitegrid")
-    #colors = sns.color_palette("mako", n_colors = 4)
-    #colors = sns.color_palette("hls", n_colors = 6)
     colors = ['#8FD7D7',  '#FF8CA1', '#BDD373','#FFB255']
-    #colors = ['#00B0BE',  '#F45F74',  '#98C127', '#FFB255']
 
     sns.set_palette(colors)
 
     plt.figure(figsize=(5, 4))
 
-    for label, y_vals in scenarios.items():
-        plt.plot(y, y_vals/1000, label=label, linewidth=4)
+    lines = intercepts[:, np.newaxis] + slopes[:, np.newaxis] * x
+    for name, y_vals in zip(coefficients.index, lines):
+        plt.plot(x, y_vals/1000, label=PLOT_LABELS.get(name, name), linewidth=4)
 
-    y_low = min(sum_RES_lower, sum_1gw_lower, sum_3gw_lower, sum_high_lower)
-    y_high = max(sum_RES_upper, sum_1gw_upper, sum_3gw_upper, sum_high_upper)
+    y_low = lines.min()
+    y_high = lines.max()
 
-    # Mark intersections
-    for i, q in enumerate(intersections):
-        xi, yi = q[0], q[1] / 1000
-        if x1 <= xi <= x2:
-            # Sjekk y-verdier for alle scenarier i punktet xi
-            y_vals_at_xi = [np.polyval(np.polyfit(y, line, 1), xi) for line in scenario_lines]
-            y_vals_at_xi = [o / 1000 for o in y_vals_at_xi]
-            min_y = min(y_vals_at_xi)
+    # Mark breakeven points on the lower envelope
+    for xi, line in zip(breakpoints, cheapest[1:]):
+        yi = (intercepts[line] + slopes[line] * xi) / 1000
+        plt.scatter(xi, yi, color = 'black', s = 100, zorder = 5)
+        xi2 = xi
+        if yi <= (y_low/ 1000 + 0.400):
+            yi2 = y_low / 1000 + label_offset[1]
+            xi2 = xi + label_offset[0]
+        else:
+            yi2 = yi
 
-            if np.isclose(yi, min_y, atol = 1e-3):  # litt mer romslig toleranse
-                plt.scatter(xi, yi, color = 'black', s = 100, zorder = 5)
-                xi2 = xi
-                if yi <= (y_low/ 1000 + 0.400):
-                    yi2 = y_low / 1000 + 0.500
-                    xi2 = xi + 1
-                else:
-                    yi2 = yi
+        if xi >= (x2 - 0.3):
+            xi2 = x2 - 0.3
 
-                if xi >= (x2 - 0.3):
-                    xi2 = x2 - 0.3
-
-                plt.annotate(f"(OPEX = {xi:.2f})", xy = (xi, yi - 0.05), xytext = (xi2, yi2 - 0.3),
-                             arrowprops = dict(arrowstyle = '->', lw = 1, color = 'black'), fontsize = 10)
+        plt.annotate(f"({annotation or parameter} = {xi:.2f})", xy = (xi, yi - 0.05), xytext = (xi2, yi2 - 0.3),
+                     arrowprops = dict(arrowstyle = '->', lw = 1, color = 'black'), fontsize = 10)
 
      # Labels and formatting
-    plt.xlabel("Nuclear OPEX [MEUR/MWh]", fontsize=12)
+    plt.xlabel(xlabel or parameter, fontsize=12)
     plt.ylabel("Total annual costs [bEUR]", fontsize=12)
-    #plt.title("Scenario Cost Comparison vs Offshore Wind CAPEX", fontsize=14)
 
-    plt.ylim(23.200, (y_high + 100)/ 1000)
+    plt.ylim(y_min, (y_high + 100)/ 1000)
 
     plt.tight_layout()
-    plt.show()
+    finish(plotname, figure_name('sensitivity', parameter))
+
+    return breakpoints, [coefficients.index[i] for i in cheapest]
+
 
+def CAPEX_sens(nuc_capex = 6.18, x1 = 1.9, x2 = 3.5, plotname = '--'):
+    '''
+    This function plots how total costs change for scenarios when offshore wind CAPEX changes
+
+    :param x1: lower bound for offshore wind CAPEX
+    :param x2: upper bound for offshore wind CAPEX
+
+    :return: array with breakeven CAPEX values, and list with the least cost scenario between them
+    '''
+
+    return plot_sensitivity('CAPEX_offshore', x1, x2, xlabel = "Offshore wind CAPEX [MEUR/MW-e]",
+                            annotation = 'CAPEX', y_min = 23.4, label_offset = (0.3, 0.3), plotname = plotname,
+                            CAPEX_onshore = 1.13, CAPEX_nuclear = nuc_capex)
+
+
+def OPEX_sens(offshore_capex = 2.5, x1 = 23, x2 = 35, plotname = '--'):
+    '''
+    This function plots how total costs for scenarios change for scenarios when the total nuclear OPEX changes
+
+    :param x1: lower bound for nuclear OPEX
+    :param x2: upper bound for nuclear OPEX
+    :return: array with breakeven OPEX values, and list with the least cost scenario between them
+    '''
 
+    return plot_sensitivity('OPEX_nuclear', x1, x2, xlabel = "Nuclear OPEX [MEUR/MWh]", annotation = 'OPEX',
+                            y_min = 23.2, label_offset = (1, 0.5), plotname = plotname,
+                            CAPEX_offshore = offshore_capex, CAPEX_onshore = 1.13, CAPEX_nuclear = 6.18)
@@ -0,0 +1,150 @@
+'''
+Parameter sweeps over any combination of cost assumptions.
+
+A sweep is the cartesian product of the values given for each parameter. The points are split into chunks that are
+evaluated on a process pool, and every chunk is written to its own file in the output directory as soon as it is
+done. Running the same sweep again skips the chunks that are already on disk, so an interrupted sweep continues where
+it stopped.
+'''
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from plot_costs import cost_coefficients, cost_kernel, default_assumptions
+from cost_model import CAPEX_OPEX_DEFAULTS
+
+# Assumptions that can be swept
+SWEEP_PARAMETERS = tuple(CAPEX_OPEX_DEFAULTS) + tuple(default_assumptions())
+
+# Coefficients used by the worker processes
+_coefficients = None
+
+
+def _init_worker(coefficients):
+    global _coefficients
+    _coefficients = coefficients
+
+
+def sweep_points(grid, start, stop):
+    '''
+    This function returns the parameter values of the points start, ..., stop - 1 of a sweep
+
+    :param grid: dictionary with parameter names and the values to sweep
+    :param start: index of the first point
+    :param stop: index after the last point
+
+    :return: dictionary with parameter names and arrays with one value for each point
+    '''
+    shape = tuple(len(values) for values in grid.values())
+    index = np.unravel_index(np.arange(start, stop), shape)
+    return {name: np.asarray(values, dtype = float)[i] for (name, values), i in zip(grid.items(), index)}
+
+
+def _chunk_path(output_dir, chunk):
+    return os.path.join(output_dir, f'chunk_{chunk:06d}.npz')
+
+
+def _run_chunk(output_dir, definition, chunk):
+    start = chunk * definition['chunk_size']
+    stop = min(start + definition['chunk_size'], definition['points'])
+
+    points = sweep_points(definition['grid'], start, stop)
+    assumptions = dict(definition['fixed'], **points)
+    components = np.stack(cost_kernel(_coefficients, **assumptions))
+    total = components.sum(axis = 0)
+
+    results = {'start': start, 'total': total, 'cheapest': np.argmin(total, axis = -1).astype(np.int16)}
+    if definition['components']:
+        results['components'] = components
+
+    # Write to a temporary file first so an interrupted write never looks like a finished chunk
+    path = _chunk_path(output_dir, chunk)
+    with open(path + '.tmp', 'wb') as f:
+        np.savez(f, **results)
+    os.replace(path + '.tmp', path)
+    return chunk
+
+
+def run_sweep(grid, output_dir, scenarios = None, fixed = None, chunk_size = 100000, components = False,
+              workers = None):
+    '''
+    This function evaluates the total cost of every scenario for every combination of parameter values, and writes
+    the results to output_dir in chunks
+
+    :param grid: dictionary with parameter names (see SWEEP_PARAMETERS) and the values to sweep
+    :param output_dir: directory for the results
+    :param scenarios: dictionary with scenario names and excel sheet names (all scenarios in interface if None)
+    :param fixed: dictionary with values for parameters that are not swept (defaults from calc_costs and interface)
+    :param chunk_size: number of points in each chunk
+    :param components: also save the 5 cost categories if True. Else only total costs
+    :param workers: number of worker processes (all cores if None, no pool if 0 or 1)
+
+    :return: number of points in the sweep
+    '''
+
+    unknown = set(grid) | set(fixed or {})
+    unknown -= set(SWEEP_PARAMETERS)
+    if unknown:
+        raise ValueError(f'Unknown sweep parameters: {sorted(unknown)}')
+
+    coefficients = cost_coefficients(scenarios)
+
+    # All values are fixed in the definition, so a resumed sweep gives the same results even if interface changes
+    all_fixed = dict(CAPEX_OPEX_DEFAULTS, **default_assumptions())
+    all_fixed.update(fixed or {})
+    definition = {'grid': {name: [float(v) for v in values] for name, values in grid.items()},
+                  'fixed': {name: float(value) for name, value in all_fixed.items() if name not in grid},
+                  'scenarios': list(coefficients.index),
+                  'coefficients': coefficients.to_dict(orient = 'list'),
+                  'points': int(np.prod([len(values) for values in grid.values()])),
+                  'chunk_size': int(chunk_size),
+                  'components': bool(components)}
+
+    os.makedirs(output_dir, exist_ok = True)
+    definition_path = os.path.join(output_dir, 'sweep.json')
+    if os.path.isfile(definition_path):
+        with open(definition_path) as f:
+            if json.load(f) != definition:
+                raise ValueError(f'{output_dir} holds a different sweep. Use another directory or delete it')
+    else:
+        with open(definition_path, 'w') as f:
+            json.dump(definition, f, indent = 1)
+
+    # Only run the chunks that are not on disk yet
+    n_chunks = -(-definition['points'] // definition['chunk_size'])
+    todo = [chunk for chunk in range(n_chunks) if not os.path.isfile(_chunk_path(output_dir, chunk))]
+    print(f'Sweep with {definition["points"]} points: {n_chunks - len(todo)} of {n_chunks} chunks already done')
+
+    if workers is not None and workers <= 1:
+        _init_worker(coefficients)
+        for chunk in todo:
+            _run_chunk(output_dir, definition, chunk)
+    else:
+        with ProcessPoolExecutor(workers, initializer = _init_worker, initargs = (coefficients,)) as pool:
+            futures = [pool.submit(_run_chunk, output_dir, definition, chunk) for chunk in todo]
+            for future in as_completed(futures):
+                future.result()
+
+    return definition['points']
+
+
+def read_sweep(output_dir):
+    '''
+    This function reads the results of a sweep one chunk at a time
+
+    :param output_dir: directory with the results of run_sweep
+
+    :return: generator of (points, results) where points is a dictionary with the parameter values of each point and
+             results a dictionary with 'total' (points x scenarios), 'cheapest' (index of the least cost scenario) and
+             'components' (if saved)
+    '''
+    with open(os.path.join(output_dir, 'sweep.json')) as f:
+        definition = json.load(f)
+
+    n_chunks = -(-definition['points'] // definition['chunk_size'])
+    for chunk in range(n_chunks):
+        with np.load(_chunk_path(output_dir, chunk)) as npz:
+            results = {name: npz[name] for name in npz.files if name != 'start'}
+        start = chunk * definition['chunk_size']
+        yield sweep_points(definition['grid'], start, start + len(results['total'])), results